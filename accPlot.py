@@ -103,10 +103,8 @@ def plotTimeSeries(
     """
 
     # read time series file to pandas DataFrame
-    d = pd.read_csv(
-        tsFile, index_col='time',
-        parse_dates=['time'], date_parser=accUtils.date_parser
-    )
+    d = pd.read_csv(tsFile, index_col='time')
+    d.index = accUtils.date_parser_vectorised(d.index)
     d['acc'] = d['acc'].rolling(window=12, min_periods=1).mean() # smoothing
     d['time'] = d.index.time
     ymin = d['acc'].min()
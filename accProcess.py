@@ -2,6 +2,7 @@
 
 import accelerometer.accUtils
 import accelerometer.accClassification
+import accelerometer.chunkedSummary
 import argparse
 import collections
 import datetime
@@ -24,11 +25,14 @@ def main():
             raw accelerometer files.""", add_help=True
     )
     # required
-    parser.add_argument('inputFile', metavar='input file', type=str,
-                            help="""the <.cwa/.cwa.gz> file to process
+    parser.add_argument('inputFile', metavar='input file', type=str, nargs='+',
+                            help="""the <.cwa/.cwa.gz> file(s) to process
                             (e.g. sample.cwa.gz). If the file path contains
                             spaces,it must be enclosed in quote marks
-                            (e.g. \"../My Documents/sample.cwa\")
+                            (e.g. \"../My Documents/sample.cwa\"). Several
+                            files are processed one after another, with the
+                            same arguments, stopping at the first file that
+                            fails
                             """)
 
     #optional inputs
@@ -64,6 +68,15 @@ def main():
                             help="""False will skip processing of the .cwa file
                              (the epoch.csv file must already exist for this to
                              work) (default : %(default)s)""")
+    parser.add_argument('--epochFormat',
+                            metavar='csv/npz', default='csv', type=str,
+                            choices=['csv', 'npz'],
+                            help="""format of the intermediate epoch file:
+                            gzipped text (csv) or typed binary columns (npz),
+                            which is faster to write and read. With
+                            --processInputFile False, an existing -epoch.npz
+                            file is used if there is no -epoch.csv.gz file
+                            (default : %(default)s)""")
     parser.add_argument('--epochPeriod',
                             metavar='length', default=30, type=int,
                             help="""length in seconds of a single epoch (default
@@ -113,6 +126,12 @@ def main():
                             help="""output calibrated and resampled raw data to
                             .npy file? NOTE: requires ~60MB per day.
                             (default : %(default)s)""")
+    parser.add_argument('--npyCompress',
+                            metavar='True/False', default=True, type=str2bool,
+                            help="""gzip the .npy file? Uncompressed .npy files
+                            can be memory-mapped, to load any time window
+                            without reading the whole file
+                            (default : %(default)s)""")
     # calibration parameters
     parser.add_argument('--skipCalibration',
                             metavar='True/False', default=False, type=str2bool,
@@ -171,7 +190,11 @@ def main():
                             (default : %(default)s)""")
     parser.add_argument('--activityModel', type=str,
                             default="activityModels/walmsley-jan21.tar",
-                            help="""trained activity model .tar file""")
+                            help="""trained activity model .tar file. Models
+                            converted with accClassification.saveMappableModel()
+                            share one copy of their random forest in memory
+                            across processes, but classify epochs about twice as
+                            slowly, so only use them to save memory""")
 
     # circadian rhythm options
     parser.add_argument('--psd',
@@ -193,6 +216,17 @@ def main():
                             help="""Calculate relative amplitude of most and
                                     least active acceleration periods for circadian rhythm analysis
                              (default : %(default)s)""")
+    parser.add_argument('--summaryMetrics',
+                            metavar='group', default=None, nargs='+',
+                            choices=list(accelerometer.summariseEpoch.SUMMARY_METRICS),
+                            help="""summary metric groups to compute, skipping
+                            any processing (e.g. activity classification) that
+                            only other groups need. Choose from %(choices)s.
+                            --intensityDistribution, --psd, --fourierFrequency
+                            and --m10l5 add their groups. Not used with
+                            --chunkedSummary (default : """ +
+                            " ".join(accelerometer.summariseEpoch.DEFAULT_SUMMARY_METRICS) +
+                            ")")
     # optional outputs
     parser.add_argument('--outputFolder', metavar='filename',default="",
                             help="""folder for all of the output files, \
@@ -208,6 +242,11 @@ def main():
                             help="folder for -nonWearBouts.csv.gz file")
     parser.add_argument('--stationaryFolder', metavar='filename', default="",
                             help="folder -stationaryPoints.csv.gz file")
+    parser.add_argument('--calibrationCacheFolder', metavar='filename',
+                            default="", help="""folder to cache calibration
+                            results in, so reprocessing the same file with the
+                            same calibration settings skips the calibration
+                            pass (default : no cache)""")
     parser.add_argument('--rawFolder', metavar='filename', default="",
                             help="folder for raw .csv.gz file")
     parser.add_argument('--npyFolder', metavar='filename', default="",
@@ -227,6 +266,54 @@ def main():
                             help="""file containing a java program to process
                             raw .cwa binary file, must end with .class (omitted)
                              (default : %(default)s)""")
+    parser.add_argument('--reuseDecodedSamples',
+                            metavar='True/False', default=False, type=str2bool,
+                            help="""keep the samples decoded during calibration
+                            in a temporary binary file and reuse them for
+                            feature extraction, rather than decoding the raw
+                            file twice. NOTE: requires %d bytes of disk space
+                            per sample (default : %%(default)s)"""
+                            % accelerometer.device.SPILL_BYTES_PER_SAMPLE)
+    parser.add_argument('--streamEpochs',
+                            metavar='True/False', default=False, type=str2bool,
+                            help="""read epochs directly from the java parser,
+                            instead of writing and re-reading the -epoch file,
+                            which is then only written if
+                            --deleteIntermediateFiles is False
+                            (default : %(default)s)""")
+    parser.add_argument('--parallelThreads',
+                            metavar='threads', default=1, type=int,
+                            help="""number of threads to decode .cwa files
+                            with, each processing a chunk of the file. Not
+                            used with --rawOutput, --npyOutput,
+                            --reuseDecodedSamples or --endTime
+                            (default : %(default)s)""")
+    parser.add_argument('--chunkedSummary',
+                            metavar='True/False', default=False, type=str2bool,
+                            help="""summarise the epoch file one day at a time,
+                            so memory use does not grow with recording length.
+                            Not used with --streamEpochs, and not supported
+                            with --psd, --fourierFrequency or --m10l5
+                            (default : %(default)s)""")
+    parser.add_argument('--epochCache',
+                            metavar='True/False', default=False, type=str2bool,
+                            help="""keep a binary copy of the parsed
+                            -epoch.csv.gz file next to it (-epoch-cache.npz),
+                            so later runs with --processInputFile False (e.g.
+                            to try other cut points) load it in a fraction of
+                            the time. The copy only holds the columns needed,
+                            and is rebuilt whenever the epoch file or those
+                            columns (e.g. features of another activity model)
+                            change
+                            (default : %(default)s)""")
+    parser.add_argument('--useParserWorker',
+                            metavar='True/False', default=True, type=str2bool,
+                            help="""when processing several input files, run
+                            the java parser in one long-lived ParserWorker
+                            process for all of them, rather than starting a
+                            new java process (and JIT warm-up) for every
+                            parsing pass of every file
+                            (default : %(default)s)""")
     parser.add_argument('--javaHeapSpace',
                             metavar="amount in MB", default="", type=str,
                             help="""amount of heap space allocated to the java
@@ -237,11 +324,41 @@ def main():
     args = parser.parse_args()
 
     assert args.sampleRate >= 25, "sampleRate<25 currently not supported"
+    assert not (args.chunkedSummary and
+        (args.psd or args.fourierFrequency or args.m10l5)), (
+        "--chunkedSummary does not support circadian rhythm metrics "
+        "(--psd, --fourierFrequency or --m10l5)"
+    )
+
+    if args.summaryMetrics is not None and not args.chunkedSummary:
+        skippedFiles = accelerometer.summariseEpoch.getSkippedOutputFiles(
+            accelerometer.summariseEpoch.getMetricGroups(args.summaryMetrics,
+            args.intensityDistribution, args.psd, args.fourierFrequency,
+            args.m10l5))
+        if skippedFiles:
+            warnings.warn("No " + " or ".join(skippedFiles) + " files are " +
+                "written, as the --summaryMetrics groups do not need them " +
+                "(e.g. add wearTime for -nonWearBouts.csv.gz, movement for " +
+                "-timeSeries.csv.gz)")
 
     if args.sampleRate <= 40:
         warnings.warn("Skipping lowpass filter (--useFilter False) as sampleRate too low (<= 40)")
         args.useFilter = False
 
+    useParserWorker = args.useParserWorker and len(args.inputFile) > 1
+    for inputFile in args.inputFile:
+        fileArgs = argparse.Namespace(**vars(args))
+        fileArgs.inputFile = inputFile
+        processFile(fileArgs, useParserWorker)
+    if useParserWorker:
+        accelerometer.device.stopParserWorker()
+
+
+def processFile(args, useParserWorker=False):
+    """
+    Process one input file with the parsed command line arguments <args>,
+    whose inputFile is that file
+    """
 
     processingStartTime = datetime.datetime.now()
 
@@ -280,11 +397,20 @@ def main():
     # Set default output filenames
     args.summaryFile = os.path.join(args.summaryFolder, inputFileName + "-summary.json")
     args.nonWearFile = os.path.join(args.nonWearFolder, inputFileName + "-nonWearBouts.csv.gz")
-    args.epochFile = os.path.join(args.epochFolder, inputFileName + "-epoch.csv.gz")
+    epochExtensions = {'csv': "-epoch.csv.gz", 'npz': "-epoch.npz"}
+    args.epochFile = os.path.join(args.epochFolder,
+        inputFileName + epochExtensions[args.epochFormat])
+    if not args.processInputFile and not os.path.exists(args.epochFile):
+        # pick up epoch file of either format from an earlier run
+        for epochExtension in epochExtensions.values():
+            epochFile = os.path.join(args.epochFolder, inputFileName + epochExtension)
+            if os.path.exists(epochFile):
+                args.epochFile = epochFile
     args.stationaryFile = os.path.join(args.stationaryFolder, inputFileName + "-stationaryPoints.csv.gz")
     args.tsFile = os.path.join(args.timeSeriesFolder, inputFileName + "-timeSeries.csv.gz")
     args.rawFile = os.path.join(args.rawFolder, inputFileName + ".csv.gz")
     args.npyFile = os.path.join(args.npyFolder, inputFileName + ".npy")
+    args.spillFile = os.path.join(args.stationaryFolder, inputFileName + "-decodedSamples.bin")
 
     # Check if we can write to the output folders
     for path in [
@@ -311,6 +437,11 @@ def main():
                     os.remove(args.stationaryFile)
                 if os.path.exists(args.epochFile):
                     os.remove(args.epochFile)
+                epochCacheFile = accelerometer.accUtils.getEpochCacheFile(args.epochFile)
+                if os.path.exists(epochCacheFile):
+                    os.remove(epochCacheFile)
+                if os.path.exists(args.spillFile):
+                    os.remove(args.spillFile)
             except OSError:
                 accelerometer.accUtils.toScreen('Could not delete intermediate files')
 
@@ -335,8 +466,10 @@ def main():
     # Now process the .CWA file
     if args.processInputFile:
         summary['file-name'] = args.inputFile
-        accelerometer.device.processInputFileToEpoch(args.inputFile, args.timeZone,
-            args.timeShift, args.epochFile, args.stationaryFile, summary,
+        keepEpochFile = not (args.streamEpochs and args.deleteIntermediateFiles)
+        epochData = accelerometer.device.processInputFileToEpoch(args.inputFile, args.timeZone,
+            args.timeShift, args.epochFile if keepEpochFile else None,
+            args.stationaryFile, summary,
             skipCalibration=args.skipCalibration,
             stationaryStd=args.stationaryStd, xyzIntercept=args.calOffset,
             xyzSlope=args.calSlope, xyzTemp=args.calTemp, meanTemp=args.meanTemp,
@@ -346,36 +479,63 @@ def main():
             activityClassification=args.activityClassification,
             rawOutput=args.rawOutput, rawFile=args.rawFile,
             npyOutput=args.npyOutput, npyFile=args.npyFile,
+            npyCompress=args.npyCompress,
+            reuseDecodedSamples=args.reuseDecodedSamples,
+            spillFile=args.spillFile, useParserWorker=useParserWorker,
+            calibrationCacheFolder=args.calibrationCacheFolder,
+            streamEpochs=args.streamEpochs,
+            parallelThreads=args.parallelThreads,
             startTime=args.startTime, endTime=args.endTime, verbose=args.verbose,
             csvStartTime=args.csvStartTime, csvSampleRate=args.csvSampleRate,
             csvTimeFormat=args.csvTimeFormat, csvStartRow=args.csvStartRow,
             csvTimeXYZColsIndex=args.csvTimeXYZColsIndex)
     else:
         summary['file-name'] = args.epochFile
+        epochData = None
 
-    # Summarise epoch
-    epochData, labels = accelerometer.summariseEpoch.getActivitySummary(
-        args.epochFile, args.nonWearFile, summary,
-        activityClassification=args.activityClassification,
-        timeZone=args.timeZone, startTime=args.startTime,
-        endTime=args.endTime, epochPeriod=args.epochPeriod,
-        stationaryStd=args.stationaryStd, mgCutPointMVPA=args.mgCutPointMVPA,
-        mgCutPointVPA=args.mgCutPointVPA, activityModel=args.activityModel,
-        intensityDistribution=args.intensityDistribution,
-        useRecommendedImputation=args.useRecommendedImputation,
-        psd=args.psd, fourierFrequency=args.fourierFrequency,
-        fourierWithAcc=args.fourierWithAcc, m10l5=args.m10l5,
-        verbose=args.verbose)
-
-    # Generate time series file
-    accelerometer.accUtils.writeTimeSeries(epochData, labels, args.tsFile)
+    # Summarise epoch, one day at a time if not already in memory
+    if args.chunkedSummary and epochData is None:
+        labels = accelerometer.chunkedSummary.getActivitySummaryChunked(
+            args.epochFile, args.nonWearFile, summary, args.tsFile,
+            activityClassification=args.activityClassification,
+            timeZone=args.timeZone, startTime=args.startTime,
+            endTime=args.endTime, epochPeriod=args.epochPeriod,
+            stationaryStd=args.stationaryStd, mgCutPointMVPA=args.mgCutPointMVPA,
+            mgCutPointVPA=args.mgCutPointVPA, activityModel=args.activityModel,
+            intensityDistribution=args.intensityDistribution,
+            useRecommendedImputation=args.useRecommendedImputation,
+            verbose=args.verbose)
+    else:
+        epochData, labels = accelerometer.summariseEpoch.getActivitySummary(
+            epochData if epochData is not None else args.epochFile,
+            args.nonWearFile, summary,
+            activityClassification=args.activityClassification,
+            timeZone=args.timeZone, startTime=args.startTime,
+            endTime=args.endTime, epochPeriod=args.epochPeriod,
+            stationaryStd=args.stationaryStd, mgCutPointMVPA=args.mgCutPointMVPA,
+            mgCutPointVPA=args.mgCutPointVPA, activityModel=args.activityModel,
+            intensityDistribution=args.intensityDistribution,
+            useRecommendedImputation=args.useRecommendedImputation,
+            psd=args.psd, fourierFrequency=args.fourierFrequency,
+            fourierWithAcc=args.fourierWithAcc, m10l5=args.m10l5,
+            summaryMetrics=args.summaryMetrics, epochCache=args.epochCache,
+            verbose=args.verbose)
+
+        # Generate time series file (if its imputed columns were computed)
+        if 'accImputed' in epochData.columns:
+            with accelerometer.accUtils.timeStage(summary, 'timeSeries'):
+                accelerometer.accUtils.writeTimeSeries(epochData, labels, args.tsFile)
+        else:
+            print("No time series file written, as --summaryMetrics " +
+                "needs no imputation")
 
     # Print short summary
     accelerometer.accUtils.toScreen("=== Short summary ===")
     summaryVals = ['file-name', 'file-startTime', 'file-endTime',
             'acc-overall-avg','wearTime-overall(days)',
             'nonWearTime-overall(days)', 'quality-goodWearTime']
-    summaryDict = collections.OrderedDict([(i, summary[i]) for i in summaryVals])
+    summaryDict = collections.OrderedDict([(i, summary[i]) for i in summaryVals
+        if i in summary])
     print(json.dumps(summaryDict, indent=4))
 
     # Write summary to file
@@ -1,6 +1,7 @@
 """Module to support machine learning of activity states from acc data"""
 
 from accelerometer import accUtils
+import functools
 from io import BytesIO
 import numpy as np
 import os
@@ -36,9 +37,7 @@ def activityClassification(epochFile,
     """
 
     X = epochFile
-    featureColsFile = getFileFromTar(activityModel, 'featureCols.txt').getvalue()
-    featureColsList = featureColsFile.decode().split('\n')
-    featureCols = list(filter(None,featureColsList))
+    featureCols = getFeatureCols(activityModel)
 
     with pd.option_context('mode.use_inf_as_null', True):
         null_rows = X[featureCols].isnull().any(axis=1)
@@ -46,21 +45,12 @@ def activityClassification(epochFile,
 
     X['label'] = 'none'
     X.loc[null_rows, 'label'] = 'inf_or_null'
-    # Setup RF
-    # Ignore warnings on deployed model using different version of pandas
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=UserWarning)
-        rf = joblib.load(getFileFromTar(activityModel, 'rfModel.pkl'))
-    labels = rf.classes_.tolist()
-    rfPredictions = rf.predict(X.loc[~null_rows,featureCols])
-    # Free memory
-    del rf
-    # Setup HMM
-    priors = np.load(getFileFromTar(activityModel, 'hmmPriors.npy'))
-    transitions = np.load(getFileFromTar(activityModel, 'hmmTransitions.npy'))
-    emissions = np.load(getFileFromTar(activityModel, 'hmmEmissions.npy'))
-    hmmPredictions = viterbi(rfPredictions.tolist(), labels, priors, \
-        transitions, emissions)
+    # Setup RF and HMM
+    model = loadModel(activityModel)
+    labels = list(model['labels'])
+    rfPredictions = predictRandomForest(model, X.loc[~null_rows,featureCols])
+    hmmPredictions = viterbi(rfPredictions.tolist(), labels, model['priors'], \
+        model['transitions'], model['emissions'])
     # Save predictions to pandas dataframe
     X.loc[~null_rows, 'label'] = hmmPredictions
 
@@ -68,8 +58,7 @@ def activityClassification(epochFile,
     #! Pandas .replace method has a small bug
     #! See https://github.com/pandas-dev/pandas/issues/23305
     #! We need to force type
-    met_vals = np.load(getFileFromTar(activityModel, 'METs.npy'))
-    met_dict = dict(zip(labels, met_vals))
+    met_dict = dict(zip(labels, model['METs']))
     X.loc[~null_rows, 'MET'] = X.loc[~null_rows, 'label'].replace(met_dict).astype('float')
 
     # Apply one-hot encoding
@@ -79,10 +68,303 @@ def activityClassification(epochFile,
     # Null values aren't one-hot encoded, so set such instances to NaN
     for l in labels:
         X.loc[X[labels].sum(axis=1) == 0, l] = np.nan
+    # Store one small code per epoch rather than one string object per epoch
+    X['label'] = X['label'].astype('category')
     return X, labels
 
 
 
+def getFeatureCols(activityModel):
+    """Get feature columns used by the random forest of <activityModel>
+
+    :param str activityModel: Input tar model file which contains featureCols.txt
+
+    :return: Feature column names
+    :rtype: list(str)
+    """
+
+    return loadModel(activityModel)['featureCols']
+
+
+
+def loadModel(activityModel):
+    """Load activity model, or reuse it if already loaded by this process
+
+    Loaded models are cached by path, modification time and size, so
+    classifying many files in one process reads and decompresses the model
+    only once, while a replaced model file is read again. The returned model
+    is shared, so must not be modified.
+
+    :param str activityModel: Input tar model file which contains random forest
+        pickle model, HMM priors/transitions/emissions npy files, npy file of
+        METs for each activity state, and featureCols.txt
+
+    :return: 'featureCols', random forest 'rf', activity state 'labels', HMM
+        'priors'/'transitions'/'emissions' and 'METs' of each state
+    :rtype: dict
+    """
+
+    stat = os.stat(activityModel)
+    return loadModelFromTar(os.path.realpath(activityModel), stat.st_mtime_ns,
+        stat.st_size)
+
+
+
+@functools.lru_cache(maxsize=2) # models can be large, so keep only a few
+def loadModelFromTar(tarArchive, mtime, size):
+    """Load activity model, reading its tar file once, see loadModel()
+
+    :param str tarArchive: Input tar model file
+    :param int mtime: Modification time (ns) of <tarArchive>, as cache key
+    :param int size: Size (bytes) of <tarArchive>, as cache key
+
+    :return: Activity model
+    :rtype: dict
+    """
+
+    files = {}
+    forest = {}
+    with tarfile.open(tarArchive, 'r') as t:
+        for member in t.getmembers():
+            name = os.path.normpath(member.name)
+            if name.startswith(FOREST_FILE_PREFIX) and name.endswith('.npy'):
+                # Memory-map, so all processes share one (page cache) copy
+                key = name[len(FOREST_FILE_PREFIX):-len('.npy')]
+                key = key[0].lower() + key[1:]
+                forest[key] = mapNpyFromTar(tarArchive, member.offset_data)
+            elif member.isfile():
+                files[name] = t.extractfile(member).read()
+
+    featureColsList = files['featureCols.txt'].decode().split('\n')
+    model = {'featureCols': list(filter(None,featureColsList))}
+    if 'rfModel.pkl' in files:
+        # Ignore warnings on deployed model using different version of pandas
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=UserWarning)
+            model['rf'] = joblib.load(BytesIO(files['rfModel.pkl']))
+        model['labels'] = model['rf'].classes_.tolist()
+    else:
+        model['rf'] = None
+        model['forest'] = forest
+        model['labels'] = forest['classes'].tolist()
+    for key, npyFile in [('priors', 'hmmPriors.npy'),
+            ('transitions', 'hmmTransitions.npy'),
+            ('emissions', 'hmmEmissions.npy'), ('METs', 'METs.npy')]:
+        model[key] = np.load(BytesIO(files[npyFile]))
+    return model
+
+
+
+def mapNpyFromTar(tarArchive, offset):
+    """Memory-map (read only) a .npy file stored uncompressed in a tar file
+
+    :param str tarArchive: Input tar file
+    :param int offset: Offset of the .npy file's data within <tarArchive>
+
+    :return: Array
+    :rtype: numpy.memmap
+    """
+
+    with open(tarArchive, 'rb') as f:
+        # Offsets of members of a compressed tar file are not file offsets
+        head = f.read(6)
+        for magic, compression in TAR_COMPRESSION_MAGIC.items():
+            if head.startswith(magic):
+                raise ValueError(f"'{tarArchive}' is {compression} compressed, "
+                    "so its random forest can not be memory-mapped. Please "
+                    "decompress it to a plain .tar file")
+        f.seek(offset)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+        dataOffset = f.tell()
+    if 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(tarArchive, dtype=dtype, mode='r', offset=dataOffset,
+        shape=shape, order='F' if fortranOrder else 'C')
+
+
+
+def predictRandomForest(model, X):
+    """Predict activity states with the random forest of an activity model
+
+    :param dict model: Activity model, see loadModel()
+    :param pandas.DataFrame X: Features of each epoch (no missing values)
+
+    :return: Predicted activity state label of each epoch
+    :rtype: numpy.ndarray
+    """
+
+    if model['rf'] is not None:
+        return model['rf'].predict(X)
+    return predictFlatForest(model['forest'], X)
+
+
+
+# Prefix of files of the flattened random forest in mappable model tar files
+FOREST_FILE_PREFIX = 'forest'
+# Leading bytes of the compressed tar files tarfile.open(..., 'r') also reads
+TAR_COMPRESSION_MAGIC = {b'\x1f\x8b': 'gzip', b'BZh': 'bz2',
+    b'\xfd7zXZ\x00': 'xz'}
+
+
+def flattenForest(rfModel):
+    """Flatten the trees of a random forest into compact contiguous node arrays
+
+    Split nodes of all trees are concatenated, followed by their leaves. Child
+    node indices point into the concatenated arrays, and each leaf is its own
+    left and right child with an infinite threshold, so epochs that reach a
+    leaf stay there. Thresholds are stored as float32, rounded down so that
+    comparisons with float32 features decide exactly as sklearn's float64
+    thresholds do.
+
+    :param sklearn.RandomForestClassifier rfModel: Input random forest model
+
+    :return: 'roots' node of each tree; 'feature', 'threshold', and left/right
+        'children' of each node; 'leafClass' index of the most probable class
+        of each leaf; if any leaf is impure, 'leafValue' class probabilities of
+        each leaf (as sklearn's tree predict_proba); and class labels 'classes'
+    :rtype: dict
+    """
+
+    trees = [estimator.tree_ for estimator in rfModel.estimators_]
+    isLeaf = [tree.children_left < 0 for tree in trees]
+    nSplits = np.cumsum([0] + [(~leaf).sum() for leaf in isLeaf])
+    nLeaves = np.cumsum([nSplits[-1]] + [leaf.sum() for leaf in isLeaf])
+    # Map sklearn node ids of each tree to ids in the concatenated arrays
+    nodeIds = [np.where(leaf, leafStart + np.cumsum(leaf) - 1,
+        splitStart + np.cumsum(~leaf) - 1) for leaf, splitStart, leafStart
+        in zip(isLeaf, nSplits, nLeaves)]
+    splits = [~leaf for leaf in isLeaf]
+    leafIds = np.arange(nSplits[-1], nLeaves[-1])
+    children = np.concatenate([np.column_stack([ids[tree.children_left[split]],
+        ids[tree.children_right[split]]]) for tree, ids, split
+        in zip(trees, nodeIds, splits)] + [np.column_stack([leafIds, leafIds])])
+    feature = np.concatenate([tree.feature[split] for tree, split
+        in zip(trees, splits)] + [np.zeros(len(leafIds), dtype=np.intp)])
+    threshold = np.concatenate([tree.threshold[split] for tree, split
+        in zip(trees, splits)])
+    threshold32 = threshold.astype(np.float32)
+    threshold32 = np.where(threshold32 > threshold,
+        np.nextafter(threshold32, np.float32(-np.inf)), threshold32)
+    threshold32 = np.concatenate([threshold32,
+        np.full(len(leafIds), np.inf, dtype=np.float32)])
+    # Normalise leaf values to probabilities, exactly as sklearn does
+    nClasses = len(rfModel.classes_)
+    leafValue = np.concatenate([tree.value[leaf, 0, :nClasses] for tree, leaf
+        in zip(trees, isLeaf)])
+    normalizer = leafValue.sum(axis=1)[:, np.newaxis]
+    normalizer[normalizer == 0.0] = 1.0
+    leafValue /= normalizer
+
+    # Node ids as intp, which numpy indexing would otherwise convert them to
+    forest = {'roots': np.array([ids[0] for ids in nodeIds], dtype=np.intp),
+        'feature': feature.astype(np.intp), 'threshold': threshold32,
+        'children': children.astype(np.intp),
+        'leafClass': np.argmax(leafValue, axis=1).astype(np.int16)}
+    if ((leafValue > 0).sum(axis=1) > 1).any():
+        forest['leafValue'] = leafValue
+    # Object arrays can only be saved pickled, so store labels as str
+    forest['classes'] = rfModel.classes_.astype(str) \
+        if rfModel.classes_.dtype == object else rfModel.classes_
+    return forest
+
+
+
+# Number of (epoch, tree) pairs traversed at once by predictFlatForest()
+FOREST_BATCH_SIZE = 2**19
+# Levels descended between removals of (epoch, tree) pairs which reached a leaf
+FOREST_LEVELS_PER_PASS = 8
+
+
+def predictFlatForest(forest, X):
+    """Predict classes with a forest flattened by flattenForest()
+
+    Batches of epochs descend all trees together, one level at a time. If all
+    leaves are pure, each tree votes for one class and the class with most
+    votes wins; otherwise class probabilities are averaged over trees.
+    Predictions are identical to sklearn's RandomForestClassifier.predict (with
+    n_jobs=1, as threads may sum tree probabilities in another order).
+
+    This pure numpy traversal exists so that memory-mapped forests can be
+    shared across processes (see saveMappableModel()), not for speed: it takes
+    about twice the CPU time of sklearn's compiled one.
+
+    :param dict forest: Flattened random forest
+    :param pandas.DataFrame X: Features (no missing values)
+
+    :return: Predicted class of each row of <X>
+    :rtype: numpy.ndarray
+    """
+
+    # sklearn trees compare float32 features with float64 thresholds
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    nRows, nFeatures = X.shape
+    # Copies only forests of older mappable models, stored as int32
+    roots = forest['roots'].astype(np.intp, copy=False)
+    children = np.ravel(forest['children']).astype(np.intp, copy=False)
+    feature = forest['feature'].astype(np.intp, copy=False)
+    threshold = forest['threshold']
+    nTrees, nClasses = len(roots), len(forest['classes'])
+    firstLeaf = len(feature) - len(forest['leafClass'])
+    batchRows = max(1, FOREST_BATCH_SIZE // nTrees)
+    prediction = np.empty(nRows, dtype=np.intp)
+    for start in range(0, nRows, batchRows):
+        batchX = X[start:start + batchRows].ravel()
+        nBatch = len(batchX) // nFeatures
+        # Pairs are ordered by tree, then epoch, so that neighbouring pairs
+        # visit nodes of the same tree
+        leaf = np.repeat(roots, nBatch)
+        pair = np.arange(len(leaf))
+        node = leaf.copy()
+        offset = (pair % nBatch) * nFeatures
+        while len(pair) > 0:
+            for level in range(FOREST_LEVELS_PER_PASS):
+                goRight = batchX[offset + feature[node]] > threshold[node]
+                node = children[2 * node + goRight]
+            done = node >= firstLeaf
+            leaf[pair[done]] = node[done]
+            pair, node, offset = pair[~done], node[~done], offset[~done]
+        leaf = (leaf - firstLeaf).reshape(nTrees, nBatch)
+        if 'leafValue' in forest:
+            # Sum in tree order, as sklearn does
+            proba = np.zeros((nBatch, nClasses))
+            for tree in range(nTrees):
+                proba += forest['leafValue'][leaf[tree]]
+            proba /= nTrees
+        else:
+            # Integer votes, which tie exactly when sklearn's means would
+            votes = forest['leafClass'][leaf] + nClasses * np.arange(nBatch)
+            proba = np.bincount(votes.ravel(),
+                minlength=nBatch * nClasses).reshape(nBatch, nClasses)
+        prediction[start:start + nBatch] = np.argmax(proba, axis=1)
+    return forest['classes'][prediction]
+
+
+
+def checkForestParity(rfModel, forest, X):
+    """Count epochs where predictFlatForest() disagrees with sklearn
+
+    :param sklearn.RandomForestClassifier rfModel: Input random forest model
+    :param dict forest: <rfModel> flattened by flattenForest()
+    :param pandas.DataFrame X: Features (no missing values)
+
+    :return: Number of rows of <X> with different predictions
+    :rtype: int
+    """
+
+    nJobs = rfModel.n_jobs
+    rfModel.set_params(n_jobs=1) # see predictFlatForest()
+    try:
+        expected = rfModel.predict(X)
+    finally:
+        rfModel.set_params(n_jobs=nJobs)
+    return int((predictFlatForest(forest, X) != expected).sum())
+
+
+
 MIN_TRAIN_CLASS_COUNT = 100
 def trainClassificationModel(trainingFile,
     labelCol="label", participantCol="participant",
@@ -91,7 +373,7 @@ def trainClassificationModel(trainingFile,
     trainParticipants=None, testParticipants=None,
     rfThreads=1, rfTrees=1000, rfFeats=None, rfDepth=None,
     outputPredict="activityModels/test-predictions.csv",
-    outputModel=None):
+    outputModel=None, mappableModel=False):
     """Train model to classify activity states from epoch feature data
 
     Based on a balanced random forest with a Hidden Markov Model containing
@@ -117,6 +399,9 @@ def trainClassificationModel(trainingFile,
         pickle model, HMM priors/transitions/emissions npy files, and npy file
         of METs for each activity state. Will only output trained model if this
         is not null e.g. "activityModels/sample-model.tar"
+    :param bool mappableModel: Write <outputModel> in the mappable format of
+        saveModelsToTar(), after checking that its flattened random forest
+        predicts the training data exactly as the trained one does
 
     :return: New model written to <outputModel> OR csv of test predictions
         written to <outputPredict>
@@ -169,8 +454,14 @@ def trainClassificationModel(trainingFile,
 
     # Now write out model
     if outputModel is not None:
+        if mappableModel:
+            mismatches = checkForestParity(rfModel, flattenForest(rfModel),
+                train[featureCols])
+            if mismatches > 0:
+                raise ValueError("Flattened random forest disagrees with the "
+                    "trained one on %d training epochs" % mismatches)
         saveModelsToTar(outputModel, featureCols, rfModel, priors, transitions,
-            emissions, METs)
+            emissions, METs, mappable=mappableModel)
 
     # Assess model performance on test participants
     if testParticipants is not None:
@@ -214,41 +505,25 @@ def train_HMM(rfModel, y_trainF, labelCol):
     """
 
     states = rfModel.classes_
-
-    # Get out of bag (OOB) predictions from Random Forest
-    predOOB = pd.DataFrame(rfModel.oob_decision_function_)
-    predOOB.columns = states
-    predOOB['labelOOB'] = predOOB.idxmax(axis=1)
-    predOOB['groundTruth'] = y_trainF.values
+    nStates = len(states)
+    # Integer-encode ground truth labels, as indices of states
+    labels = pd.Categorical(y_trainF, categories=states).codes.astype(np.intp)
+    stateCounts = np.bincount(labels, minlength=nStates)
 
     # Initial state probabilities
-    prior = []
-    for s in states:
-        sProb = len(y_trainF[y_trainF == s]) / (len(y_trainF) * 1.0)
-        prior += [sProb]
-
-    # Emission probabilities
-    emissions = np.zeros((len(states), len(states)))
-    j = 0
-    for predictedState in states:
-        k=0
-        for actualState in states:
-            emissions[j,k] = predOOB[actualState][predOOB['groundTruth'] == predictedState].sum()
-            emissions[j,k] /= len(predOOB[predOOB['groundTruth'] == predictedState])
-            k+=1
-        j+=1
-
-    # Transition probabilities
-    train = y_trainF.to_frame()
-    train['nextLabel'] = train[labelCol].shift(-1)
-    transitions = np.zeros((len(states), len(states)))
-    j = 0
-    for s1 in states:
-        k = 0
-        for s2 in states:
-            transitions[j, k] = len(train[(train[labelCol]==s1) & (train['nextLabel']==s2)]) / (len(train[train[labelCol]==s1]) * 1.0)
-            k += 1
-        j += 1
+    prior = stateCounts / len(labels)
+
+    # Emission probabilities, from out of bag (OOB) predictions of Random Forest
+    # (epochs never out of bag have NaN probabilities, so do not add to sums)
+    predOOB = np.nan_to_num(rfModel.oob_decision_function_, nan=0.0)
+    emissions = np.zeros((nStates, nStates))
+    np.add.at(emissions, labels, predOOB)
+    emissions /= stateCounts[:, np.newaxis]
+
+    # Transition probabilities, from (current, next) pairs of labels
+    pairCounts = np.bincount(labels[:-1] * nStates + labels[1:],
+        minlength=nStates * nStates).reshape(nStates, nStates)
+    transitions = pairCounts / stateCounts[:, np.newaxis]
 
     # Return HMM matrices
     return states, prior, emissions, transitions
@@ -273,40 +548,77 @@ def viterbi(observations, states, priors, transitions, emissions,
     """
 
     def norm(x):
-        return x / x.sum()
-
-    tinyNum = 0.000001
-    nObservations = len(observations)
-    nStates = len(states)
-    v = np.zeros((nObservations,nStates)) # initialise viterbi table
-    # Set prior state values for first observation...
-    for state in range(0, len(states)):
-        v[0,state] = np.log(priors[state] * emissions[state,states.index(observations[0])]+tinyNum)
-    # Fill in remaning matrix observations
-    # Use log space as multiplying successively smaller p values)
-    for k in range(1,nObservations):
-        for state in range(0, len(states)):
-            v[k,state] = np.log(emissions[state,states.index(observations[k])]+tinyNum) + \
-                        np.max(v[k-1,:] + np.log(transitions[:,state]+tinyNum), axis=0)
+        return x / x.sum(axis=-1, keepdims=True)
 
-    # Now construct viterbiPath (propagating backwards)
-    viterbiPath = observations
-    # Pick most probable state for final observation
-    viterbiPath[nObservations-1] = states[np.argmax(v[nObservations-1,:],axis=0)]
+    states = list(states)
+    # Integer-encode observations once, e.g. 'sleep' -> 2
+    stateIndex = {state: i for i, state in enumerate(states)}
+    codes = np.array([stateIndex[observation] for observation in observations],
+        dtype=np.intp)
+    viterbiCodes, v = getViterbiPath(codes, priors, transitions, emissions)
 
     # Probabilistic method will give probability of each label
     if probabilistic:
-        viterbiProba = np.zeros((nObservations,nStates)) # initialize table
-        viterbiProba[nObservations-1,:] = norm(v[nObservations-1,:])
-
-    # And then work backwards to pick most probable state for all other observations
-    for k in list(reversed(range(0,nObservations-1))):
-        viterbiPath[k] = states[np.argmax(v[k,:] + np.log(transitions[:,states.index(viterbiPath[k+1])]+tinyNum),axis=0)]
-        if probabilistic:
-            viterbiProba[k,:] = norm(v[k,:] + np.log(transitions[:,states.index(viterbiPath[k+1])]+tinyNum))
+        tinyNum = 0.000001
+        viterbiProba = np.zeros((len(codes), len(states))) # initialize table
+        viterbiProba[-1:, :] = norm(v[-1:, :])
+        viterbiProba[:-1, :] = norm(v[:-1, :] + np.log(transitions[:,
+            viterbiCodes[1:]].T + tinyNum))
+        return viterbiProba
 
     # Output as list...
-    return viterbiProba if probabilistic else viterbiPath
+    return [states[code] for code in viterbiCodes]
+
+
+
+def getViterbiPath(codes, priors, transitions, emissions):
+    """Find most likely (Viterbi) path of HMM states for integer-encoded observations
+
+    The recursion is done in log space, one observation at a time over all
+    states at once, keeping a table of back pointers to then trace the path.
+
+    :param numpy.ndarray codes: Observed activity states, as indices of states
+    :param numpy.array priors: Prior probabilities for each activity state
+    :param numpy.array transitions: Probability matrix of transitioning from one
+        activity state to another
+    :param numpy.array emissions: Probability matrix of RF prediction being true
+
+    :return: Most likely state (index) for each observation
+    :rtype: numpy.ndarray
+
+    :return: Viterbi table of log probabilities of most likely path to each
+        state, for each observation
+    :rtype: numpy.ndarray
+    """
+
+    tinyNum = 0.000001
+    nObservations = len(codes)
+    nStates = len(priors)
+    logTransitions = np.log(transitions + tinyNum)
+    # Log emission probabilities of all states, for each observation
+    logEmissions = np.log(emissions.T + tinyNum)[codes]
+    v = np.zeros((nObservations, nStates)) # initialise viterbi table
+    backPointers = np.zeros((nObservations, nStates), dtype=np.intp)
+    viterbiCodes = np.zeros(nObservations, dtype=np.intp)
+    if nObservations == 0:
+        return viterbiCodes, v
+
+    # Set prior state values for first observation...
+    v[0, :] = np.log(priors * emissions[:, codes[0]] + tinyNum)
+    # Fill in remaning matrix observations
+    # Use log space as multiplying successively smaller p values)
+    paths = np.zeros((nStates, nStates))
+    for k in range(1, nObservations):
+        # paths[i, j]: log probability of best path to state i, then to j
+        np.add(v[k-1, :, np.newaxis], logTransitions, out=paths)
+        np.argmax(paths, axis=0, out=backPointers[k])
+        np.add(logEmissions[k], np.max(paths, axis=0), out=v[k])
+
+    # Pick most probable state for final observation, then work backwards
+    viterbiCodes[-1] = np.argmax(v[-1])
+    for k in range(nObservations - 1, 0, -1):
+        viterbiCodes[k-1] = backPointers[k, viterbiCodes[k]]
+    return viterbiCodes, v
 
 
 
@@ -399,11 +711,11 @@ def perParticipantSummaryHTML(dfParam, yTrueCol, yPredCol, pidCol, outHTML):
 def saveModelsToTar(tarArchive, featureCols, rfModel, priors, transitions,
     emissions, METs, featuresTxt="featureCols.txt", rfModelFile="rfModel.pkl",
     hmmPriors="hmmPriors.npy", hmmEmissions="hmmEmissions.npy",
-    hmmTransitions="hmmTransitions.npy", hmmMETs="METs.npy"):
+    hmmTransitions="hmmTransitions.npy", hmmMETs="METs.npy", mappable=False):
     """Save random forest and hidden markov models to tarArchive file
 
     Note we must use the same version of python and scikit learn as in the
-    intended deployment environment
+    intended deployment environment, unless <mappable>
 
     :param str tarArchive: Output tarfile
     :param list featureCols: Input list of feature columns
@@ -420,6 +732,10 @@ def saveModelsToTar(tarArchive, featureCols, rfModel, priors, transitions,
     :param str hmmEmissions: Intermediate output HMM emissions npy
     :param str hmmTransitions: Intermediate output HMM transitions npy
     :param str hmmMETs: Intermediate output HMM METs npy
+    :param bool mappable: Instead of a compressed pickle, store the random
+        forest as uncompressed node arrays (see flattenForest()), which
+        loadModel() memory-maps so that all processes using the model share
+        one copy of it in memory
 
     :return: tar file of RF + HMM written to tarArchive
     :rtype: void
@@ -430,7 +746,15 @@ def saveModelsToTar(tarArchive, featureCols, rfModel, priors, transitions,
     np.save(hmmEmissions, emissions)
     np.save(hmmTransitions, transitions)
     np.save(hmmMETs, METs)
-    joblib.dump(rfModel, rfModelFile, compress=9)
+    if mappable:
+        rfModelFiles = []
+        for key, values in flattenForest(rfModel).items():
+            rfModelFiles.append(FOREST_FILE_PREFIX + key[0].upper() + key[1:] +
+                '.npy')
+            np.save(rfModelFiles[-1], values)
+    else:
+        rfModelFiles = [rfModelFile]
+        joblib.dump(rfModel, rfModelFile, compress=9)
 
     # Create single .tar file...
     tarOut = tarfile.open(tarArchive, mode='w')
@@ -439,7 +763,8 @@ def saveModelsToTar(tarArchive, featureCols, rfModel, priors, transitions,
     tarOut.add(hmmEmissions)
     tarOut.add(hmmTransitions)
     tarOut.add(hmmMETs)
-    tarOut.add(rfModelFile)
+    for f in rfModelFiles:
+        tarOut.add(f)
     tarOut.close()
 
     # Remove intermediate files
@@ -448,11 +773,36 @@ def saveModelsToTar(tarArchive, featureCols, rfModel, priors, transitions,
     os.remove(hmmEmissions)
     os.remove(hmmTransitions)
     os.remove(hmmMETs)
-    os.remove(rfModelFile)
+    for f in rfModelFiles:
+        os.remove(f)
     print('Models saved to', tarArchive)
 
 
 
+def saveMappableModel(activityModel, outputModel):
+    """Convert an activity model to the mappable format of saveModelsToTar()
+
+    Processes using a mappable model share one copy of its random forest in
+    memory, but its predictions (see predictFlatForest()) take about twice the
+    CPU time of the sklearn random forest it was converted from. The format
+    only exists to save memory, it is never faster.
+
+    :param str activityModel: Input tar model file
+    :param str outputModel: Output tar model file
+
+    :return: Mappable model written to <outputModel>
+    :rtype: void
+    """
+
+    model = loadModel(activityModel)
+    if model['rf'] is None:
+        raise ValueError(activityModel + " is already mappable")
+    saveModelsToTar(outputModel, model['featureCols'], model['rf'],
+        model['priors'], model['transitions'], model['emissions'], model['METs'],
+        mappable=True)
+
+
+
 def getFileFromTar(tarArchive, targetFile):
     """Read file from tar
 
@@ -466,9 +816,9 @@ def getFileFromTar(tarArchive, targetFile):
     :rtype: object
     """
 
-    t = tarfile.open(tarArchive, 'r')
-    array_file = BytesIO()
-    array_file.write(t.extractfile(targetFile).read())
+    with tarfile.open(tarArchive, 'r') as t:
+        array_file = BytesIO()
+        array_file.write(t.extractfile(targetFile).read())
     array_file.seek(0)
     return array_file
 
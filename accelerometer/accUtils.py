@@ -1,14 +1,23 @@
 """Module to provide generic utilities for other accelerometer modules."""
 
 from collections import OrderedDict
+from contextlib import contextmanager
 import datetime
 import glob
+import hashlib
 import json
 import math
 import numpy as np
 import os
 import pandas as pd
 import re
+import sys
+import time
+import zipfile
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 DAYS = ['mon', 'tue', 'wed', 'thur', 'fri', 'sat', 'sun']
 TIME_SERIES_COL = 'time'
@@ -104,8 +113,235 @@ def toScreen(msg):
 
 
 
+# Peak RSS (MB) of each processing stage in progress, innermost stage last
+_stagePeakRSS = []
+# Running child processes (e.g. the java ParserWorker) to include in stages
+_liveChildPids = set()
+
+
+@contextmanager
+def timeStage(summary, stage):
+    """Record wall time, CPU time and peak memory of a processing stage
+
+    Adds 'processing-<stage>-wallTime(s)', 'processing-<stage>-cpuTime(s)' and
+    'processing-<stage>-peakRSS(MB)' to <summary>. CPU time includes child
+    processes (e.g. the java parser) that finished during the stage, and
+    running ones added by trackChildProcess(). Peak RSS is the largest peak of
+    this process or any such child during the stage: on Linux, peaks are reset
+    at the start of each stage (see resetPeakRSS()). Elsewhere peaks cannot be
+    reset, so the high-water mark of this process and its finished children
+    since they started is recorded as 'processing-<stage>-peakRSSSoFar(MB)'
+    instead. Without the resource module (i.e. on Windows), CPU time excludes
+    child processes and peak RSS is not recorded.
+
+    :param dict summary: Output dictionary containing all summary metrics
+    :param str stage: Name of processing stage e.g. "epochLoad"
+
+    :return: Stage timings written to dict <summary>
+    :rtype: void
+
+    :Example:
+    >>> import accUtils
+    >>> summary = {}
+    >>> with accUtils.timeStage(summary, "epochLoad"):
+            e = accUtils.loadEpochFile("epoch.csv.gz")
+    <summary['processing-epochLoad-wallTime(s)'] etc. updated>
+    """
+
+    wallStart = time.perf_counter()
+    cpuStart = getCpuTime()
+    # Enclosing stages keep the peaks reached so far, before they are reset
+    addStagePeakRSS(getLivePeakRSS())
+    isReset = resetPeakRSS()
+    _stagePeakRSS.append(0.0)
+    try:
+        yield
+    finally:
+        peakRSS = max(_stagePeakRSS.pop(), getLivePeakRSS() or 0.0)
+    addStagePeakRSS(peakRSS)
+    prefix = 'processing-' + stage + '-'
+    summary[prefix + 'wallTime(s)'] = formatNum(time.perf_counter() - wallStart, 3)
+    summary[prefix + 'cpuTime(s)'] = formatNum(getCpuTime() - cpuStart, 3)
+    if isReset:
+        summary[prefix + 'peakRSS(MB)'] = formatNum(peakRSS, 1)
+    else:
+        peakRSSSoFar = getPeakRSS()
+        if peakRSSSoFar is not None:
+            summary[prefix + 'peakRSSSoFar(MB)'] = formatNum(peakRSSSoFar, 1)
+
+
+
+def getCpuTime():
+    """Get CPU time (user + system) of this process and its children
+
+    Children are counted once finished, or while running if added by
+    trackChildProcess().
+
+    :return: CPU time in seconds
+    :rtype: float
+    """
+
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    liveCpuTime = 0.0
+    for pid in list(_liveChildPids):
+        try:
+            with open('/proc/%d/stat' % pid) as f:
+                # fields after the (command name) start with state, at field 3
+                fields = f.read().rpartition(')')[2].split()
+            liveCpuTime += (int(fields[11]) + int(fields[12])) / \
+                os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            pass
+    return usage.ru_utime + usage.ru_stime + childUsage.ru_utime + \
+        childUsage.ru_stime + liveCpuTime
+
+
+
+def getPeakRSS():
+    """Get peak resident set size of this process or any finished child
+
+    This is the high-water mark since each process started, see timeStage()
+    for per-stage peaks.
+
+    :return: Peak RSS in MB, or None if not available
+    :rtype: float
+    """
+
+    if resource is None:
+        return None
+    return maxRSStoMB(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                          resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+
+
+
+def maxRSStoMB(maxRSS):
+    """Convert ru_maxrss of resource.getrusage() or os.wait4() to MB
+
+    :param int maxRSS: Peak RSS, in bytes on macOS, and kilobytes on Linux
+
+    :return: Peak RSS in MB
+    :rtype: float
+    """
+
+    return maxRSS / 2**20 if sys.platform == 'darwin' else maxRSS / 2**10
+
+
+
+def getLivePeakRSS():
+    """Get peak RSS of this process and running tracked children, since reset
+
+    :return: Largest VmHWM in MB, or None if not available (i.e. not Linux)
+    :rtype: float
+    """
+
+    peaks = []
+    for pid in ['self'] + list(_liveChildPids):
+        try:
+            with open('/proc/%s/status' % pid) as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks.append(int(line.split()[1]) / 2**10) # kB
+        except (OSError, ValueError):
+            pass
+    return max(peaks) if peaks else None
+
+
+
+def resetPeakRSS():
+    """Reset peak RSS of this process and running tracked children to current
+
+    :return: Whether peaks could be reset (Linux only)
+    :rtype: bool
+    """
+
+    isReset = True
+    for pid in ['self'] + list(_liveChildPids):
+        try:
+            with open('/proc/%s/clear_refs' % pid, 'w') as f:
+                f.write('5')
+        except OSError:
+            isReset = isReset and pid != 'self'
+    return isReset
+
+
+
+def addStagePeakRSS(peakRSS):
+    """Count a peak RSS in all processing stages in progress
+
+    :param float peakRSS: Peak RSS in MB, or None
+
+    :return: Peaks of stages in progress updated
+    :rtype: void
+    """
+
+    if peakRSS is not None:
+        for i, stagePeak in enumerate(_stagePeakRSS):
+            _stagePeakRSS[i] = max(stagePeak, peakRSS)
+
+
+
+def trackChildProcess(pid):
+    """Include a running child process in the CPU time and peak RSS of stages
+
+    :param int pid: Process ID of child e.g. a java ParserWorker
+
+    :return: Child added to tracked processes
+    :rtype: void
+    """
+
+    _liveChildPids.add(pid)
+    try:
+        with open('/proc/%d/clear_refs' % pid, 'w') as f:
+            f.write('5') # only count its peak from now on
+    except OSError:
+        pass
+
+
+
+def untrackChildProcess(pid):
+    """Stop tracking a child process, before waiting for it to finish
+
+    Its peak RSS is added to stages in progress, and once finished its CPU
+    time is counted with other finished children.
+
+    :param int pid: Process ID of child added by trackChildProcess()
+
+    :return: Child removed from tracked processes
+    :rtype: void
+    """
+
+    if pid in _liveChildPids:
+        addStagePeakRSS(getLivePeakRSS())
+        _liveChildPids.discard(pid)
+
+
+
+def waitChildProcess(process):
+    """Wait for a child process to finish, counting its peak RSS in stages
+
+    :param subprocess.Popen process: Child process
+
+    :return: Exit code of <process>
+    :rtype: int
+    """
+
+    if process.returncode is not None or not hasattr(os, 'wait4'):
+        return process.wait()
+    pid, status, usage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    addStagePeakRSS(maxRSStoMB(usage.ru_maxrss))
+    return process.returncode
+
+
+
 def writeStudyAccProcessCmds(accDir, outDir, cmdsFile='processCmds.txt',
-        accExt="cwa", cmdOptions=None, filesCSV="files.csv"):
+        accExt="cwa", cmdOptions=None, filesCSV="files.csv", filesPerCmd=1):
     """Read files to process and write out list of processing commands
 
     This creates the following output directory structure containing all
@@ -121,7 +357,10 @@ def writeStudyAccProcessCmds(accDir, outDir, cmdsFile='processCmds.txt',
     If a filesCSV exists in accDir/, process the files listed there. If not,
     all files in accDir/ are processed
 
-    Then an acc processing command is written for each file and written to cmdsFile
+    Then an acc processing command is written for each file and written to cmdsFile.
+    With <filesPerCmd> > 1, consecutive files with the same options in filesCSV
+    share a command, which runs the java parser in one ParserWorker process
+    for all of them (see accProcess --useParserWorker)
 
     :param str accDirs: Directory(s) with accelerometer files to process
     :param str outDir: Output directory to be created containing the processing results
@@ -130,6 +369,7 @@ def writeStudyAccProcessCmds(accDir, outDir, cmdsFile='processCmds.txt',
     :param str cmdOptions: String of processing options e.g. "--epochPeriod 10"
         Type 'python3 accProccess.py -h' for full list of options
     :param str filesCSV: Name of .csv file listing acc files to process
+    :param int filesPerCmd: Maximum number of files processed by each command
 
     :return: New file written to <cmdsFile>
     :rtype: void
@@ -169,11 +409,23 @@ def writeStudyAccProcessCmds(accDir, outDir, cmdsFile='processCmds.txt',
         )
         fileList.to_csv(os.path.join(accDir, filesCSV), index=False)
 
+    # Group consecutive files with the same options in filesCSV
+    cmdFiles = []
+    for i, row in fileList.iterrows():
+        # Grab additional arguments provided in filesCSV (e.g. calibration params) 
+        cmdOptionsCSV = ' '.join(['--{} {}'.format(col, row[col]) for col in fileList.columns[1:]])
+        fileName = '"{:s}"'.format(os.path.join(accDir, row['fileName']))
+        if cmdFiles and cmdFiles[-1][1] == cmdOptionsCSV and \
+                len(cmdFiles[-1][0]) < filesPerCmd:
+            cmdFiles[-1][0].append(fileName)
+        else:
+            cmdFiles.append(([fileName], cmdOptionsCSV))
+
     with open(cmdsFile, 'w') as f:
-        for i, row in fileList.iterrows():
+        for fileNames, cmdOptionsCSV in cmdFiles:
 
             cmd = [
-                'python3 accProcess.py "{:s}"'.format(os.path.join(accDir, row['fileName'])),
+                'python3 accProcess.py {:s}'.format(' '.join(fileNames)),
                 '--summaryFolder "{:s}"'.format(summaryDir),
                 '--epochFolder "{:s}"'.format(epochDir),
                 '--timeSeriesFolder "{:s}"'.format(timeSeriesDir),
@@ -184,9 +436,6 @@ def writeStudyAccProcessCmds(accDir, outDir, cmdsFile='processCmds.txt',
                 '--outputFolder "{:s}"'.format(outDir)
                 ]
 
-            # Grab additional arguments provided in filesCSV (e.g. calibration params) 
-            cmdOptionsCSV = ' '.join(['--{} {}'.format(col, row[col]) for col in fileList.columns[1:]])
-
             if cmdOptions:
                 cmd.append(cmdOptions)
             if cmdOptionsCSV:
@@ -246,6 +495,60 @@ def collateJSONfilesToSingleCSV(inputJsonDir, outputCsvFile):
     os.remove(tmpJsonFile)
     print('Summary of', str(len(dAcc)), 'participants written to:', outputCsvFile)
 
+    # report where processing time goes across all files
+    stageSummary = summariseProcessingStages(dAcc)
+    if stageSummary is not None:
+        print('Processing stages across all files:')
+        print(stageSummary.to_string())
+
+
+
+def summariseProcessingStages(summaryDf):
+    """Summarise processing time and memory of each stage across files
+
+    :param pandas.DataFrame summaryDf: One row of summary values per file, with
+        'processing-<stage>-...' columns recorded by timeStage()
+
+    :return: Per stage number of files, median/total wall time, share of all
+        stages' wall time, median CPU time and max peak RSS, or None if no
+        stages were recorded
+    :rtype: pandas.DataFrame
+
+    :Example:
+    >>> import accUtils
+    >>> import pandas as pd
+    >>> accUtils.summariseProcessingStages(pd.read_csv("summary-all-files.csv"))
+    <pandas.DataFrame indexed by stage>
+    """
+
+    wallSuffix = '-wallTime(s)'
+    stages = [col[len('processing-'):-len(wallSuffix)] for col in summaryDf.columns
+              if col.startswith('processing-') and col.endswith(wallSuffix)]
+    if not stages:
+        return None
+
+    rows = OrderedDict()
+    for stage in stages:
+        prefix = 'processing-' + stage + '-'
+        wallTime = pd.to_numeric(summaryDf[prefix + 'wallTime(s)'])
+        row = OrderedDict()
+        row['files'] = wallTime.count()
+        row['medianWallTime(s)'] = wallTime.median()
+        row['totalWallTime(s)'] = wallTime.sum()
+        if prefix + 'cpuTime(s)' in summaryDf:
+            row['medianCpuTime(s)'] = pd.to_numeric(summaryDf[prefix + 'cpuTime(s)']).median()
+        if prefix + 'peakRSS(MB)' in summaryDf:
+            row['maxPeakRSS(MB)'] = pd.to_numeric(summaryDf[prefix + 'peakRSS(MB)']).max()
+        if prefix + 'peakRSSSoFar(MB)' in summaryDf:
+            row['maxPeakRSSSoFar(MB)'] = pd.to_numeric(
+                summaryDf[prefix + 'peakRSSSoFar(MB)']).max()
+        rows[stage] = row
+    stageSummary = pd.DataFrame.from_dict(rows, orient='index')
+    stageSummary.index.name = 'stage'
+    stageSummary.insert(3, 'wallTime(%)',
+        (100 * stageSummary['totalWallTime(s)'] / stageSummary['totalWallTime(s)'].sum()).round(1))
+    return stageSummary
+
 
 
 def identifyUnprocessedFiles(filesCsv, summaryCsv, outputFilesCsv):
@@ -427,6 +730,233 @@ def createDirIfNotExists(folder):
 
 
 
+def getFileFingerprint(inputFile, headerBytes=65536, blockBytes=4096, numBlocks=32):
+    """Get a fast fingerprint of a (potentially very large) file
+
+    Instead of hashing the whole file, hash its size, header, and <numBlocks>
+    evenly spaced blocks (including the final block).
+
+    :param str inputFile: File to fingerprint
+    :param int headerBytes: Number of bytes of header to hash
+    :param int blockBytes: Number of bytes to hash per sampled block
+    :param int numBlocks: Number of sampled blocks
+
+    :return: Hex digest of file fingerprint
+    :rtype: str
+    """
+
+    fileSize = os.path.getsize(inputFile)
+    fingerprint = hashlib.sha1(str(fileSize).encode())
+    with open(inputFile, 'rb') as f:
+        fingerprint.update(f.read(headerBytes))
+        for offset in np.linspace(0, max(fileSize - blockBytes, 0), numBlocks):
+            f.seek(int(offset))
+            fingerprint.update(f.read(blockBytes))
+    return fingerprint.hexdigest()
+
+
+
+def loadEpochFile(epochFile, columns=None, float32Cols=None, useCache=False):
+    """Load epoch file written by the java AccelerometerParser
+
+    Both the .csv(.gz) text format and the binary .npz format are supported.
+    The .npz format stores typed columns, with time as Unix milliseconds and
+    the timezone given once in its metadata, so no text needs to be parsed.
+
+    :param str epochFile: Input .csv.gz or .npz file of processed epoch data
+    :param list(str) columns: Only load these columns (if present in file),
+        or all columns if None
+    :param list(str) float32Cols: Columns to store as float32 instead of float64
+    :param bool useCache: Load a .csv(.gz) file from its .npz sidecar cache
+        (see getEpochCacheFile()) if still valid for the same <columns> and
+        <float32Cols>, else parse it and write the cache for later loads
+
+    :return: Epoch data indexed by (timezone-aware) time, with any 'label'
+        column stored as categorical
+    :rtype: pandas.DataFrame
+    """
+
+    dtype = {col: 'float32' for col in (float32Cols or [])}
+    dtype['label'] = 'category'
+
+    if epochFile.lower().endswith('.npz'):
+        return loadEpochNpz(epochFile, columns, dtype)
+
+    if useCache:
+        cacheFile = getEpochCacheFile(epochFile)
+        cacheKey = getEpochCacheKey(epochFile, columns, float32Cols)
+        if loadEpochCacheKey(cacheFile) == cacheKey:
+            return loadEpochNpz(cacheFile, columns, dtype)
+
+    usecols = None
+    if columns is not None:
+        usecols = lambda col: col == 'time' or col in columns
+    e = pd.read_csv(epochFile, index_col=['time'], usecols=usecols, dtype=dtype)
+    e.index = date_parser_vectorised(e.index)
+    if useCache:
+        # Cache the columns as loaded, so a cache miss costs no more memory
+        saveEpochCache(cacheFile, e, cacheKey)
+    return e
+
+
+
+def loadEpochNpz(epochFile, columns, dtype):
+    """Load .npz epoch file (or cache), see loadEpochFile()
+
+    :param str epochFile: Input .npz file of processed epoch data
+    :param list(str) columns: Only load these columns (if present in file),
+        or all columns if None
+    :param dict dtype: Types of columns to convert, if present in file
+
+    :return: Epoch data indexed by (timezone-aware) time
+    :rtype: pandas.DataFrame
+    """
+
+    with np.load(epochFile) as npz:
+        metadata = json.loads(npz['metadata.json'])
+        fileCols = metadata['columns']
+        if columns is not None:
+            fileCols = [col for col in fileCols if col in columns]
+        time = pd.to_datetime(npz['time'], unit='ms', utc=True)
+        e = pd.DataFrame({col: npz[col] for col in fileCols if col != 'time'},
+            index=pd.DatetimeIndex(time.tz_convert(metadata['timeZone']),
+                                   name='time'))
+    return e.astype({col: t for col, t in dtype.items() if col in e.columns})
+
+
+
+EPOCH_CACHE_VERSION = 2
+
+
+def getEpochCacheFile(epochFile):
+    """Get filename of the sidecar cache of a .csv(.gz) epoch file
+
+    :param str epochFile: Input .csv.gz file of processed epoch data
+
+    :return: Cache filename e.g. "sample-epoch-cache.npz" for "sample-epoch.csv.gz"
+    :rtype: str
+    """
+
+    return re.sub(r'\.csv(\.gz)?$', '', epochFile, flags=re.IGNORECASE) + '-cache.npz'
+
+
+
+def getEpochCacheKey(epochFile, columns=None, float32Cols=None):
+    """Get key identifying the current contents of an epoch file, as loaded
+
+    :param str epochFile: Input .csv.gz file of processed epoch data
+    :param list(str) columns: Columns loaded, see loadEpochFile()
+    :param list(str) float32Cols: Columns loaded as float32, see loadEpochFile()
+
+    :return: Cache format version, the file's size, modification time and
+        fingerprint (see getFileFingerprint()), and the loaded columns
+    :rtype: dict
+    """
+
+    stat = os.stat(epochFile)
+    return {'version': EPOCH_CACHE_VERSION, 'size': stat.st_size,
+        'mtime': stat.st_mtime_ns, 'fingerprint': getFileFingerprint(epochFile),
+        # as lists, to compare equal to keys loaded from json
+        'columns': None if columns is None else list(columns),
+        'float32Cols': sorted(float32Cols or [])}
+
+
+
+def loadEpochCacheKey(cacheFile):
+    """Load key of the epoch file which <cacheFile> was saved from
+
+    :param str cacheFile: Epoch cache file written by saveEpochCache()
+
+    :return: Key as getEpochCacheKey(), or None if there is no readable cache
+    :rtype: dict
+    """
+
+    try:
+        with np.load(cacheFile) as npz:
+            return json.loads(npz['metadata.json']).get('cacheKey')
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+
+def saveEpochCache(cacheFile, e, cacheKey):
+    """Save parsed epoch data in the .npz epoch file format, for fast reloading
+
+    Epoch data which cannot be stored exactly (non-numeric columns, or times
+    that are not whole milliseconds) is not cached. Writing the cache is best
+    effort: if it fails (e.g. read-only or full folder), processing continues.
+
+    :param str cacheFile: Output epoch cache file
+    :param pandas.DataFrame e: Epoch data, as loaded by loadEpochFile()
+    :param dict cacheKey: Key of the epoch file, see getEpochCacheKey()
+
+    :return: Epoch data written to <cacheFile>
+    :rtype: void
+    """
+
+    time = e.index.asi8
+    if (e.index.tz is None or np.any(time % 1000000 != 0) or
+        not all(pd.api.types.is_numeric_dtype(t) for t in e.dtypes)):
+        return
+    metadata = {'columns': ['time'] + list(e.columns),
+        'timeZone': str(e.index.tz), 'cacheKey': cacheKey}
+    # write then rename, so concurrent runs never read a partial cache file
+    tmpFile = cacheFile + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with zipfile.ZipFile(tmpFile, 'w') as npz:
+            npz.writestr('metadata.json', json.dumps(metadata))
+            for col, values in [('time', time // 1000000)] + \
+                [(col, e[col].to_numpy()) for col in e.columns]:
+                with npz.open(col + '.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, values, allow_pickle=False)
+        os.replace(tmpFile, cacheFile)
+    except OSError as excep:
+        print("Could not write epoch cache", cacheFile, ":", excep)
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+
+
+
+def iterEpochFile(epochFile, chunkRows, columns=None, float32Cols=None):
+    """Iterate over epoch file in chunks of consecutive rows
+
+    Arguments are as loadEpochFile(). A .csv(.gz) file is parsed one chunk at a
+    time. Each column of a .npz file can only be read whole, so only the
+    requested <columns> are loaded before being split into chunks.
+
+    :param str epochFile: Input .csv.gz or .npz file of processed epoch data
+    :param int chunkRows: Number of rows in each chunk e.g. epochs in one day
+    :param list(str) columns: Only load these columns (if present in file),
+        or all columns if None
+    :param list(str) float32Cols: Columns to store as float32 instead of float64
+
+    :return: Epoch data chunks indexed by (timezone-aware) time
+    :rtype: iterator(pandas.DataFrame)
+    """
+
+    if epochFile.lower().endswith('.npz'):
+        e = loadEpochFile(epochFile, columns, float32Cols)
+        for i in range(0, len(e), chunkRows):
+            yield e.iloc[i:i + chunkRows].copy()
+        return
+
+    dtype = {col: 'float32' for col in (float32Cols or [])}
+    dtype['label'] = 'category'
+    usecols = None
+    if columns is not None:
+        usecols = lambda col: col == 'time' or col in columns
+    # not a context manager before pandas 1.2
+    reader = pd.read_csv(epochFile, index_col=['time'], usecols=usecols,
+        dtype=dtype, chunksize=chunkRows)
+    try:
+        for e in reader:
+            e.index = date_parser_vectorised(e.index)
+            yield e
+    finally:
+        reader.close()
+
+
+
 def date_parser(t):
     '''
     Parse date a date string of the form e.g.
@@ -440,6 +970,21 @@ def date_parser(t):
 
 
 
+def date_parser_vectorised(t):
+    '''
+    Parse a whole column of date strings of the form e.g.
+    2020-06-14 19:01:15.123+0100 [Europe/London]
+    at once. Assumes all strings share the timezone of the first one.
+    '''
+    t = pd.Index(t).astype(str)
+    tz = re.search(r'(?<=\[).+?(?=\])', t[0]) if len(t) > 0 else None
+    if tz is not None:
+        tz = tz.group()
+    t = t.str.replace(r'\s*\[.*\]$', '', regex=True)
+    return pd.DatetimeIndex(pd.to_datetime(t, utc=True).tz_convert(tz), name=t.name)
+
+
+
 def date_strftime(t):
     '''
     Convert to time format of the form e.g.
@@ -450,6 +995,65 @@ def date_strftime(t):
 
 
 
+def getIntegerTime(index):
+    """Get epoch times as integers, so calendar fields need no timezone lookups
+
+    :param pandas.DatetimeIndex index: (Timezone-aware) epoch times
+
+    :return: Unix time in milliseconds (UTC) of each epoch
+    :rtype: numpy.ndarray
+
+    :return: Offset of local time from UTC (in milliseconds) of each epoch
+    :rtype: numpy.ndarray
+    """
+
+    utcMs = index.asi8 // 1000000
+    if index.tz is None:
+        return utcMs, np.zeros_like(utcMs)
+    # One timezone conversion, instead of one for each calendar field
+    return utcMs, index.tz_localize(None).asi8 // 1000000 - utcMs
+
+
+
+def formatIntegerTime(utcMs, offsetMs, timeZone):
+    """Format times as date_strftime() does, using integer arithmetic
+
+    :param numpy.ndarray utcMs: Unix time in milliseconds (UTC)
+    :param numpy.ndarray offsetMs: Offset of local time from UTC (in milliseconds)
+    :param str timeZone: Timezone in country/city format e.g. "Europe/London",
+        or None if times are not timezone-aware
+
+    :return: Times of the form e.g. 2020-06-14 19:01:15.123000+0100 [Europe/London]
+    :rtype: numpy.ndarray
+    """
+
+    # e.g. "2020-06-14T19:01:15.123000", as 26 (UCS4) characters per row
+    local = np.datetime_as_string((utcMs + offsetMs).astype('datetime64[ms]'),
+        unit='us')
+    local = local.astype('U26').view(np.uint32).reshape(len(local), 26)
+    # Format each distinct offset only once e.g. 3600000 -> "+0100"
+    offsets, inverse = np.unique(offsetMs, return_inverse=True)
+    offsetWidth = 5 if timeZone is not None else 0
+    offsetChars = np.zeros((len(offsets), offsetWidth), dtype=np.uint32)
+    if timeZone is not None:
+        offsetMins = np.abs(offsets) // 60000
+        offsetStrs = ['%s%02d%02d' % ('-' if offset < 0 else '+', mins // 60,
+            mins % 60) for offset, mins in zip(offsets, offsetMins)]
+        offsetChars[:] = np.array(offsetStrs, dtype='U5').view(np.uint32).reshape(
+            len(offsets), 5)
+    suffixChars = np.array([' [%s]' % timeZone]).view(np.uint32)
+
+    # Write characters of all rows into one buffer, then view it as strings
+    end = 26 + offsetWidth
+    chars = np.empty((len(local), end + len(suffixChars)), dtype=np.uint32)
+    chars[:, :26] = local
+    chars[:, 10] = ord(' ')
+    chars[:, 26:end] = offsetChars[inverse]
+    chars[:, end:] = suffixChars
+    return chars.view('U%d' % chars.shape[1]).ravel()
+
+
+
 def writeTimeSeries(e, labels, tsFile):
     """ Write activity timeseries file
     :param pandas.DataFrame e: Pandas dataframe of epoch data. Must contain
@@ -460,6 +1064,19 @@ def writeTimeSeries(e, labels, tsFile):
     :return: None
     :rtype: void
     """
+    getTimeSeries(e, labels).to_csv(tsFile, compression='gzip')
+
+
+
+def getTimeSeries(e, labels):
+    """ Get activity timeseries rows, as written by writeTimeSeries()
+    :param pandas.DataFrame e: Pandas dataframe of epoch data. Must contain
+        activity classification columns with missing rows imputed.
+    :param list(str) labels: Activity state labels
+
+    :return: Timeseries indexed by formatted time
+    :rtype: pandas.DataFrame
+    """
     cols = ['accImputed']
     cols_new = ['acc']
 
@@ -478,6 +1095,7 @@ def writeTimeSeries(e, labels, tsFile):
 
     # make output time format contain timezone
     # e.g. 2020-06-14 19:01:15.123000+0100 [Europe/London]
-    e_new.index = e_new.index.to_series(keep_tz=True).apply(date_strftime)
-    
-    e_new.to_csv(tsFile, compression='gzip')
+    tz = e.index.tz
+    e_new.index = pd.Index(formatIntegerTime(*getIntegerTime(e.index),
+        None if tz is None else str(tz)), name='time')
+    return e_new
@@ -0,0 +1,668 @@
+"""Module to summarise epoch data one day at a time, with bounded memory
+
+The summary is the same as summariseEpoch.getActivitySummary(), but the epoch
+file is read in chunks of one day. Each chunk is reduced to mergeable totals
+(counts, sums and sums of squared deviations for every minute of the week, and
+intensity distribution counts), and summary metrics are derived from these
+totals once the whole file has been read. Missing values are imputed from the
+minute of day averages of the whole recording, so imputed metrics are also
+derived from the totals, by adding the imputed value of each minute once for
+every missing epoch in that minute.
+"""
+
+from accelerometer import accClassification
+from accelerometer import accUtils
+from accelerometer import summariseEpoch
+import gzip
+import numpy as np
+import pandas as pd
+import pytz
+import sys
+
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def getActivitySummaryChunked(epochFile, nonWearFile, summary, tsFile=None,
+    activityClassification=True, timeZone='Europe/London',
+    startTime=None, endTime=None,
+    epochPeriod=30, stationaryStd=13, minNonWearDuration=60,
+    mgCutPointMVPA=100, mgCutPointVPA=425,
+    activityModel="activityModels/walmsley-jan21.tar",
+    intensityDistribution=False, useRecommendedImputation=True,
+    verbose=False):
+    """Calculate overall activity summary from <epochFile>, one day at a time
+
+    Memory use does not grow with recording length, except for one activity
+    state and one minute of the week per epoch (3 bytes) kept when
+    <activityClassification>, as HMM smoothing needs the whole recording. The
+    epoch file is read a second time to write the time series to <tsFile>.
+    Circadian rhythm metrics need the whole recording, so are not supported.
+
+    Summary values equal those of getActivitySummary() up to floating point
+    rounding, as totals are merged one chunk at a time. The epoch file must be
+    in time order, as written by the java AccelerometerParser.
+
+    :param str epochFile: Input csv.gz (or .npz) file of processed epoch data
+    :param str nonWearFile: Output filename for non wear .csv.gz episodes
+    :param dict summary: Output dictionary containing all summary metrics
+    :param str tsFile: Output filename for .csv.gz time series, or None
+    :param bool activityClassification: Perform machine learning of activity states
+    :param str timeZone: timezone in country/city format to be used for daylight
+        savings crossover check
+    :param datetime startTime: Remove data before this time in analysis
+    :param datetime endTime: Remove data after this time in analysis
+    :param int epochPeriod: Size of epoch time window (in seconds)
+    :param int stationaryStd: Threshold (in mg units) for stationary vs not
+    :param int minNonWearDuration: Minimum duration of nonwear events (minutes)
+    :param int mgCutPointMVPA: Milli-gravity threshold for moderate intensity activity
+    :param int mgCutPointVPA: Milli-gravity threshold for vigorous intensity activity
+    :param str activityModel: Input tar model file which contains random forest
+        pickle model, HMM priors/transitions/emissions npy files, and npy file
+        of METS for each activity state
+    :param bool intensityDistribution: Add intensity outputs to dict <summary>
+    :param bool useRecommendedImputation: Highly recommended method to impute
+        missing data using data from other days around the same time
+    :param bool verbose: Print verbose output
+
+    :return: Activity prediction labels (empty if <activityClassification>==False)
+    :rtype: list(str)
+
+    :return: Write .csv.gz non wear episodes file to <nonWearFile>, and .csv.gz
+        time series file to <tsFile>
+    :rtype: void
+
+    :return: Movement summary values written to dict <summary>
+    :rtype: void
+
+    :Example:
+    >>> from accelerometer import chunkedSummary
+    >>> summary = {}
+    >>> labels = chunkedSummary.getActivitySummaryChunked("epoch.csv.gz",
+            "nonWear.csv.gz", summary, "timeSeries.csv.gz")
+    <nonWear and time series files written, and dict "summary" updated>
+    """
+
+    accUtils.toScreen("=== Summarizing (one day at a time) ===")
+
+    columns, float32Cols = summariseEpoch.getEpochColumns(activityClassification,
+        activityModel)
+    chunks = iterFilledChunks(epochFile, columns, float32Cols, epochPeriod,
+        timeZone, startTime, endTime)
+    maxStd = stationaryStd / 1000.0 # java uses Gravity units (not mg)
+    minNonWearNs = minNonWearDuration * 60 * 10**9
+    model, labels = None, []
+    if activityClassification:
+        model = accClassification.loadModel(activityModel)
+        labels = model['labels']
+
+    firstTime = lastTime = None
+    interruptMins = []
+    episodes, openEpisode = [], None
+    pending = None
+    totals = {'acc': newTotals(), 'CutPointMVPA': newTotals(),
+        'CutPointVPA': newTotals()}
+    ecdfCounts = np.zeros((MINUTES_PER_DAY, len(summariseEpoch.getEcdfXVals())))
+    dataTotals = {'totalReads': 0, 'clipsBeforeCalibration': 0,
+        'clipsAfterCalibration': 0}
+    codes, cells = [], []
+
+    with accUtils.timeStage(summary, 'chunkedSummary'):
+        for e, chunkInterruptMins, chunkTimes in chunks:
+            if firstTime is None:
+                firstTime = chunkTimes[0]
+            lastTime = chunkTimes[-1]
+            interruptMins.append(chunkInterruptMins)
+
+            # Epochs at the end of a chunk may start a nonWear episode which is
+            # only long enough once later chunks are read, so are held back
+            if pending is not None:
+                e = pd.concat([pending, e])
+            newEpisodes, openEpisode, numFinal = maskNonWear(e, maxStd,
+                minNonWearNs, openEpisode)
+            episodes += newEpisodes
+            pending = e.iloc[numFinal:]
+
+            addChunkTotals(e.iloc[:numFinal], totals, ecdfCounts, dataTotals,
+                mgCutPointMVPA, mgCutPointVPA, intensityDistribution)
+            if activityClassification:
+                codes.append(predictActivity(e.iloc[:numFinal], model))
+                cells.append(getMinuteOfWeek(e.index[:numFinal]).astype('int16'))
+
+        # Quit if no data left
+        if firstTime is None:
+            print("No rows remaining after start/end time removal")
+            sys.exit(-9)
+        if pending is not None and len(pending) > 0:
+            addChunkTotals(pending, totals, ecdfCounts, dataTotals,
+                mgCutPointMVPA, mgCutPointVPA, intensityDistribution)
+            if activityClassification:
+                codes.append(predictActivity(pending, model))
+                cells.append(getMinuteOfWeek(pending.index).astype('int16'))
+        if openEpisode is not None:
+            episodes.append(openEpisode)
+
+        # Smooth activity states over the whole recording, and total them
+        if activityClassification:
+            codes, cells = np.concatenate(codes), np.concatenate(cells)
+            smoothActivity(codes, model)
+            addActivityTotals(codes, cells, model, totals)
+
+    # Get start & end times
+    summary['file-startTime'] = accUtils.date_strftime(firstTime)
+    summary['file-endTime'] = accUtils.date_strftime(lastTime)
+    summary['file-firstDay(0=mon,6=sun)'] = firstTime.weekday()
+
+    interruptMins = np.concatenate(interruptMins)
+    summary['errs-interrupts-num'] = len(interruptMins)
+    summary['errs-interrupt-mins'] = accUtils.formatNum(np.sum(interruptMins), 1)
+
+    # Check daylight savings time crossover
+    summariseEpoch.check_daylight_savings_crossovers(
+        pd.DataFrame(index=pd.DatetimeIndex([firstTime, lastTime])), summary)
+
+    # Write nonWear episodes to file, and wear-time statistics
+    writeNonWearEpisodes(episodes, nonWearFile)
+    accTotals = totals['acc']
+    counts = accTotals['count'].reshape(7, 24, 60).sum(axis=2).ravel()
+    summariseEpoch.writeWearTimeSummaries(len(episodes), accTotals['count'].sum(),
+        accTotals['missing'].sum(), pd.Series(counts, index=summariseEpoch.getWeekdayHourIndex()),
+        accTotals['count'].reshape(7, MINUTES_PER_DAY).sum(axis=0), epochPeriod,
+        summary)
+    summary.update(dataTotals)
+
+    # Calculate empirical cumulative distribution function of vector magnitudes
+    if intensityDistribution:
+        summariseEpoch.writeEcdfSummary('acc', ecdfCounts.sum(axis=0),
+            accTotals['count'].sum(), summary)
+
+    # Main movement summaries
+    summaryTotals = getSummaryTotals(totals, labels, useRecommendedImputation,
+        mgCutPointMVPA, mgCutPointVPA)
+    writeMovementSummariesFromTotals(summaryTotals, labels, summary,
+        useRecommendedImputation)
+
+    # Generate time series file
+    if tsFile is not None:
+        with accUtils.timeStage(summary, 'timeSeries'):
+            writeTimeSeriesChunked(iterFilledChunks(epochFile, ['enmoTrunc'], [],
+                epochPeriod, timeZone, startTime, endTime), episodes, totals,
+                labels, model, codes, tsFile)
+
+    return labels
+
+
+
+def iterFilledChunks(epochFile, columns, float32Cols, epochPeriod, timeZone,
+    startTime, endTime):
+    """Iterate over days of epoch data, with interrupts filled by missing epochs
+
+    :param str epochFile: Input csv.gz (or .npz) file of processed epoch data
+    :param list(str) columns: Columns to load
+    :param list(str) float32Cols: Columns to store as float32
+    :param int epochPeriod: Size of epoch time window (in seconds)
+    :param str timeZone: timezone in country/city format
+    :param datetime startTime: Remove data before this time in analysis
+    :param datetime endTime: Remove data after this time in analysis
+
+    :return: Filled epoch data, interrupt durations in minutes, and times of
+        the epochs in the file, for each chunk with data
+    :rtype: iterator(tuple(pandas.DataFrame, numpy.ndarray, pandas.DatetimeIndex))
+    """
+
+    tz = pytz.timezone(timeZone)
+    lastTime = None
+    chunkRows = 24 * 60 * 60 // epochPeriod
+    for e in accUtils.iterEpochFile(epochFile, chunkRows, columns, float32Cols):
+        # Remove data before/after user specified start/end times
+        if startTime:
+            e = e[e.index >= tz.localize(startTime)]
+        if endTime:
+            e = e[e.index <= tz.localize(endTime)]
+        if len(e) == 0:
+            continue
+
+        # Interrupts include any gap since the last epoch of the previous chunk
+        time = e.index.asi8
+        if lastTime is not None:
+            time = np.concatenate(([lastTime], time))
+        lastTime = time[-1]
+        interruptMins, fillTimes = summariseEpoch.getInterruptFills(time,
+            epochPeriod)
+        times = e.index
+        if len(fillTimes) > 0:
+            e = summariseEpoch.fillInterrupts(e, fillTimes)
+        yield e, interruptMins, times
+
+
+
+def maskNonWear(e, maxStd, minNonWearNs, openEpisode):
+    """Find nonWear episodes in a chunk of epoch data, and set them to nan
+
+    Epochs of a (too) short stationary episode at the end of the chunk are not
+    final, as the episode may continue in the next chunk. A long enough episode
+    at the end of the chunk is set to nan, but left open to continue.
+
+    :param pandas.DataFrame e: Pandas dataframe of epoch data
+    :param float maxStd: Threshold (in g units) for stationary vs not
+    :param int minNonWearNs: Minimum duration of nonwear events (nanoseconds)
+    :param dict openEpisode: Episode left open by the previous chunk, or None
+
+    :return: Episodes ended in this chunk
+    :rtype: list(dict)
+
+    :return: Episode left open at the end of this chunk, or None
+    :rtype: dict
+
+    :return: Number of leading epochs which are final
+    :rtype: int
+    """
+
+    time = e.index.asi8
+    nw = ((e['xStd']<maxStd) & (e['yStd']<maxStd) & (e['zStd']<maxStd)).to_numpy()
+    # Run-length encode nonWear epochs into episodes of [start, end] rows
+    edges = np.diff(np.concatenate(([0], nw.astype('int8'), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    isLong = time[ends] - time[starts] > minNonWearNs
+    isContinued = openEpisode is not None and len(starts) > 0 and starts[0] == 0
+    if isContinued:
+        isLong[0] = True
+    isLast = len(ends) > 0 and ends[-1] == len(e) - 1
+    numFinal = starts[-1] if isLast and not isLong[-1] else len(e)
+    starts, ends = starts[isLong], ends[isLong]
+
+    # Sum each axis over rows [start, end + 1) of every episode, in one pass
+    segments = np.ravel(np.column_stack((starts, ends + 1)))
+    sums = np.zeros((len(starts), 3))
+    for i, axis in enumerate(['xStd', 'yStd', 'zStd']):
+        values = np.append(e[axis].to_numpy(dtype='float'), 0)
+        if len(segments):
+            sums[:, i] = np.add.reduceat(values, segments)[::2]
+    episodes = [{'start': e.index[start], 'end': e.index[end], 'sums': axisSums,
+        'count': end - start + 1} for start, end, axisSums in zip(starts, ends, sums)]
+
+    # Continue any open episode, and leave the last one open if not yet ended
+    if isContinued:
+        episodes[0] = {'start': openEpisode['start'], 'end': episodes[0]['end'],
+            'sums': openEpisode['sums'] + episodes[0]['sums'],
+            'count': openEpisode['count'] + episodes[0]['count']}
+    elif openEpisode is not None:
+        episodes.insert(0, openEpisode)
+    openEpisode = None
+    if isLast and numFinal == len(e):
+        openEpisode = episodes.pop()
+
+    # Set nonWear data to nan
+    if len(starts) > 0:
+        episodeEdges = np.zeros(len(e) + 1, dtype='int')
+        episodeEdges[starts] += 1
+        episodeEdges[ends + 1] -= 1
+        e.loc[np.cumsum(episodeEdges[:-1]) > 0] = np.nan
+
+    return episodes, openEpisode, numFinal
+
+
+
+def writeNonWearEpisodes(episodes, nonWearFile):
+    """Write nonWear episodes (with mean std of each axis) to file
+
+    :param list(dict) episodes: Episodes found by maskNonWear()
+    :param str nonWearFile: Output filename for non wear .csv.gz episodes
+
+    :return: Write .csv.gz non wear episodes file to <nonWearFile>
+    :rtype: void
+    """
+
+    timeFormat = '%Y-%m-%d %H:%M:%S'
+    nonWearEpisodes = pd.DataFrame({
+        'start': [episode['start'].strftime(timeFormat) for episode in episodes],
+        'end': [episode['end'].strftime(timeFormat) for episode in episodes]})
+    sums = np.array([episode['sums'] for episode in episodes]).reshape(-1, 3)
+    counts = np.array([episode['count'] for episode in episodes], dtype='int')
+    for i, axis in enumerate(['xStd', 'yStd', 'zStd']):
+        nonWearEpisodes[axis + 'Max'] = sums[:, i] / counts
+    nonWearEpisodes.to_csv(nonWearFile, index=False, compression='gzip')
+
+
+
+def addChunkTotals(e, totals, ecdfCounts, dataTotals, mgCutPointMVPA,
+    mgCutPointVPA, intensityDistribution):
+    """Add final epochs of a chunk to the running totals
+
+    :param pandas.DataFrame e: Pandas dataframe of epoch data, with nonWear
+        episodes set to nan
+    :param dict totals: Totals of 'acc' and cut-points, see newTotals()
+    :param numpy.ndarray ecdfCounts: Intensity distribution counts for each
+        minute of day, see summariseEpoch.getEcdfCounts()
+    :param dict dataTotals: Total reads and clips
+    :param int mgCutPointMVPA: Milli-gravity threshold for moderate intensity activity
+    :param int mgCutPointVPA: Milli-gravity threshold for vigorous intensity activity
+    :param bool intensityDistribution: Count intensity distribution
+
+    :return: Update <totals>, <ecdfCounts> and <dataTotals>
+    :rtype: void
+    """
+
+    if len(e) == 0:
+        return
+    cells = getMinuteOfWeek(e.index)
+    acc = e['enmoTrunc'].to_numpy(dtype='float') * 1000 # convert to milli-G units
+    addTotals(totals['acc'], acc, cells)
+    # Observed cut-points, as missing epochs are only imputed once all are read
+    isMissing = np.isnan(acc)
+    addTotals(totals['CutPointMVPA'], np.where(isMissing, np.nan,
+        acc >= mgCutPointMVPA), cells)
+    addTotals(totals['CutPointVPA'], np.where(isMissing, np.nan,
+        acc >= mgCutPointVPA), cells)
+    if intensityDistribution:
+        ecdfCounts += summariseEpoch.getEcdfCounts(acc, cells % MINUTES_PER_DAY,
+            summariseEpoch.getEcdfXVals())
+
+    dataTotals['totalReads'] += e['rawSamples'].sum().item()
+    dataTotals['clipsBeforeCalibration'] += e['clipsBeforeCalibr'].sum().item()
+    dataTotals['clipsAfterCalibration'] += e['clipsAfterCalibr'].sum().item()
+
+
+
+def newTotals():
+    """Get empty totals of a column for every minute of the week
+
+    :return: Arrays of observed 'count', 'sum' and 'm2' (sum of squared
+        deviations from the mean) and of 'missing' (nan) epochs, for each
+        minute of the week, see getMinuteOfWeek()
+    :rtype: dict
+    """
+
+    return {key: np.zeros(MINUTES_PER_WEEK) for key in
+        ['count', 'sum', 'm2', 'missing']}
+
+
+
+def addTotals(totals, values, cells):
+    """Add values to totals of their minute of the week
+
+    :param dict totals: Totals, see newTotals()
+    :param numpy.ndarray values: Values (nan if missing)
+    :param numpy.ndarray cells: Minute of the week of each value
+
+    :return: Update <totals>
+    :rtype: void
+    """
+
+    isObserved = ~np.isnan(values)
+    observedCells, values = cells[isObserved], values[isObserved]
+    count = np.bincount(observedCells, minlength=MINUTES_PER_WEEK)
+    total = np.bincount(observedCells, weights=values, minlength=MINUTES_PER_WEEK)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    m2 = np.bincount(observedCells, weights=(values - mean[observedCells])**2,
+        minlength=MINUTES_PER_WEEK)
+    totals['count'], totals['sum'], totals['m2'] = mergeMoments(
+        totals['count'], totals['sum'], totals['m2'], count, total, m2)
+    totals['missing'] += np.bincount(cells[~isObserved], minlength=MINUTES_PER_WEEK)
+
+
+
+def mergeMoments(countA, sumA, m2A, countB, sumB, m2B):
+    """Merge counts, sums and sums of squared deviations of two sets of values
+
+    See Chan et al. (1979) "Updating formulae and a pairwise algorithm for
+    computing sample variances"
+
+    :return: Count, sum and sum of squared deviations of both sets
+    :rtype: tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    count = countA + countB
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = sumB / countB - sumA / countA
+        m2 = m2A + m2B + np.where((countA > 0) & (countB > 0),
+            delta**2 * countA * countB / count, 0)
+    return count, sumA + sumB, m2
+
+
+
+def getMinuteAvgs(totals):
+    """Get average of observed values for each minute of day
+
+    :param dict totals: Totals, see newTotals()
+
+    :return: Average for each of the 1440 minutes of day (nan if never observed)
+    :rtype: numpy.ndarray
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return totals['sum'].reshape(7, MINUTES_PER_DAY).sum(axis=0) / \
+            totals['count'].reshape(7, MINUTES_PER_DAY).sum(axis=0)
+
+
+
+def getImputedTotals(totals, imputed):
+    """Add missing values, imputed by the value of their minute, to totals
+
+    :param dict totals: Totals, see newTotals()
+    :param numpy.ndarray imputed: Imputed value for each minute of the week
+        (nan to leave missing)
+
+    :return: Count, sum and sum of squared deviations including imputed values
+    :rtype: tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+
+    missing = np.where(np.isnan(imputed), 0, totals['missing'])
+    imputedSum = np.where(missing > 0, missing * imputed, 0)
+    return mergeMoments(totals['count'], totals['sum'], totals['m2'],
+        missing, imputedSum, 0)
+
+
+
+def getMinuteOfWeek(index):
+    """Get minute of the week (0=Monday 00:00) of each time
+
+    :param pandas.DatetimeIndex index: Local times
+
+    :return: Minute of the week of each time
+    :rtype: numpy.ndarray
+    """
+
+    calendar = summariseEpoch.getCalendar(*accUtils.getIntegerTime(index))
+    return calendar['weekday'] * MINUTES_PER_DAY + calendar['minuteOfDay']
+
+
+
+def predictActivity(e, model):
+    """Predict activity state of each epoch with the random forest
+
+    :param pandas.DataFrame e: Pandas dataframe of epoch data
+    :param dict model: Activity model, see accClassification.loadModel()
+
+    :return: Index of predicted label of each epoch (-1 if missing or Inf features)
+    :rtype: numpy.ndarray
+    """
+
+    X = e[model['featureCols']]
+    with pd.option_context('mode.use_inf_as_null', True):
+        isNull = X.isnull().any(axis=1).to_numpy()
+    codes = np.full(len(e), -1, dtype='int8')
+    if not isNull.all():
+        predictions = accClassification.predictRandomForest(model, X[~isNull])
+        codes[~isNull] = pd.Index(model['labels']).get_indexer(predictions)
+    return codes
+
+
+
+def smoothActivity(codes, model):
+    """Smooth predicted activity states of the whole recording with the HMM
+
+    :param numpy.ndarray codes: Output of predictActivity() for all epochs
+    :param dict model: Activity model, see accClassification.loadModel()
+
+    :return: Update <codes> with smoothed activity states
+    :rtype: void
+    """
+
+    isObserved = codes >= 0
+    print((~isObserved).sum(), "rows with missing (NaN, None, or NaT) or Inf values, out of", len(codes))
+    if isObserved.any():
+        codes[isObserved], _ = accClassification.getViterbiPath(codes[isObserved],
+            model['priors'], model['transitions'], model['emissions'])
+
+
+
+def getActivityValues(codes, model):
+    """Get one-hot encoded activity states and METs of epochs
+
+    :param numpy.ndarray codes: Smoothed activity states, see smoothActivity()
+    :param dict model: Activity model, see accClassification.loadModel()
+
+    :return: Values of each label and of 'MET' (nan if no activity state)
+    :rtype: dict
+    """
+
+    isNull = codes < 0
+    values = {label: np.where(isNull, np.nan, codes == i)
+        for i, label in enumerate(model['labels'])}
+    values['MET'] = np.where(isNull, np.nan, model['METs'][codes])
+    return values
+
+
+
+def addActivityTotals(codes, cells, model, totals):
+    """Add totals of each activity state and of METs, for all epochs
+
+    :param numpy.ndarray codes: Smoothed activity states, see smoothActivity()
+    :param numpy.ndarray cells: Minute of the week of each epoch
+    :param dict model: Activity model, see accClassification.loadModel()
+    :param dict totals: Totals, see newTotals()
+
+    :return: Update <totals> with totals of each label and 'MET'
+    :rtype: void
+    """
+
+    for col in model['labels'] + ['MET']:
+        totals[col] = newTotals()
+    chunkRows = 7 * MINUTES_PER_DAY
+    for i in range(0, len(codes), chunkRows):
+        chunkCells = cells[i:i + chunkRows].astype('int')
+        for col, values in getActivityValues(codes[i:i + chunkRows], model).items():
+            addTotals(totals[col], values, chunkCells)
+
+
+
+def getSummaryTotals(totals, labels, useRecommendedImputation, mgCutPointMVPA,
+    mgCutPointVPA):
+    """Get totals of the summary column of each activity type
+
+    :param dict totals: Totals of 'acc', cut-points, labels and 'MET'
+    :param list(str) labels: Activity state labels
+    :param bool useRecommendedImputation: Impute missing values by the average
+        of their minute of day
+    :param int mgCutPointMVPA: Milli-gravity threshold for moderate intensity activity
+    :param int mgCutPointVPA: Milli-gravity threshold for vigorous intensity activity
+
+    :return: Count, sum and sum of squared deviations of each activity type
+    :rtype: dict
+    """
+
+    summaryTotals = {}
+    for accType in ['acc'] + labels + (['MET'] if labels else []):
+        if useRecommendedImputation:
+            imputed = np.tile(getMinuteAvgs(totals[accType]), 7)
+            summaryTotals[accType] = getImputedTotals(totals[accType], imputed)
+        else:
+            summaryTotals[accType] = (totals[accType]['count'],
+                totals[accType]['sum'], totals[accType]['m2'])
+    # Cut-points are derived from imputed acceleration (False if not imputed)
+    accImputed = np.tile(getMinuteAvgs(totals['acc']), 7)
+    for accType, cutPoint in [('CutPointMVPA', mgCutPointMVPA),
+            ('CutPointVPA', mgCutPointVPA)]:
+        summaryTotals[accType] = getImputedTotals(totals[accType],
+            (accImputed >= cutPoint).astype('float'))
+    return summaryTotals
+
+
+
+def writeMovementSummariesFromTotals(summaryTotals, labels, summary,
+    useRecommendedImputation):
+    """Write overall summary stats for each activity type to summary dict
+
+    :param dict summaryTotals: Output of getSummaryTotals()
+    :param list(str) labels: Activity state labels
+    :param dict summary: Output dictionary containing all summary metrics
+    :param bool useRecommendedImputation: Summarise imputed columns
+
+    :return: Write dict <summary> keys as summariseEpoch.writeMovementSummaries()
+    :rtype: void
+    """
+
+    activityTypes = ['acc', 'CutPointMVPA', 'CutPointVPA'] + labels
+    if labels:
+        activityTypes.append('MET')
+    cols = [summariseEpoch.getSummaryCol(accType, useRecommendedImputation)
+        for accType in activityTypes]
+
+    sums, counts, overallAvg, overallSd = {}, {}, {}, {}
+    for accType, col in zip(activityTypes, cols):
+        count, total, m2 = summaryTotals[accType]
+        sums[col] = total.reshape(7, 24, 60).sum(axis=2).ravel()
+        counts[col] = count.reshape(7, 24, 60).sum(axis=2).ravel()
+        # Merge the totals of all minutes of the week
+        numValues = count.sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            overallAvg[col] = total.sum() / numValues
+            m2 = m2.sum() + np.sum(np.where(count > 0,
+                count * (total / count - overallAvg[col])**2, 0))
+            overallSd[col] = np.sqrt(m2 / (numValues - 1)) if numValues > 1 else np.nan
+
+    summariseEpoch.writeMovementTotals(activityTypes, cols,
+        pd.DataFrame(sums, index=summariseEpoch.getWeekdayHourIndex()),
+        pd.DataFrame(counts, index=summariseEpoch.getWeekdayHourIndex()),
+        pd.Series(overallAvg), pd.Series(overallSd), summary)
+
+
+
+def writeTimeSeriesChunked(chunks, episodes, totals, labels, model, codes, tsFile):
+    """Write activity timeseries file, one chunk of epoch data at a time
+
+    :param iterator chunks: Output of iterFilledChunks() with 'enmoTrunc' column
+    :param list(dict) episodes: nonWear episodes, see maskNonWear()
+    :param dict totals: Totals of 'acc', labels and 'MET', see newTotals()
+    :param list(str) labels: Activity state labels
+    :param dict model: Activity model, see accClassification.loadModel(), or None
+    :param numpy.ndarray codes: Smoothed activity state of each epoch
+    :param str tsFile: Output filename for .csv.gz time series
+
+    :return: Write .csv.gz time series file to <tsFile>, as accUtils.writeTimeSeries()
+    :rtype: void
+    """
+
+    episodeStarts = np.array([ep['start'].value for ep in episodes], dtype='int64')
+    episodeEnds = np.array([ep['end'].value for ep in episodes], dtype='int64')
+    imputeCols = ['acc'] + labels + (['MET'] if labels else [])
+    minuteAvgs = {col: getMinuteAvgs(totals[col]) for col in imputeCols}
+    # One-hot labels are only float if some epochs have no activity state
+    hasNull = len(labels) > 0 and (codes < 0).any()
+
+    offset = 0
+    with gzip.open(tsFile, 'wt') as f:
+        for i, (e, _, _) in enumerate(chunks):
+            time = e.index.asi8
+            episode = np.searchsorted(episodeStarts, time, side='right') - 1
+            isNonWear = (episode >= 0) & \
+                (time <= np.append(episodeEnds, 0)[episode])
+            ts = pd.DataFrame({'acc': np.where(isNonWear, np.nan,
+                e['enmoTrunc'].to_numpy(dtype='float') * 1000)}, index=e.index)
+            if labels:
+                values = getActivityValues(codes[offset:offset + len(e)], model)
+                for label in labels:
+                    ts[label] = values[label] if hasNull else \
+                        values[label].astype('int')
+                ts['MET'] = values['MET']
+            offset += len(e)
+
+            minuteOfDay = getMinuteOfWeek(e.index) % MINUTES_PER_DAY
+            for col in imputeCols:
+                ts[col + 'Imputed'] = ts[col].fillna(
+                    pd.Series(minuteAvgs[col][minuteOfDay], index=e.index))
+            accUtils.getTimeSeries(ts, labels).to_csv(f, header=(i == 0))
@@ -74,46 +74,53 @@ def calculateFourierFreq(e, epochPeriod, fourierWithAcc, labels, summary):
 
 
    
-def calculateM10L5(e, epochPeriod, summary):
+def calculateM10L5(e, epochPeriod, summary, utcMs=None):
     """Calculates the M10 L5 relative amplitude from the average acceleration from
     the ten most active hours and 5 least most active hours 
+
+    Windows are compared by differences of cumulative sums, so if two windows
+    of a day have (nearly) equal sums, floating-point error may select another
+    one than a rolling mean would. Results are therefore equal to a rolling
+    mean computation only up to such floating-point ties.
     
     :param pandas.DataFrame e: Pandas dataframe of epoch data
     :param int epochPeriod: Size of epoch time window (in seconds)
     :param dict summary: Output dictionary containing all summary metrics
+    :param numpy.ndarray utcMs: Unix time in milliseconds (UTC) of each epoch,
+        see accUtils.getIntegerTime(), if already computed
 
     :return: Write dict <summary> keys 'M10 L5-<rel amp>'
     """
     TEN_HOURS = int(10*60*60/epochPeriod)
     FIVE_HOURS = int(5*60*60/epochPeriod)
-    num_days = (e.index[-1] - e.index[0]).days
-           
-    days_split = []
-    for n in range(num_days):
-        #creates a new list which is used to identify the 24 hour periods in the data frame
-        days_split += [n for x in e.index if e.index[0] + timedelta(days=n) <= x < e.index[0] + timedelta(days=n+1)]
-    dct = {}
+    DAY_MS = 24*60*60*1000
+    if utcMs is None:
+        utcMs = e.index.asi8 // 1000000
+    num_days = int((utcMs[-1] - utcMs[0]) // DAY_MS)
+
+    # 24 hour periods from the first epoch, found by integer arithmetic
+    day_starts = np.searchsorted(utcMs - utcMs[0], np.arange(num_days + 1) * DAY_MS)
+    acc = e['accImputed'].to_numpy(dtype='float')
+    avg_10 = []
+    avg_5 = []
     for i in range(num_days):
-        #create new lists with the acceleration data from each 24 hour period
-        dct['day_%s' %i] = [e.loc[:,'accImputed'][n] for n in range(len(days_split)) if days_split[n]==i]    
-    dct_10 = {}
-    dct_5 = {}
-    for i in dct:
         #  sums each 10 or 5 hour window with steps of 30s for each day
-        dct_10['%s' %i] = [sum(dct['%s' %i][j:j+TEN_HOURS]) for j in range(len(dct['%s' %i])-TEN_HOURS)]
-        dct_5['%s' %i] = [sum(dct['%s' %i][j:j+FIVE_HOURS]) for j in range(len(dct['%s' %i])-FIVE_HOURS)]
-    avg_10 = {}
-    avg_5 = {}
-    #   average acceleration (for each 30s) for the max and min windows        
-    for i in dct:
-        avg_10['%s' %i ] = (np.max(dct_10['%s' %i]))/TEN_HOURS
-    for i in dct:
-        avg_5['%s' %i] = (np.min(dct_5['%s' %i]))/FIVE_HOURS
+        day = acc[day_starts[i]:day_starts[i + 1]]
+        cumsum = np.concatenate([[0], np.cumsum(day)])
+        sum_10 = cumsum[TEN_HOURS:len(day)] - cumsum[:len(day) - TEN_HOURS]
+        sum_5 = cumsum[FIVE_HOURS:len(day)] - cumsum[:len(day) - FIVE_HOURS]
+        #   average acceleration (for each 30s) for the max and min windows,
+        #   summed again in order as cumsum differences are slightly inexact
+        #   (near-ties between windows are still decided on cumsum differences)
+        j_10 = np.argmax(sum_10)
+        j_5 = np.argmin(sum_5)
+        avg_10.append(sum(day[j_10:j_10 + TEN_HOURS].tolist())/TEN_HOURS)
+        avg_5.append(sum(day[j_5:j_5 + FIVE_HOURS].tolist())/FIVE_HOURS)
 
     if num_days > 0:
-        M10 = sum(avg_10.values())/num_days
-        L5 = sum(avg_5.values())/num_days
+        M10 = sum(avg_10)/num_days
+        L5 = sum(avg_5)/num_days
         rel_amp = (M10-L5)/(M10+L5)
     if num_days < 1:
         rel_amp = 'NA_too_few_days'
-    summary['M10L5'] = rel_amp
\ No newline at end of file
+    summary['M10L5'] = rel_amp
@@ -1,16 +1,23 @@
 """Module to process raw accelerometer files into epoch data."""
 
 from accelerometer import accUtils
+import atexit
 import gzip
+import hashlib
+import json
 import numpy as np
 import os
 import pandas as pd
-import statsmodels.api as sm
 import struct
-from subprocess import call
+from subprocess import call, Popen, PIPE
 import sys
 
 
+# Disk space of a decoded sample in a spill file, as java SpillWriter's
+# BYTES_PER_RECORD (int64 time, float64 x, y, z, temperature, int32 flags)
+SPILL_BYTES_PER_SAMPLE = 8 + 4 * 8 + 4
+
+
 def processInputFileToEpoch(inputFile, timeZone, timeShift,
     epochFile, stationaryFile, summary,
     skipCalibration=False, stationaryStd=13, xyzIntercept=[0.0, 0.0, 0.0],
@@ -19,6 +26,9 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
     useFilter=True, sampleRate=100, epochPeriod=30,
     activityClassification=True,
     rawOutput=False, rawFile=None, npyOutput=False, npyFile=None,
+    npyCompress=True,
+    reuseDecodedSamples=False, spillFile=None, useParserWorker=False,
+    calibrationCacheFolder=None, streamEpochs=False, parallelThreads=1,
     startTime=None, endTime=None,
     verbose=False,
     csvStartTime=None, csvSampleRate=None,
@@ -33,7 +43,8 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
         to <epochFile> from <inputFile>
 
     :param str inputFile: Input <cwa/cwa.gz/bin/gt3x> raw accelerometer file
-    :param str epochFile: Output csv.gz file of processed epoch data
+    :param str epochFile: Output csv.gz file of processed epoch data, or .npz
+        file for binary (columnar) epoch data
     :param str stationaryFile: Output/temporary file for calibration
     :param dict summary: Output dictionary containing all summary metrics
     :param bool skipCalibration: Perform software calibration (process data twice)
@@ -56,6 +67,24 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
     :param bool npyOutput: Output calibrated and resampled raw data to a .npy
         file? requires ~60MB/day.
     :param str npyFile: Output raw data ".npy" filename
+    :param bool npyCompress: Gzip the .npy file. Uncompressed files can be
+        memory-mapped for random access, see rawNpy.getRawWindow()
+    :param bool reuseDecodedSamples: Keep the samples decoded during the
+        calibration pass in <spillFile>, and replay them for feature extraction
+        instead of decoding <inputFile> a second time. Requires
+        SPILL_BYTES_PER_SAMPLE (44) bytes per sample of temporary disk space.
+    :param str spillFile: Temporary binary file of decoded samples
+    :param bool useParserWorker: Send java jobs to a persistent ParserWorker
+        process (see callJavaParser), instead of starting a new JVM each time
+    :param str calibrationCacheFolder: Folder to store calibration results in,
+        so later runs on the same file (and calibration settings) can skip the
+        calibration pass. None disables the cache.
+    :param bool streamEpochs: Read epochs directly from the java parser's stdout
+        rather than from <epochFile>, which is then only written if given
+        (i.e. not None). Epochs are streamed without a ParserWorker.
+    :param int parallelThreads: Number of threads to decode .cwa files with.
+        Not used with rawOutput, npyOutput, reuseDecodedSamples or endTime,
+        which need a single pass through the file.
     :param datetime startTime: Remove data before this time in analysis
     :param datetime endTime: Remove data after this time in analysis
     :param bool verbose: Print verbose output
@@ -68,6 +97,9 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
     :return: Raw processing summary values written to dict <summary>
     :rtype: void
 
+    :return: Epoch data if <streamEpochs>, otherwise None
+    :rtype: pandas.DataFrame
+
     :Example:
     >>> import device
     >>> summary = {}
@@ -90,11 +122,12 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
         useJava = False
 
     if useJava:
+        replaySpill = False  # only set if calibration pass spilled samples
         if not skipCalibration:
             # identify 10sec stationary epochs
             accUtils.toScreen("=== Calibrating ===")
             commandArgs = ["java", "-classpath", javaClassPath,
-                "-XX:ParallelGCThreads=1", rawDataParser, inputFile,
+                "-XX:ParallelGCThreads=" + str(parallelThreads), rawDataParser, inputFile,
                 "timeZone:" + timeZone,
                 "timeShift:" + str(timeShift),
                 "outputFile:" + stationaryFile,
@@ -102,7 +135,10 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
                 "filter:"+str(useFilter),
                 "getStationaryBouts:true", "epochPeriod:10",
                 "stationaryStd:" + str(staticStdG),
-                "sampleRate:" + str(sampleRate)]
+                "sampleRate:" + str(sampleRate),
+                "parallelThreads:" + str(parallelThreads)]
+            if reuseDecodedSamples:
+                commandArgs.append("spillFile:" + spillFile)
             if javaHeapSpace:
                 commandArgs.insert(1, javaHeapSpace)
             if csvStartTime:
@@ -116,14 +152,31 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
             if csvTimeXYZColsIndex:
                 javaStrCsvTXYZ = ','.join([str(i) for i in csvTimeXYZColsIndex])
                 commandArgs.append("csvTimeXYZColsIndex:" + javaStrCsvTXYZ)
-            # call process to identify stationary epochs
-            exitCode = call(commandArgs)
-            if exitCode != 0:
-                print(commandArgs)
-                print("Error: java calibration failed, exit ", exitCode)
-                sys.exit(-6)
-            # record calibrated axes scale/offset/temp vals + static point stats
-            getCalibrationCoefs(stationaryFile, summary)
+            # reuse calibration of an earlier run on the same file + settings
+            calibrationCacheFile = None
+            if calibrationCacheFolder:
+                calibrationSettings = [rawDataParser] + [arg for arg in
+                    commandArgs[commandArgs.index(inputFile) + 1:]
+                    if arg.split(':')[0] not in ('outputFile', 'verbose', 'spillFile',
+                        'parallelThreads')]
+                calibrationCacheFile = getCalibrationCacheFile(calibrationCacheFolder,
+                    inputFile, summary['file-deviceID'], calibrationSettings)
+            if calibrationCacheFile and loadCalibrationCache(calibrationCacheFile, summary):
+                accUtils.toScreen("Calibration loaded from " + calibrationCacheFile)
+            else:
+                # call process to identify stationary epochs
+                with accUtils.timeStage(summary, 'calibration'):
+                    exitCode = callJavaParser(commandArgs, useParserWorker)
+                if exitCode != 0:
+                    print(commandArgs)
+                    print("Error: java calibration failed, exit ", exitCode)
+                    sys.exit(-6)
+                replaySpill = reuseDecodedSamples
+                # record calibrated axes scale/offset/temp vals + static point stats
+                with accUtils.timeStage(summary, 'calibrationFit'):
+                    getCalibrationCoefs(stationaryFile, summary)
+                if calibrationCacheFile:
+                    saveCalibrationCache(calibrationCacheFile, summary)
             xyzIntercept = [summary['calibration-xOffset(g)'],
                             summary['calibration-yOffset(g)'],
                             summary['calibration-zOffset(g)']]
@@ -141,10 +194,10 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
 
         accUtils.toScreen('=== Extracting features ===')
         commandArgs = ["java", "-classpath", javaClassPath,
-            "-XX:ParallelGCThreads=1", rawDataParser, inputFile,
+            "-XX:ParallelGCThreads=" + str(parallelThreads), rawDataParser, inputFile,
             "timeZone:" + timeZone,
             "timeShift:" + str(timeShift),
-            "outputFile:" + epochFile, "verbose:" + str(verbose),
+            "outputFile:" + (epochFile or ""), "verbose:" + str(verbose),
             "filter:"+str(useFilter),
             "sampleRate:" + str(sampleRate),
             "xIntercept:" + str(xyzIntercept[0]),
@@ -162,7 +215,11 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
             "rawFile:" + str(rawFile),
             "npyOutput:" + str(npyOutput),
             "npyFile:" + str(npyFile),
+            "npyCompress:" + str(npyCompress),
+            "parallelThreads:" + str(parallelThreads),
             "getFeatures:" + str(activityClassification)]
+        if replaySpill:
+            commandArgs.append("replayFile:" + spillFile)
         if javaHeapSpace:
             commandArgs.insert(1, javaHeapSpace)
         if startTime:
@@ -180,11 +237,20 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
         if csvTimeXYZColsIndex:
             javaStrCsvTXYZ = ','.join([str(i) for i in csvTimeXYZColsIndex])
             commandArgs.append("csvTimeXYZColsIndex:" + javaStrCsvTXYZ)
-        exitCode = call(commandArgs)
+        with accUtils.timeStage(summary, 'features'):
+            if streamEpochs:
+                commandArgs.append("streamEpochs:true")
+                epochData, exitCode = streamJavaEpochs(commandArgs)
+            else:
+                exitCode = callJavaParser(commandArgs, useParserWorker)
         if exitCode != 0:
             print(commandArgs)
             print("Error: Java epoch generation failed, exit ", exitCode)
             sys.exit(-7)
+        if replaySpill and os.path.exists(spillFile):
+            os.remove(spillFile)  # decoded samples are no longer needed
+        if streamEpochs:
+            return epochData
 
     else:
         if not skipCalibration:
@@ -216,6 +282,187 @@ def processInputFileToEpoch(inputFile, timeZone, timeShift,
 
 
 
+PARSER_WORKER_JOB_DONE = "@@parserWorker-jobDone:"
+_parserWorker = {'process': None, 'jvmArgs': None}
+
+
+def callJavaParser(commandArgs, useParserWorker=False):
+    """Run a java raw data parser command, optionally reusing a persistent JVM
+
+    With <useParserWorker>, AccelerometerParser commands are sent as a job to a
+    long-lived ParserWorker process, which avoids JVM start-up and JIT warm-up
+    costs when many files are processed from the same python session. The
+    worker is (re)started as needed, e.g. if a job exits the JVM or if the java
+    options change. Other commands are run as usual, as a child process
+
+    :param list(str) commandArgs: java command, e.g. ["java", "-classpath",
+        "java", "AccelerometerParser", "file.cwa", "outputFile:epoch.csv.gz"]
+    :param bool useParserWorker: Send the command to a ParserWorker process
+
+    :return: Exit code of the parser
+    :rtype: int
+    """
+    classIndex = getJavaClassIndex(commandArgs)
+    jobArgs = [str(arg) for arg in commandArgs[classIndex + 1:]]
+    if not useParserWorker or commandArgs[classIndex] != "AccelerometerParser" \
+            or any('\t' in arg or '\n' in arg for arg in jobArgs):
+        with Popen(commandArgs) as parser:
+            return accUtils.waitChildProcess(parser)
+
+    worker = startParserWorker(commandArgs[:classIndex])
+    try:
+        worker.stdin.write('\t'.join(jobArgs) + '\n')
+        worker.stdin.flush()
+        for line in worker.stdout:
+            output, jobDone, exitCode = line.rstrip('\n').partition(PARSER_WORKER_JOB_DONE)
+            if output:
+                print(output, flush=True)
+            if jobDone:
+                return int(exitCode)
+    except BrokenPipeError:
+        pass
+    # worker exited mid-job, so use its exit code and start a new one next time
+    accUtils.untrackChildProcess(worker.pid)
+    exitCode = worker.wait()
+    _parserWorker['process'] = None
+    return exitCode
+
+
+
+def startParserWorker(jvmArgs):
+    """Start a ParserWorker process, unless one is already running
+
+    :param list(str) jvmArgs: java executable and options, e.g. ["java",
+        "-classpath", "java", "-XX:ParallelGCThreads=1"]
+
+    :return: Running worker process
+    :rtype: subprocess.Popen
+    """
+    worker = _parserWorker['process']
+    if worker is not None and worker.poll() is None:
+        if _parserWorker['jvmArgs'] == jvmArgs:
+            return worker
+        stopParserWorker()
+    if worker is not None:
+        accUtils.untrackChildProcess(worker.pid)
+    if _parserWorker['jvmArgs'] is None:
+        atexit.register(stopParserWorker)
+    _parserWorker['process'] = Popen(jvmArgs + ["ParserWorker"],
+        stdin=PIPE, stdout=PIPE, universal_newlines=True, bufsize=1)
+    # count its CPU time and memory in processing stages while it runs
+    accUtils.trackChildProcess(_parserWorker['process'].pid)
+    _parserWorker['jvmArgs'] = list(jvmArgs)
+    return _parserWorker['process']
+
+
+
+def stopParserWorker():
+    """Stop the ParserWorker process (if any) once its current job is done
+
+    :return: None
+    :rtype: void
+    """
+    worker = _parserWorker['process']
+    _parserWorker['process'] = None
+    if worker is not None and worker.poll() is None:
+        worker.stdin.close()
+        accUtils.untrackChildProcess(worker.pid)
+        worker.wait()
+
+
+
+EPOCH_STREAM_MAGIC = b'ACCEPOCH'
+EPOCH_STREAM_VERSION = 1
+EPOCH_COUNT_COLS = ['samples', 'dataErrors', 'clipsBeforeCalibr',
+    'clipsAfterCalibr', 'rawSamples']
+
+
+def streamJavaEpochs(commandArgs):
+    """Run a java parser command with "streamEpochs:true", reading its epochs
+
+    :param list(str) commandArgs: java AccelerometerParser command
+
+    :return: Epoch data (None if the stream could not be read), and exit code
+        of the parser
+    :rtype: tuple(pandas.DataFrame, int)
+    """
+    with Popen(commandArgs, stdout=PIPE) as parser:
+        try:
+            epochData = readEpochStream(parser.stdout)
+        except (EOFError, ValueError) as exceptStr:
+            sys.stderr.write('ERROR: Could not read epoch stream\n ' + str(exceptStr) + '\n')
+            epochData = None
+            parser.kill()
+        exitCode = accUtils.waitChildProcess(parser)
+    if epochData is None and exitCode == 0:
+        exitCode = -1
+    return epochData, exitCode
+
+
+
+def readEpochStream(stream):
+    """Read epochs written by the java EpochStreamWriter
+
+    The stream holds a JSON header (timezone and column names), then a frame
+    per epoch of int64 Unix milliseconds plus float64 values, and ends with a
+    frame of length 0.
+
+    :param file stream: Binary stream e.g. stdout of java parser
+
+    :return: Epoch data indexed by (timezone-aware) time
+    :rtype: pandas.DataFrame
+    """
+
+    def readExactly(numBytes):
+        data = stream.read(numBytes)
+        if len(data) != numBytes:
+            raise EOFError("epoch stream ended unexpectedly")
+        return data
+
+    magic = readExactly(len(EPOCH_STREAM_MAGIC))
+    version, headerLength = struct.unpack('>ii', readExactly(8))
+    if magic != EPOCH_STREAM_MAGIC or version != EPOCH_STREAM_VERSION:
+        raise ValueError("not a (version %d) epoch stream" % EPOCH_STREAM_VERSION)
+    header = json.loads(readExactly(headerLength).decode('utf-8'))
+    columns = header['columns']
+
+    recordLength = 8 * len(columns)
+    records = []
+    while True:
+        frameLength, = struct.unpack('>i', readExactly(4))
+        if frameLength == 0:
+            break
+        if frameLength != recordLength:
+            raise ValueError("unexpected epoch frame length %d" % frameLength)
+        records.append(readExactly(recordLength))
+
+    records = np.frombuffer(b''.join(records),
+        dtype=[('time', '>i8'), ('values', '>f8', (len(columns) - 1,))])
+    time = pd.to_datetime(records['time'].astype('int64'), unit='ms', utc=True)
+    e = pd.DataFrame(records['values'].astype('float64'), columns=columns[1:],
+        index=pd.DatetimeIndex(time.tz_convert(header['timeZone']), name='time'))
+    countCols = [col for col in EPOCH_COUNT_COLS if col in e.columns]
+    e[countCols] = e[countCols].astype('int64')
+    return e
+
+
+
+def getJavaClassIndex(commandArgs):
+    """Find the position of the java main class in a java command
+
+    :param list(str) commandArgs: java command, e.g. ["java", "-classpath",
+        "java", "AccelerometerParser", "file.cwa"]
+
+    :return: Index of main class name in <commandArgs>
+    :rtype: int
+    """
+    i = 1
+    while commandArgs[i].startswith('-'):
+        i += 2 if commandArgs[i] in ("-classpath", "-cp") else 1
+    return i
+
+
+
 def getCalibrationCoefs(staticBoutsFile, summary):
     """Identify calibration coefficients from java processed file
 
@@ -250,7 +497,7 @@ def getCalibrationCoefs(staticBoutsFile, summary):
         axesVals = stationaryPoints[:,[0,1,2]]
         tempVals = stationaryPoints[:,[3]]
     meanTemp = np.mean(tempVals)
-    tempVals = np.copy(tempVals-meanTemp)
+    tempVals = tempVals - meanTemp
     # store information on spread of stationary points
     xMin, yMin, zMin = np.amin(axesVals, axis=0)
     xMax, yMax, zMax = np.amax(axesVals, axis=0)
@@ -260,37 +507,37 @@ def getCalibrationCoefs(staticBoutsFile, summary):
     tempCoef = np.array([0.0, 0.0, 0.0])
     # variables to support model fitting
     bestError = 1e16
-    bestIntercept = np.copy(intercept)
-    bestSlope = np.copy(slope)
-    bestTemp = np.copy(tempCoef)
+    bestIntercept = intercept
+    bestSlope = slope
+    bestTemp = tempCoef
+    # temperature terms of the normal equations are the same every iteration
+    tempSum = np.sum(tempVals)
+    tempSqSum = np.sum(np.square(tempVals))
     # record initial uncalibrated error
-    curr = intercept + (np.copy(axesVals) * slope) + (np.copy(tempVals) * tempCoef)
+    curr = intercept + (axesVals * slope) + (tempVals * tempCoef)
     target = curr / np.sqrt(np.sum(np.square(curr), axis=1))[:, None]
     initError = np.sqrt(np.mean(np.square(curr-target)))  # root mean square error
     # iterate through linear model fitting
     try:
         for i in range(1, maxIter):
-            # iterate through each axis, refitting its intercept/slope vals
-            for a in range(0,3):
-                x = np.concatenate([curr[:, [a]], tempVals], axis=1)
-                x = sm.add_constant(x, prepend=True)  # add bias/intercept term
-                y = target[:, a]
-                newI, newS, newT = sm.OLS(y,x).fit().params
-                # update values as part of iterative closest point fitting process
-                # refer to wiki as there is quite a bit of math behind next 3 lines
-                intercept[a] = newI + (intercept[a] * newS)
-                slope[a] = newS * slope[a]
-                tempCoef[a] = newT + (tempCoef[a] * newS)
+            # refit intercept/slope vals of all three axes at once
+            newI, newS, newT = fitCalibrationAxes(curr, target, tempVals,
+                tempSum, tempSqSum)
+            # update values as part of iterative closest point fitting process
+            # refer to wiki as there is quite a bit of math behind next 3 lines
+            intercept = newI + (intercept * newS)
+            slope = newS * slope
+            tempCoef = newT + (tempCoef * newS)
             # update vals (and targed) based on new intercept/slope/temp coeffs
-            curr = intercept + (np.copy(axesVals) * slope) + (np.copy(tempVals) * tempCoef)
+            curr = intercept + (axesVals * slope) + (tempVals * tempCoef)
             target = curr / np.sqrt(np.sum(np.square(curr), axis=1))[:,None]
             rms = np.sqrt(np.mean(np.square(curr-target)))  # root mean square error
             # assess iterative error convergence
             improvement = (bestError-rms)/bestError
             if rms < bestError:
-                bestIntercept = np.copy(intercept)
-                bestSlope = np.copy(slope)
-                bestTemp = np.copy(tempCoef)
+                bestIntercept = intercept
+                bestSlope = slope
+                bestTemp = tempCoef
                 bestError = rms
             if improvement < minIterImprovement:
                 break  # break if not largely converged
@@ -306,6 +553,113 @@ def getCalibrationCoefs(staticBoutsFile, summary):
 
 
 
+CALIBRATION_CACHE_VERSION = 1
+
+
+def getCalibrationCacheFile(cacheFolder, inputFile, deviceId, settings):
+    """Get calibration cache filename for a raw file and its calibration settings
+
+    The cache is content-addressed: the filename is a hash of the input file's
+    fingerprint, device ID, and all settings that affect calibration, so a
+    renamed or copied file still hits the cache while a modified one does not.
+
+    :param str cacheFolder: Folder containing calibration cache files
+    :param str inputFile: Input raw accelerometer file
+    :param str deviceId: Device ID of <inputFile>
+    :param list(str) settings: Calibration settings e.g. ["stationaryStd:0.013"]
+
+    :return: Calibration cache filename
+    :rtype: str
+    """
+
+    key = hashlib.sha1()
+    key.update(accUtils.getFileFingerprint(inputFile).encode())
+    key.update(json.dumps([CALIBRATION_CACHE_VERSION, str(deviceId),
+        [str(s) for s in settings]]).encode())
+    return os.path.join(cacheFolder, key.hexdigest() + ".json")
+
+
+
+def loadCalibrationCache(cacheFile, summary):
+    """Load calibration summary values stored by saveCalibrationCache()
+
+    :param str cacheFile: Calibration cache file
+    :param dict summary: Output dictionary containing all summary metrics
+
+    :return: True if calibration values were loaded into <summary>
+    :rtype: bool
+    """
+
+    try:
+        with open(cacheFile) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if cache.get('version') != CALIBRATION_CACHE_VERSION:
+        return False
+    summary.update(cache['summary'])
+    return True
+
+
+
+def saveCalibrationCache(cacheFile, summary):
+    """Store calibration summary values so later runs can skip calibration
+
+    :param str cacheFile: Calibration cache file
+    :param dict summary: Dictionary containing calibration summary metrics
+
+    :return: Calibration values written to <cacheFile>
+    :rtype: void
+    """
+
+    cache = {'version': CALIBRATION_CACHE_VERSION, 'summary': {k: v for k, v
+        in summary.items() if k.startswith('calibration-') or k in
+        ('quality-calibratedOnOwnData', 'quality-goodCalibration')}}
+    os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+    # write then rename, so concurrent runs never read a partial cache file
+    tmpFile = cacheFile + '.' + str(os.getpid()) + '.tmp'
+    with open(tmpFile, 'w') as f:
+        json.dump(cache, f, indent=4)
+    os.replace(tmpFile, cacheFile)
+
+
+
+def fitCalibrationAxes(curr, target, tempVals, tempSum, tempSqSum):
+    """Least squares fit of target ~ intercept + slope*curr + temp*tempVals, for
+    the x/y/z axes at once
+
+    Solves the 3x3 normal equations of each axis together. A pseudo-inverse is
+    used (as statsmodels' OLS does), so degenerate data such as a constant
+    temperature still gives the minimum-norm solution.
+
+    :param numpy.ndarray curr: Current calibrated x/y/z values, shape (n, 3)
+    :param numpy.ndarray target: Target x/y/z values (on unit sphere), shape (n, 3)
+    :param numpy.ndarray tempVals: Mean-centred temperature values, shape (n, 1)
+    :param float tempSum: Sum of <tempVals>
+    :param float tempSqSum: Sum of squared <tempVals>
+
+    :return: Intercept, slope and temperature coefficients of each axis
+    :rtype: tuple(numpy.ndarray)
+    """
+
+    temp = tempVals[:, 0]
+    currSum = np.sum(curr, axis=0)
+    currTempSum = temp @ curr
+    xtx = np.empty((3, 3, 3))  # axis, row, col
+    xtx[:, 0, 0] = len(curr)
+    xtx[:, 0, 1] = xtx[:, 1, 0] = currSum
+    xtx[:, 0, 2] = xtx[:, 2, 0] = tempSum
+    xtx[:, 1, 1] = np.einsum('ij,ij->j', curr, curr)
+    xtx[:, 1, 2] = xtx[:, 2, 1] = currTempSum
+    xtx[:, 2, 2] = tempSqSum
+    xty = np.stack([np.sum(target, axis=0),
+                    np.einsum('ij,ij->j', curr, target),
+                    temp @ target], axis=1)
+    params = np.einsum('aij,aj->ai', np.linalg.pinv(xtx), xty)
+    return params[:, 0], params[:, 1], params[:, 2]
+
+
+
 def getOmconvertInfo(omconvertInfoFile, summary):
     """Identify calibration coefficients for omconvert processed file
 
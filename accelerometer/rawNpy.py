@@ -0,0 +1,161 @@
+"""Module to provide random access to raw .npy output (see npyOutput)"""
+
+import numpy as np
+import os
+import pandas as pd
+
+
+NS_PER_HOUR = 60 * 60 * 10**9
+NS_PER_DAY = 24 * NS_PER_HOUR
+INDEX_DTYPE = [('time', '<i8'), ('offset', '<i8')]
+
+
+def loadRawNpy(npyFile):
+    """Open raw .npy output (time, x, y, z) as a read-only memory map
+
+    Only uncompressed output can be memory-mapped, i.e. written with
+    accProcess.py --npyOutput True --npyCompress False
+
+    :param str npyFile: Input raw .npy file
+
+    :return: Memory-mapped structured array, with time in Unix nanoseconds
+    :rtype: numpy.memmap
+    """
+
+    if npyFile.lower().endswith('.gz'):
+        raise ValueError(f"'{npyFile}' is compressed, so can not be memory-mapped. "
+            "Please (re)process with --npyCompress False")
+    return np.load(npyFile, mmap_mode='r')
+
+
+
+def getRawIndex(npyFile, data=None, bucketSize=NS_PER_HOUR, rebuild=False):
+    """Get index of sample offsets for each hour (or day) of raw .npy output
+
+    The index is kept in a sidecar file next to <npyFile>, and is (re)built if
+    missing, out of date, or for a different <bucketSize>. Each entry holds a
+    bucket start time (Unix nanoseconds, UTC) and the offset of its first
+    sample, and a final entry holds the number of samples.
+
+    :param str npyFile: Input raw .npy file
+    :param numpy.memmap data: Output of loadRawNpy(<npyFile>), if already open
+    :param int bucketSize: Index resolution in nanoseconds e.g. NS_PER_DAY
+    :param bool rebuild: Rebuild index even if an up to date one exists
+
+    :return: Structured array of (time, offset) entries
+    :rtype: numpy.ndarray
+    """
+
+    if data is None:
+        data = loadRawNpy(npyFile)
+    indexFile = getRawIndexFile(npyFile)
+
+    if not rebuild and os.path.exists(indexFile) and \
+            os.path.getmtime(indexFile) >= os.path.getmtime(npyFile):
+        index = np.load(indexFile)
+        if len(index) > 1 and index['offset'][-1] == len(data) and \
+                index['time'][1] - index['time'][0] == bucketSize:
+            return index
+
+    time = data['time']
+    if len(time) == 0:
+        index = np.zeros(0, dtype=INDEX_DTYPE)
+    else:
+        firstBucket = time[0] - time[0] % bucketSize
+        bucketStarts = np.arange(firstBucket, time[-1] + 1, bucketSize)
+        bucketStarts = np.append(bucketStarts, bucketStarts[-1] + bucketSize)
+        index = np.zeros(len(bucketStarts), dtype=INDEX_DTYPE)
+        index['time'] = bucketStarts
+        index['offset'] = np.searchsorted(time, bucketStarts)
+        index['offset'][-1] = len(time)
+    np.save(indexFile, index)
+    return index
+
+
+
+def getRawIndexFile(npyFile):
+    """Get filename of the sidecar index of raw .npy output
+
+    :param str npyFile: Input raw .npy file
+
+    :return: Index filename e.g. "sample-index.npy" for "sample.npy"
+    :rtype: str
+    """
+
+    return os.path.splitext(npyFile)[0] + '-index.npy'
+
+
+
+def getRawWindow(npyFile, start, end, data=None, index=None):
+    """Get raw samples with time in [<start>, <end>) without reading the file
+
+    Uses the sidecar index to narrow the search to the samples of the
+    hours/days of <start> and <end>, and returns a slice of the memory map, so
+    only the pages of the requested window are read from disk.
+
+    :param str npyFile: Input raw .npy file
+    :param start: Window start, as datetime/str/Timestamp (naive times are
+        taken as UTC) or Unix nanoseconds
+    :param end: Window end (exclusive)
+    :param numpy.memmap data: Output of loadRawNpy(<npyFile>), if already open
+    :param numpy.ndarray index: Output of getRawIndex(<npyFile>), if available
+
+    :return: Zero-copy view of samples in window
+    :rtype: numpy.memmap
+
+    :Example:
+    >>> from accelerometer import rawNpy
+    >>> hour = rawNpy.getRawWindow("sample.npy", "2014-05-07 13:00+01:00",
+            "2014-05-07 14:00+01:00")
+    >>> hour['x'].mean()
+    """
+
+    if data is None:
+        data = loadRawNpy(npyFile)
+    if index is None:
+        index = getRawIndex(npyFile, data)
+    i = findSampleOffset(data['time'], index, toUnixNanos(start))
+    j = findSampleOffset(data['time'], index, toUnixNanos(end))
+    return data[i:max(i, j)]
+
+
+
+def findSampleOffset(time, index, t):
+    """Get offset of first sample with time >= <t>
+
+    :param numpy.memmap time: Time column of raw .npy data
+    :param numpy.ndarray index: Output of getRawIndex()
+    :param int t: Time in Unix nanoseconds
+
+    :return: Sample offset
+    :rtype: int
+    """
+
+    if len(index) == 0:
+        return 0
+    bucket = np.searchsorted(index['time'], t, side='right') - 1
+    if bucket < 0:
+        return 0
+    if bucket >= len(index) - 1:
+        return int(index['offset'][-1])
+    lo, hi = index['offset'][bucket], index['offset'][bucket + 1]
+    return int(lo + np.searchsorted(time[lo:hi], t))
+
+
+
+def toUnixNanos(t):
+    """Convert time to Unix nanoseconds (UTC)
+
+    :param t: datetime/str/Timestamp (naive times are taken as UTC) or
+        Unix nanoseconds
+
+    :return: Unix nanoseconds
+    :rtype: int
+    """
+
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    t = pd.Timestamp(t)
+    if t.tz is None:
+        t = t.tz_localize('UTC')
+    return t.value
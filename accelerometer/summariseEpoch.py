@@ -2,16 +2,21 @@
 from accelerometer import accUtils
 from accelerometer import accClassification
 from accelerometer import circadianRhythms
-import gzip
 import numpy as np
 import pandas as pd
 import pytz
 import sys
 import scipy as sp
 from scipy import fftpack
+from collections import OrderedDict
 from datetime import timedelta
 
 
+# Epoch file columns used by the summaries (besides activity model features)
+SUMMARY_COLS = ['enmoTrunc', 'xStd', 'yStd', 'zStd', 'rawSamples',
+    'clipsBeforeCalibr', 'clipsAfterCalibr']
+
+
 def getActivitySummary(epochFile, nonWearFile, summary,
     activityClassification=True, timeZone='Europe/London',
     startTime=None, endTime=None,
@@ -20,7 +25,7 @@ def getActivitySummary(epochFile, nonWearFile, summary,
     activityModel="activityModels/walmsley-jan21.tar",
     intensityDistribution=False, useRecommendedImputation=True,
     psd=False, fourierFrequency=False, fourierWithAcc=False, m10l5=False,
-    verbose=False):
+    summaryMetrics=None, epochCache=False, verbose=False):
     """Calculate overall activity summary from <epochFile> data
 
     Get overall activity summary from input <epochFile>. This is achieved by
@@ -31,9 +36,12 @@ def getActivitySummary(epochFile, nonWearFile, summary,
     5) calculate imputation values to replace nan PA metric values
     6) calculate empirical cumulative distribution function of vector magnitudes
     7) derive main movement summaries (overall, weekday/weekend, and hour)
+    Only the steps which the <summaryMetrics> groups need are performed, see
+    SUMMARY_METRICS and SUMMARY_INTERMEDIATES.
 
-    :param str epochFile: Input csv.gz file of processed epoch data
-    :param str nonWearFile: Output filename for non wear .csv.gz episodes
+    :param str epochFile: Input csv.gz (or .npz) file of processed epoch data
+    :param str nonWearFile: Output filename for non wear .csv.gz episodes,
+        not written unless <summaryMetrics> need them, see getSkippedOutputFiles()
     :param dict summary: Output dictionary containing all summary metrics
     :param bool activityClassification: Perform machine learning of activity states
     :param str timeZone: timezone in country/city format to be used for daylight
@@ -51,6 +59,11 @@ def getActivitySummary(epochFile, nonWearFile, summary,
     :param bool intensityDistribution: Add intensity outputs to dict <summary>
     :param bool useRecommendedImputation: Highly recommended method to impute
         missing data using data from other days around the same time
+    :param list(str) summaryMetrics: Names of SUMMARY_METRICS groups to compute.
+        None computes DEFAULT_SUMMARY_METRICS. <intensityDistribution>, <psd>,
+        <fourierFrequency> and <m10l5> add their groups.
+    :param bool epochCache: Reuse (or write) a binary sidecar cache of the
+        parsed .csv(.gz) <epochFile>, see accUtils.loadEpochFile()
     :param bool verbose: Print verbose output
 
     :return: Pandas dataframe of activity epoch data
@@ -75,14 +88,19 @@ def getActivitySummary(epochFile, nonWearFile, summary,
 
     accUtils.toScreen("=== Summarizing ===")
 
+    metricGroups = getMetricGroups(summaryMetrics, intensityDistribution, psd,
+        fourierFrequency, m10l5)
+    intermediates = getRequiredIntermediates(metricGroups)
+
     if isinstance(epochFile, pd.DataFrame):
         e = epochFile
     else:
         # Use python PANDAS framework to read in and store epochs
-        e = pd.read_csv(
-            epochFile, index_col=['time'],
-            parse_dates=['time'], date_parser=accUtils.date_parser,
-        )
+        columns, float32Cols = getEpochColumns(activityClassification and
+            'classification' in intermediates, activityModel)
+        with accUtils.timeStage(summary, 'epochLoad'):
+            e = accUtils.loadEpochFile(epochFile, columns, float32Cols,
+                useCache=epochCache)
 
     # Remove data before/after user specified start/end times
     rows = e.shape[0]
@@ -106,55 +124,49 @@ def getActivitySummary(epochFile, nonWearFile, summary,
     summary['file-endTime'] = accUtils.date_strftime(endTime)
     summary['file-firstDay(0=mon,6=sun)'] = startTime.weekday()
 
-    # Get interrupt and data error summary vals
-    e = get_interrupts(e, epochPeriod, summary)
+    # Compute only the intermediates which the selected metrics need, once
+    state = {'e': e, 'summary': summary, 'cache': {},
+        'nonWearFile': nonWearFile, 'activityClassification': activityClassification,
+        'epochPeriod': epochPeriod, 'stationaryStd': stationaryStd,
+        'minNonWearDuration': minNonWearDuration, 'mgCutPointMVPA': mgCutPointMVPA,
+        'mgCutPointVPA': mgCutPointVPA, 'activityModel': activityModel,
+        'useRecommendedImputation': useRecommendedImputation,
+        'fourierWithAcc': fourierWithAcc, 'verbose': verbose}
+    for intermediate in intermediates:
+        getIntermediate(intermediate, state)
+
+    with accUtils.timeStage(summary, 'summaries'):
+        for group in metricGroups:
+            writeMetrics, _ = SUMMARY_METRICS[group]
+            writeMetrics(state)
 
-    # Check daylight savings time crossover
-    check_daylight_savings_crossovers(e, summary)
+    # Return physical activity summary
+    return state['e'], state['cache'].get('classification', [])
 
-    # Calculate wear-time statistics, and write nonWear episodes to file
-    get_wear_time_stats(e, epochPeriod, stationaryStd, minNonWearDuration,
-        nonWearFile, summary)
 
-    # Calculate and include data quality statistics
-    get_total_reads(e, epochPeriod, summary)
-    get_clips(e, epochPeriod, summary)
 
+def getEpochColumns(activityClassification, activityModel):
+    """Get epoch file columns needed to summarise activity
 
-    # Predict activity from features, and add label column
-    if activityClassification:
-        e, labels = accClassification.activityClassification(e, activityModel)
-    else:
-        labels = []
+    Only the summary columns, and the features of <activityModel> if
+    <activityClassification>, are needed. Feature-only columns can be stored as
+    float32, as the random forest classifies float32 features anyway.
 
-    # enmo : Euclidean Norm Minus One
-    # Trunc :  negative values truncated to zero (i.e never negative)
-    # emmo = 1 - sqrt(x, y, z)
-    # enmoTrunc = max(enmo, 0)
-    e['acc'] = e['enmoTrunc'] * 1000 # convert enmoTrunc to milli-G units
-
-    # Calculate imputation values to replace nan PA metric values
-    e = perform_wearTime_imputation(e, verbose)
-    e['CutPointMVPA'] = e['accImputed'] >= mgCutPointMVPA
-    e['CutPointVPA'] = e['accImputed'] >= mgCutPointVPA
-
-    # Calculate empirical cumulative distribution function of vector magnitudes
-    if intensityDistribution:
-        calculateECDF(e, 'acc', summary, useRecommendedImputation)
+    :param bool activityClassification: Perform machine learning of activity states
+    :param str activityModel: Input tar model file which contains featureCols.txt
 
-    # Calculate circadian metrics
-    if psd:
-        circadianRhythms.calculatePSD(e, epochPeriod, fourierWithAcc, labels, summary)
-    if fourierFrequency:
-        circadianRhythms.calculateFourierFreq(e, epochPeriod, fourierWithAcc, labels, summary)
-    if m10l5:
-        circadianRhythms.calculateM10L5(e, epochPeriod, summary)
+    :return: Columns to load
+    :rtype: list(str)
 
-    # Main movement summaries
-    writeMovementSummaries(e, labels, summary, useRecommendedImputation)
+    :return: Columns which can be stored as float32
+    :rtype: list(str)
+    """
 
-    # Return physical activity summary
-    return e, labels
+    float32Cols = []
+    if activityClassification:
+        float32Cols = [col for col in accClassification.getFeatureCols(activityModel)
+            if col not in SUMMARY_COLS]
+    return SUMMARY_COLS + float32Cols, float32Cols
 
 
 
@@ -180,20 +192,67 @@ def get_interrupts(e, epochPeriod, summary):
     :rtype: void
     """
 
-    epochNs = epochPeriod * np.timedelta64(1, 's')
-    interrupts = np.where(e.index.to_series().diff() > epochNs)[0]
-    # Get duration of each interrupt in minutes
-    interruptMins = [e.index[i-1:i+1].to_series().diff().sum(skipna=True).seconds / 60 for i in interrupts]
+    interruptMins, fillTimes = getInterruptFills(e.index.asi8, epochPeriod)
     # Record to output summary
     summary['errs-interrupts-num'] = len(interruptMins)
     summary['errs-interrupt-mins'] = accUtils.formatNum(np.sum(interruptMins), 1)
 
-    frames = [e]
-    for i in interrupts:
-        start, end = e.index[i-1:i+1]
-        dti = pd.date_range(start=start, end=end, freq=str(epochPeriod)+'s')[1:-1]
-        frames.append(dti.to_frame().drop(columns=0))
-    e = pd.concat(frames).sort_index()
+    if len(interruptMins) == 0:
+        return e.sort_index()
+    return fillInterrupts(e, fillTimes)
+
+
+
+def getInterruptFills(time, epochPeriod):
+    """Find interrupts, and the missing epoch times to fill each one with
+
+    :param numpy.ndarray time: Epoch times in Unix nanoseconds
+    :param int epochPeriod: Size of epoch time window (in seconds)
+
+    :return: Duration of each interrupt in minutes
+    :rtype: numpy.ndarray
+
+    :return: Missing epoch times in Unix nanoseconds
+    :rtype: numpy.ndarray
+    """
+
+    epochNs = epochPeriod * 10**9
+    gaps = np.diff(time)
+    interrupts = np.flatnonzero(gaps > epochNs)
+    gaps = gaps[interrupts]
+    # Get duration of each interrupt in minutes (like Timedelta.seconds, the
+    # whole seconds of each gap excluding whole days)
+    interruptMins = (gaps // 10**9 % (24 * 60 * 60)) / 60
+
+    # Fill each interrupt with missing epochs on a regular grid from its start,
+    # i.e. (gap // epochPeriod) - 1 epochs
+    fillCounts = gaps // epochNs - 1
+    fillStarts = np.repeat(time[interrupts], fillCounts)
+    fillSteps = np.arange(fillCounts.sum()) - np.repeat(np.cumsum(fillCounts) - fillCounts, fillCounts) + 1
+    return interruptMins, fillStarts + fillSteps * epochNs
+
+
+
+def fillInterrupts(e, fillTimes):
+    """Add rows of missing (nan) values at the missing epoch times of interrupts
+
+    :param pandas.DataFrame e: Pandas dataframe of epoch data
+    :param numpy.ndarray fillTimes: Missing epoch times in Unix nanoseconds,
+        see getInterruptFills()
+
+    :return: Epoch data with missing epochs, sorted by time
+    :rtype: pandas.DataFrame
+    """
+
+    fillTimes = pd.DatetimeIndex(fillTimes)
+    if e.index.tz is not None:
+        fillTimes = fillTimes.tz_localize('UTC').tz_convert(e.index.tz)
+    allTimes = e.index.append(fillTimes).sort_values()
+    allTimes.name = e.index.name
+    if e.index.is_unique:
+        e = e.reindex(allTimes)
+    else:
+        e = pd.concat([e, pd.DataFrame(index=fillTimes)]).sort_index()
 
     return e
 
@@ -210,7 +269,7 @@ def check_daylight_savings_crossovers(e, summary):
 
 
 def get_wear_time_stats(e, epochPeriod, maxStd, minDuration, nonWearFile,
-    summary):
+    summary, calendar=None):
     """Calculate nonWear time, write episodes to file, and return wear statistics
 
     If daylight savings crossover, update times after time-change by +/- 1hr.
@@ -222,6 +281,7 @@ def get_wear_time_stats(e, epochPeriod, maxStd, minDuration, nonWearFile,
     :param int minDuration: Minimum duration of nonwear events (minutes)
     :param str nonWearFile: Output filename for non wear .csv.gz episodes
     :param dict summary: Output dictionary containing all summary metrics
+    :param dict calendar: Output of getCalendar() for <e>, if already computed
 
     :return: Write dict <summary> keys 'wearTime-numNonWearEpisodes(>1hr)',
         'wearTime-overall(days)', 'nonWearTime-overall(days)', 'wearTime-diurnalHrs',
@@ -233,35 +293,106 @@ def get_wear_time_stats(e, epochPeriod, maxStd, minDuration, nonWearFile,
     :rtype: void
     """
 
+    if calendar is None:
+        calendar = getCalendar(*accUtils.getIntegerTime(e.index))
+    numNonWearEpisodes = maskNonWearEpisodes(e, maxStd, minDuration, nonWearFile)
+    writeWearTimeStats(e['enmoTrunc'].notna().to_numpy(), numNonWearEpisodes,
+        calendar, epochPeriod, summary)
+
+
+
+def maskNonWearEpisodes(e, maxStd, minDuration, nonWearFile):
+    """Find nonWear episodes, write them to file, and set their data to nan
+
+    :param pandas.DataFrame e: Pandas dataframe of epoch data
+    :param int maxStd: Threshold (in mg units) for stationary vs not
+    :param int minDuration: Minimum duration of nonwear events (minutes)
+    :param str nonWearFile: Output filename for non wear .csv.gz episodes
+
+    :return: Number of nonWear episodes
+    :rtype: int
+
+    :return: Write .csv.gz non wear episodes file to <nonWearFile>
+    :rtype: void
+    """
+
     maxStd = maxStd / 1000.0 # java uses Gravity units (not mg)
-    e['nw'] = np.where((e['xStd']<maxStd) & (e['yStd']<maxStd) &
-            (e['zStd']<maxStd), 1, 0)
-    starts = e.index[e['nw'].astype('bool') & ~(e['nw'].shift(1).fillna(0).astype('bool'))]
-    ends = e.index[e['nw'].astype('bool') & ~(e['nw'].shift(-1).fillna(0).astype('bool'))]
-    nonWearEpisodes = [(start, end) for start, end in zip(starts, ends)
-            if end > start + np.timedelta64(minDuration,'m')]
-
-    # Set nonWear data to nan and record to nonWearBouts file
-    f = gzip.open(nonWearFile,'wb')
-    f.write('start,end,xStdMax,yStdMax,zStdMax\n'.encode())
+    nw = ((e['xStd']<maxStd) & (e['yStd']<maxStd) & (e['zStd']<maxStd)).to_numpy()
+    e['nw'] = nw.astype('int')
+    # Run-length encode nonWear epochs into episodes of [start, end] rows
+    edges = np.diff(np.concatenate(([0], nw.astype('int8'), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    longEpisodes = e.index[ends] > e.index[starts] + np.timedelta64(minDuration,'m')
+    starts, ends = starts[longEpisodes], ends[longEpisodes]
+
+    # Record nonWear episodes (with mean std of each axis) to nonWearBouts file
     timeFormat = '%Y-%m-%d %H:%M:%S'
-    for episode in nonWearEpisodes:
-        tmp = e[['xStd','yStd','zStd']][episode[0]:episode[1]]
-        nonWearBout = episode[0].strftime(timeFormat) + ','
-        nonWearBout += episode[1].strftime(timeFormat) + ','
-        nonWearBout += str(tmp['xStd'].mean()) + ','
-        nonWearBout += str(tmp['yStd'].mean()) + ','
-        nonWearBout += str(tmp['zStd'].mean()) + '\n'
-        f.write(nonWearBout.encode())
-        # Set main dataframe values to nan
-        e[episode[0]:episode[1]] = np.nan
-    f.close()
+    nonWearEpisodes = pd.DataFrame({
+        'start': e.index[starts].strftime(timeFormat),
+        'end': e.index[ends].strftime(timeFormat)})
+    # sum each axis over rows [start, end + 1) of every episode, in one pass
+    segments = np.ravel(np.column_stack((starts, ends + 1)))
+    for axis in ['xStd', 'yStd', 'zStd']:
+        values = np.append(e[axis].to_numpy(), 0)
+        sums = np.add.reduceat(values, segments)[::2] if len(segments) else 0
+        nonWearEpisodes[axis + 'Max'] = sums / (ends - starts + 1)
+    nonWearEpisodes.to_csv(nonWearFile, index=False, compression='gzip')
+
+    # Set nonWear data to nan
+    if len(starts) > 0:
+        episodeEdges = np.zeros(len(e) + 1, dtype='int')
+        episodeEdges[starts] += 1
+        episodeEdges[ends + 1] -= 1
+        e.loc[np.cumsum(episodeEdges[:-1]) > 0] = np.nan
+
+    return len(nonWearEpisodes)
+
+
+
+def writeWearTimeStats(isWear, numNonWearEpisodes, calendar, epochPeriod,
+    summary):
+    """Write wear-time statistics of epochs to summary dict
+
+    :param numpy.ndarray isWear: Whether each epoch was worn (not nan)
+    :param int numNonWearEpisodes: Number of nonWear episodes
+    :param dict calendar: Output of getCalendar()
+    :param int epochPeriod: Size of epoch time window (in seconds)
+    :param dict summary: Output dictionary containing all summary metrics
+
+    :return: Write dict <summary> keys as get_wear_time_stats()
+    :rtype: void
+    """
+
+    weekdayHour = calendar['weekday'][isWear] * 24 + calendar['hour'][isWear]
+    counts = pd.Series(np.bincount(weekdayHour, minlength=7 * 24),
+        index=getWeekdayHourIndex())
+    writeWearTimeSummaries(numNonWearEpisodes, isWear.sum(), (~isWear).sum(),
+        counts, np.bincount(calendar['minuteOfDay'][isWear], minlength=24 * 60),
+        epochPeriod, summary)
+
+
+
+def writeWearTimeSummaries(numNonWearEpisodes, wearSamples, nonWearSamples,
+    counts, minuteCounts, epochPeriod, summary):
+    """Write wear-time statistics to summary dict
+
+    :param int numNonWearEpisodes: Number of nonWear episodes
+    :param int wearSamples: Number of wear epochs
+    :param int nonWearSamples: Number of nonWear (or missing) epochs
+    :param pandas.Series counts: Wear epochs for each (weekday, hour), see
+        getWeekdayHourTotals()
+    :param numpy.ndarray minuteCounts: Wear epochs for each minute of day
+    :param int epochPeriod: Size of epoch time window (in seconds)
+    :param dict summary: Output dictionary containing all summary metrics
+
+    :return: Write dict <summary> keys as get_wear_time_stats()
+    :rtype: void
+    """
+
     # Write to summary
-    summary['wearTime-numNonWearEpisodes(>1hr)'] = int(len(nonWearEpisodes))
+    summary['wearTime-numNonWearEpisodes(>1hr)'] = int(numNonWearEpisodes)
 
-    # Calculate wear statistics
-    wearSamples = e['enmoTrunc'].count()
-    nonWearSamples = len(e[np.isnan(e['enmoTrunc'])].index.values)
     wearTimeMin = wearSamples * epochPeriod / 60.0
     nonWearTimeMin = nonWearSamples * epochPeriod / 60.0
     # Write to summary
@@ -270,19 +401,21 @@ def get_wear_time_stats(e, epochPeriod, maxStd, minDuration, nonWearFile,
 
     # Get wear time in each of 24 hours across week
     epochsInMin = 60.0 / epochPeriod
+    dayCounts = counts.groupby(level='weekday').sum()
+    hourCounts = counts.groupby(level='hour').sum()
     for i, day in zip(range(0, 7), accUtils.DAYS):
-        dayWear = e['enmoTrunc'][e.index.weekday == i].count() / epochsInMin
+        dayWear = dayCounts[i] / epochsInMin
         # Write to summary
         summary['wearTime-' + day + '(hrs)'] = accUtils.formatNum(dayWear/60.0, 2)
     for i in range(0, 24):
-        hourWear = e['enmoTrunc'][e.index.hour == i].count() / epochsInMin
+        hourWear = hourCounts[i] / epochsInMin
         # Write to summary
         summary['wearTime-hourOfDay' + str(i) + '-(hrs)'] = \
             accUtils.formatNum(hourWear/60.0, 2)
     summary['wearTime-diurnalHrs'] = accUtils.formatNum( \
-        e['enmoTrunc'].groupby(e.index.hour).mean().count(), 2)
+        np.count_nonzero(minuteCounts.reshape(24, 60).sum(axis=1)), 2)
     summary['wearTime-diurnalMins'] = accUtils.formatNum( \
-        e['enmoTrunc'].groupby([e.index.hour, e.index.minute]).mean().count(), 2)
+        np.count_nonzero(minuteCounts), 2)
 
     # Write binary decision on whether weartime was good or not
     minDiurnalHrs = 24
@@ -294,7 +427,7 @@ def get_wear_time_stats(e, epochPeriod, maxStd, minDuration, nonWearFile,
 
 
 
-def perform_wearTime_imputation(e, verbose):
+def perform_wearTime_imputation(e, verbose, imputeCols=None, calendar=None):
     """Calculate imputation values to replace nan PA metric values
 
     Impute non-wear data segments using the average of similar time-of-day values
@@ -307,21 +440,35 @@ def perform_wearTime_imputation(e, verbose):
 
     :param pandas.DataFrame e: Pandas dataframe of epoch data
     :param bool verbose: Print verbose output
+    :param list(str) imputeCols: Columns to impute, each written to
+        '<col>Imputed'. None imputes all numeric columns.
+    :param dict calendar: Output of getCalendar() for <e>, if already computed
 
     :return: Update DataFrame <e> columns nan values with time-of-day imputation
     :rtype: void
     """
 
-    e['hour'] = e.index.hour
-    e['minute'] = e.index.minute
-
-    wearTimeWeights = e.groupby(['hour', 'minute']).mean()
-    # Add the wearTimeWeights column to the other data as e.g. 'enmoTrunc_imputed'
-    e = e.join(wearTimeWeights, on=['hour', 'minute'], rsuffix='_imputed')
-
-    # Now wearTime weight values
-    for col in wearTimeWeights:
-        e[col+'Imputed'] = e[col].fillna(e[col+'_imputed'])
+    if calendar is None:
+        calendar = getCalendar(*accUtils.getIntegerTime(e.index))
+    e['hour'] = calendar['hour']
+    e['minute'] = calendar['minute']
+    if imputeCols is None:
+        imputeCols = [col for col in e.select_dtypes('number').columns
+                      if col not in ['hour', 'minute']]
+
+    # Average each column over wear time for each of the 1440 minutes of day,
+    # then fill nan values with the average of their minute
+    minuteOfDay = calendar['minuteOfDay']
+    for col in imputeCols:
+        values = e[col].to_numpy(dtype='float')
+        isWear = ~np.isnan(values)
+        minuteSums = np.bincount(minuteOfDay[isWear], weights=values[isWear],
+            minlength=24 * 60)
+        minuteCounts = np.bincount(minuteOfDay[isWear], minlength=24 * 60)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            minuteAvgs = minuteSums / minuteCounts  # nan if never worn
+        e[col + 'Imputed'] = e[col].fillna(
+            pd.Series(minuteAvgs[minuteOfDay], index=e.index))
 
     if verbose:
         # Features averaged over epochs - use imputed version of features for this.
@@ -337,7 +484,8 @@ def perform_wearTime_imputation(e, verbose):
 
 
 
-def calculateECDF(e, inputCol, summary, useRecommendedImputation):
+def calculateECDF(e, inputCol, summary, useRecommendedImputation,
+    calendar=None):
     """Calculate activity intensity empirical cumulative distribution
 
     The input data must not be imputed, as ECDF requires different imputation
@@ -355,45 +503,46 @@ def calculateECDF(e, inputCol, summary, useRecommendedImputation):
     :param dict summary: Output dictionary containing all summary metrics
     :param bool useRecommendedImputation: Highly recommended method to impute
         missing data using data from other days around the same time
+    :param dict calendar: Output of getCalendar() for <e>, if already computed
 
     :return: Write dict <summary> keys '<inputCol>-ecdf-<level...>mg'
     :rtype: void
     """
 
-    ecdf1, step = np.linspace(1, 20, 20, retstep=True)  # 1mg bins from 1-20mg
-    ecdf2, step = np.linspace(25, 100, 16, retstep=True)  # 5mg bins from 25-100mg
-    ecdf3, step = np.linspace(125, 500, 16, retstep=True)  # 25mg bins from 125-500mg
-    ecdf4, step = np.linspace(600, 2000, 15, retstep=True)  # 100mg bins from 500-2000mg
-    ecdfXVals = np.concatenate([ecdf1, ecdf2, ecdf3, ecdf4])
-
-    # Remove NaNs (necessary for statsmodels.api)
-    ecdfData = e[['hour', 'minute', inputCol]][~np.isnan(e[inputCol])]
-    if len(ecdfData) > 0:
-        # Set column names for actual, imputed, and adjusted intensity dist. vals
-        cols = []
-        colsImputed = []
-        colsAdjusted = []
-        for xVal in ecdfXVals:
-            col = 'ecdf' + str(xVal)
-            cols.append(col)
-            colsImputed.append(col + 'Imputed')
-            colsAdjusted.append(col + 'Adjusted')
-            ecdfData[col] = (ecdfData[inputCol] <= xVal) * 1.0
-        # Calculate imputation values to replace nan metric values
-        wearTimeWeights = ecdfData.groupby(['hour', 'minute'])[cols].mean()
-        ecdfData = ecdfData.join(wearTimeWeights, on=['hour', 'minute'],
-                                rsuffix='Imputed')
-        # For each ecdf xVal column, apply missing data imputation
-        for col, imputed, adjusted in zip(cols, colsImputed, colsAdjusted):
-            ecdfData[adjusted] = ecdfData[col].fillna(ecdfData[imputed])
-
-        if useRecommendedImputation:
-            accEcdf = ecdfData[colsAdjusted].mean()
-        else:
-            accEcdf = ecdfData[cols].mean()
+    ecdfXVals = getEcdfXVals()
+    values = e[inputCol].to_numpy(dtype='float')
+    if calendar is None:
+        calendar = getCalendar(*accUtils.getIntegerTime(e.index))
+    minuteOfDay = calendar['minuteOfDay']
+    # Number of (non-nan) values <= each level, for each minute of day
+    ecdfCounts = getEcdfCounts(values, minuteOfDay, ecdfXVals)
+    minuteCounts = np.bincount(minuteOfDay[~np.isnan(values)], minlength=24 * 60)
+
+    # Only minutes of day with data are averaged, and nan rows are excluded
+    # before imputation, so imputed (useRecommendedImputation) and crude
+    # distributions are both the fraction of values <= each level
+    writeEcdfSummary(inputCol, ecdfCounts.sum(axis=0), minuteCounts.sum(),
+        summary)
+
+
+
+def writeEcdfSummary(inputCol, ecdfCounts, numValues, summary):
+    """Write empirical cumulative distribution to summary dict
+
+    :param str inputCol: Column the intensity distribution is of
+    :param numpy.ndarray ecdfCounts: Number of values <= each level of getEcdfXVals()
+    :param int numValues: Number of (non-nan) values
+    :param dict summary: Output dictionary containing all summary metrics
+
+    :return: Write dict <summary> keys '<inputCol>-ecdf-<level...>mg'
+    :rtype: void
+    """
+
+    ecdfXVals = getEcdfXVals()
+    if numValues > 0:
+        accEcdf = ecdfCounts / numValues
     else:
-        accEcdf = pd.Series(data=[0.0 for i in ecdfXVals],
-                            index=[str(i)+'Adjusted' for i in ecdfXVals])
+        accEcdf = np.zeros(len(ecdfXVals))
 
     # And write to summary dict
     for x, ecdf in zip(ecdfXVals, accEcdf):
@@ -402,7 +551,45 @@ def calculateECDF(e, inputCol, summary, useRecommendedImputation):
 
 
 
-def writeMovementSummaries(e, labels, summary, useRecommendedImputation):
+def getEcdfXVals():
+    """Get intensity levels (in mg) of the empirical cumulative distribution
+
+    :return: 1mg levels from 1-20mg, 5mg from 25-100mg, 25mg from 125-500mg
+        and 100mg from 600-2000mg
+    :rtype: numpy.ndarray
+    """
+
+    ecdf1, step = np.linspace(1, 20, 20, retstep=True)  # 1mg bins from 1-20mg
+    ecdf2, step = np.linspace(25, 100, 16, retstep=True)  # 5mg bins from 25-100mg
+    ecdf3, step = np.linspace(125, 500, 16, retstep=True)  # 25mg bins from 125-500mg
+    ecdf4, step = np.linspace(600, 2000, 15, retstep=True)  # 100mg bins from 500-2000mg
+    return np.concatenate([ecdf1, ecdf2, ecdf3, ecdf4])
+
+
+
+def getEcdfCounts(values, minuteOfDay, ecdfXVals):
+    """Count values <= each intensity level, for each minute of day
+
+    :param numpy.ndarray values: Intensity values (nan values are ignored)
+    :param numpy.ndarray minuteOfDay: Minute of day (0-1439) of each value
+    :param numpy.ndarray ecdfXVals: Sorted intensity levels
+
+    :return: Counts with shape (1440, len(<ecdfXVals>))
+    :rtype: numpy.ndarray
+    """
+
+    isValid = ~np.isnan(values)
+    # index of the first level each value is <= to (len(ecdfXVals) if none)
+    levels = np.searchsorted(ecdfXVals, values[isValid], side='left')
+    numBins = len(ecdfXVals) + 1
+    counts = np.bincount(minuteOfDay[isValid] * numBins + levels,
+        minlength=24 * 60 * numBins).reshape(24 * 60, numBins)
+    return np.cumsum(counts, axis=1)[:, :-1]
+
+
+
+def writeMovementSummaries(e, labels, summary, useRecommendedImputation,
+    calendar=None):
     """Write overall summary stats for each activity type to summary dict
 
     :param pandas.DataFrame e: Pandas dataframe of epoch data
@@ -410,6 +597,7 @@ def writeMovementSummaries(e, labels, summary, useRecommendedImputation):
     :param dict summary: Output dictionary containing all summary metrics
     :param bool useRecommendedImputation: Highly recommended method to impute
         missing data using data from other days around the same time
+    :param dict calendar: Output of getCalendar() for <e>, if already computed
 
     :return: Write dict <summary> keys for each activity type 'overall-<avg/sd>',
         'week<day/end>-avg', '<day..>-avg', 'hourOfDay-<hr..>-avg',
@@ -423,35 +611,425 @@ def writeMovementSummaries(e, labels, summary, useRecommendedImputation):
     if 'MET' in e.columns:
         activityTypes.append('MET')
 
-    # Sumarise each type by: overall, week day/end, day, and hour of day
-    for accType in activityTypes:
-        col = accType
-        if useRecommendedImputation:
-            col += 'Imputed'
-        if accType in ['CutPointMVPA', 'CutPointVPA']:
-            col = accType
+    # Sum and count each type for every (weekday, hour) in a single pass, then
+    # sumarise each type by: overall, week day/end, day, and hour of day
+    cols = [getSummaryCol(accType, useRecommendedImputation) for accType in activityTypes]
+    sums, counts = getWeekdayHourTotals(e, cols, calendar)
+    writeMovementTotals(activityTypes, cols, sums, counts, e[cols].mean(),
+        e[cols].std(), summary)
+
+
+
+def writeMovementTotals(activityTypes, cols, sums, counts, overallAvg,
+    overallSd, summary):
+    """Write summary stats for each activity type from its weekday/hour totals
+
+    :param list(str) activityTypes: Activity types e.g. 'acc', 'MET' or labels
+    :param list(str) cols: Column summarising each activity type, see getSummaryCol()
+    :param pandas.DataFrame sums: Sums of <cols>, see getWeekdayHourTotals()
+    :param pandas.DataFrame counts: Counts of <cols>, see getWeekdayHourTotals()
+    :param pandas.Series overallAvg: Mean of each of <cols>
+    :param pandas.Series overallSd: Standard deviation of each of <cols>
+    :param dict summary: Output dictionary containing all summary metrics
 
+    :return: Write dict <summary> keys as writeMovementSummaries()
+    :rtype: void
+    """
+
+    isWeekday = sums.index.get_level_values('weekday') <= 4
+    weekdayAvg = sums[isWeekday].sum() / counts[isWeekday].sum()
+    weekendAvg = sums[~isWeekday].sum() / counts[~isWeekday].sum()
+    dayAvg = sums.groupby(level='weekday').sum() / counts.groupby(level='weekday').sum()
+    hourAvg = sums.groupby(level='hour').sum() / counts.groupby(level='hour').sum()
+    hourWeekdayAvg = sums[isWeekday].groupby(level='hour').sum() / \
+        counts[isWeekday].groupby(level='hour').sum()
+    hourWeekendAvg = sums[~isWeekday].groupby(level='hour').sum() / \
+        counts[~isWeekday].groupby(level='hour').sum()
+
+    for accType, col in zip(activityTypes, cols):
         # Overall / weekday / weekend summaries
-        summary[accType + '-overall-avg'] = accUtils.formatNum(e[col].mean(), 5)
-        summary[accType + '-overall-sd'] = accUtils.formatNum(e[col].std(), 2)
-        summary[accType + '-weekday-avg'] = accUtils.formatNum( \
-            e[col][e.index.weekday<=4].mean(), 2)
-        summary[accType + '-weekend-avg'] = accUtils.formatNum( \
-            e[col][e.index.weekday>=5].mean(), 2)
+        summary[accType + '-overall-avg'] = accUtils.formatNum(overallAvg[col], 5)
+        summary[accType + '-overall-sd'] = accUtils.formatNum(overallSd[col], 2)
+        summary[accType + '-weekday-avg'] = accUtils.formatNum(weekdayAvg[col], 2)
+        summary[accType + '-weekend-avg'] = accUtils.formatNum(weekendAvg[col], 2)
 
         # Daily summary
         for i, day in zip(range(0, 7), accUtils.DAYS):
             summary[accType + '-' + day + '-avg'] = accUtils.formatNum( \
-                e[col][e.index.weekday == i].mean(), 2)
+                dayAvg.loc[i, col], 2)
 
         # Hourly summaries
         for i in range(0, 24):
-            hourOfDay = accUtils.formatNum(e[col][e.index.hour == i].mean(), 2)
-            hourOfWeekday = accUtils.formatNum( \
-                e[col][(e.index.weekday<=4) & (e.index.hour == i)].mean(), 2)
-            hourOfWeekend = accUtils.formatNum( \
-                e[col][(e.index.weekday>=5) & (e.index.hour == i)].mean(), 2)
-            # Write derived hourly values to summary dictionary
-            summary[accType + '-hourOfDay-' + str(i) + '-avg'] = hourOfDay
-            summary[accType + '-hourOfWeekday-' + str(i) + '-avg'] = hourOfWeekday
-            summary[accType + '-hourOfWeekend-' + str(i) + '-avg'] = hourOfWeekend
+            summary[accType + '-hourOfDay-' + str(i) + '-avg'] = \
+                accUtils.formatNum(hourAvg.loc[i, col], 2)
+            summary[accType + '-hourOfWeekday-' + str(i) + '-avg'] = \
+                accUtils.formatNum(hourWeekdayAvg.loc[i, col], 2)
+            summary[accType + '-hourOfWeekend-' + str(i) + '-avg'] = \
+                accUtils.formatNum(hourWeekendAvg.loc[i, col], 2)
+
+
+
+def getSummaryCol(accType, useRecommendedImputation):
+    """Get column of epoch data to summarise an activity type with
+
+    :param str accType: Activity type e.g. 'acc', 'MET' or an activity label
+    :param bool useRecommendedImputation: Use the imputed column (cut-points
+        are already derived from imputed acceleration)
+
+    :return: Column name e.g. 'accImputed'
+    :rtype: str
+    """
+
+    if accType in ['CutPointMVPA', 'CutPointVPA']:
+        return accType
+    if useRecommendedImputation:
+        return accType + 'Imputed'
+    return accType
+
+
+
+def getWeekdayHourTotals(e, cols, calendar=None):
+    """Sum and count (non-nan) values of each column for every weekday and hour
+
+    Averages over any combination of weekdays and hours can then be derived
+    from these 7x24 totals, without scanning the epoch data again.
+
+    :param pandas.DataFrame e: Pandas dataframe of epoch data
+    :param list(str) cols: Columns to total
+    :param dict calendar: Output of getCalendar() for <e>, if already computed
+
+    :return: Sums and counts of <cols>, each indexed by (weekday, hour) and
+        covering all 168 combinations (with zero totals if no data)
+    :rtype: tuple(pandas.DataFrame, pandas.DataFrame)
+    """
+
+    if calendar is None:
+        calendar = getCalendar(*accUtils.getIntegerTime(e.index))
+    cells = getWeekdayHourIndex()
+    grouped = e[cols].groupby([pd.Index(calendar['weekday'], name='weekday'),
+        pd.Index(calendar['hour'], name='hour')])
+    sums = grouped.sum().reindex(cells, fill_value=0)
+    counts = grouped.count().reindex(cells, fill_value=0)
+    return sums, counts
+
+
+
+def getWeekdayHourIndex():
+    """Get (weekday, hour) index of the 168 hours of the week
+
+    :return: Index of getWeekdayHourTotals() output
+    :rtype: pandas.MultiIndex
+    """
+
+    return pd.MultiIndex.from_product([range(0, 7), range(0, 24)],
+        names=['weekday', 'hour'])
+
+
+
+def getCalendar(utcMs, offsetMs):
+    """Get local calendar fields of each epoch, using integer arithmetic
+
+    :param numpy.ndarray utcMs: Unix time in milliseconds (UTC) of each epoch
+    :param numpy.ndarray offsetMs: Offset of local time from UTC (in
+        milliseconds) of each epoch, see accUtils.getIntegerTime()
+
+    :return: 'weekday' (0=mon, 6=sun), 'hour', 'minute' and 'minuteOfDay'
+        arrays, each with one value for each epoch
+    :rtype: dict
+    """
+
+    localMins = (utcMs + offsetMs) // 60000
+    localDays, minuteOfDay = np.divmod(localMins, 24 * 60)
+    return {'weekday': (localDays + 3) % 7, # 1970-01-01 was a thursday
+        'hour': minuteOfDay // 60, 'minute': minuteOfDay % 60,
+        'minuteOfDay': minuteOfDay}
+
+
+
+def getInterruptsIntermediate(state):
+    """Fill interrupts in epoch data, keeping their summary for later
+
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: Summary keys of get_interrupts()
+    :rtype: dict
+    """
+
+    interrupts = {}
+    state['e'] = get_interrupts(state['e'], state['epochPeriod'], interrupts)
+    return interrupts
+
+
+
+def getTimeIntermediate(state):
+    """Get epoch times as integers, see accUtils.getIntegerTime()
+
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: 'utcMs' and 'offsetMs' arrays
+    :rtype: dict
+    """
+
+    utcMs, offsetMs = accUtils.getIntegerTime(state['e'].index)
+    return {'utcMs': utcMs, 'offsetMs': offsetMs}
+
+
+
+def getCalendarIntermediate(state):
+    """Get local calendar fields of epochs, see getCalendar()
+
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: 'weekday', 'hour', 'minute' and 'minuteOfDay' arrays
+    :rtype: dict
+    """
+
+    time = state['cache']['time']
+    return getCalendar(time['utcMs'], time['offsetMs'])
+
+
+
+def getWearTimeIntermediate(state):
+    """Set nonWear epochs to nan, and add milli-gravity 'acc' column
+
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: 'numNonWearEpisodes' and 'isWear' mask of epochs
+    :rtype: dict
+    """
+
+    e = state['e']
+    numNonWearEpisodes = maskNonWearEpisodes(e, state['stationaryStd'],
+        state['minNonWearDuration'], state['nonWearFile'])
+    # enmo : Euclidean Norm Minus One
+    # Trunc :  negative values truncated to zero (i.e never negative)
+    # emmo = 1 - sqrt(x, y, z)
+    # enmoTrunc = max(enmo, 0)
+    e['acc'] = e['enmoTrunc'] * 1000 # convert enmoTrunc to milli-G units
+    return {'numNonWearEpisodes': numNonWearEpisodes,
+        'isWear': e['enmoTrunc'].notna().to_numpy()}
+
+
+
+def getClassificationIntermediate(state):
+    """Predict activity from features, and add label column
+
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: Activity prediction labels (empty if not <activityClassification>)
+    :rtype: list(str)
+    """
+
+    if not state['activityClassification']:
+        return []
+    state['e'], labels = accClassification.activityClassification(state['e'],
+        state['activityModel'])
+    return labels
+
+
+
+def getImputationIntermediate(state):
+    """Impute nan PA metric values, and add cut point columns
+
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: Imputed columns
+    :rtype: list(str)
+    """
+
+    e = state['e']
+    imputeCols = ['acc'] + state['cache']['classification']
+    if 'MET' in e.columns:
+        imputeCols.append('MET')
+    e = perform_wearTime_imputation(e, state['verbose'], imputeCols,
+        state['cache']['calendar'])
+    e['CutPointMVPA'] = e['accImputed'] >= state['mgCutPointMVPA']
+    e['CutPointVPA'] = e['accImputed'] >= state['mgCutPointVPA']
+    state['e'] = e
+    return imputeCols
+
+
+
+# Intermediate results shared by summary metrics, in computation order, as
+# name: (function of getActivitySummary() state, names of intermediates needed)
+SUMMARY_INTERMEDIATES = OrderedDict([
+    ('interrupts', (getInterruptsIntermediate, [])),
+    ('time', (getTimeIntermediate, ['interrupts'])),
+    ('calendar', (getCalendarIntermediate, ['time'])),
+    ('wearTime', (getWearTimeIntermediate, ['calendar'])),
+    ('classification', (getClassificationIntermediate, ['wearTime'])),
+    ('imputation', (getImputationIntermediate, ['classification', 'calendar'])),
+])
+
+
+def writeInterruptsMetrics(state):
+    state['summary'].update(state['cache']['interrupts'])
+
+
+
+def writeDaylightSavingsMetrics(state):
+    check_daylight_savings_crossovers(state['e'], state['summary'])
+
+
+
+def writeWearTimeMetrics(state):
+    wearTime = state['cache']['wearTime']
+    writeWearTimeStats(wearTime['isWear'], wearTime['numNonWearEpisodes'],
+        state['cache']['calendar'], state['epochPeriod'], state['summary'])
+
+
+
+def writeDataQualityMetrics(state):
+    get_total_reads(state['e'], state['epochPeriod'], state['summary'])
+    get_clips(state['e'], state['epochPeriod'], state['summary'])
+
+
+
+def writeIntensityDistributionMetrics(state):
+    calculateECDF(state['e'], 'acc', state['summary'],
+        state['useRecommendedImputation'], state['cache']['calendar'])
+
+
+
+def writePsdMetrics(state):
+    circadianRhythms.calculatePSD(state['e'], state['epochPeriod'],
+        state['fourierWithAcc'], state['cache']['classification'], state['summary'])
+
+
+
+def writeFourierFrequencyMetrics(state):
+    circadianRhythms.calculateFourierFreq(state['e'], state['epochPeriod'],
+        state['fourierWithAcc'], state['cache']['classification'], state['summary'])
+
+
+
+def writeM10L5Metrics(state):
+    circadianRhythms.calculateM10L5(state['e'], state['epochPeriod'],
+        state['summary'], state['cache']['time']['utcMs'])
+
+
+
+def writeMovementMetrics(state):
+    writeMovementSummaries(state['e'], state['cache']['classification'],
+        state['summary'], state['useRecommendedImputation'],
+        state['cache']['calendar'])
+
+
+
+# Groups of summary metrics, in output order, as name: (function writing the
+# metrics to summary, names of intermediates needed)
+SUMMARY_METRICS = OrderedDict([
+    ('interrupts', (writeInterruptsMetrics, ['interrupts'])),
+    ('daylightSavings', (writeDaylightSavingsMetrics, ['interrupts'])),
+    ('wearTime', (writeWearTimeMetrics, ['wearTime', 'calendar'])),
+    ('dataQuality', (writeDataQualityMetrics, ['wearTime'])),
+    ('intensityDistribution', (writeIntensityDistributionMetrics,
+        ['wearTime', 'calendar'])),
+    ('psd', (writePsdMetrics, ['imputation'])),
+    ('fourierFrequency', (writeFourierFrequencyMetrics, ['imputation'])),
+    ('m10l5', (writeM10L5Metrics, ['imputation', 'time'])),
+    ('movement', (writeMovementMetrics, ['imputation'])),
+])
+
+
+# Metric groups summarised when none are requested
+DEFAULT_SUMMARY_METRICS = ['interrupts', 'daylightSavings', 'wearTime',
+    'dataQuality', 'movement']
+
+
+# Output files of accProcess, as file name suffix: name of the intermediate
+# without which the file is not written
+SUMMARY_OUTPUT_FILES = OrderedDict([
+    ('-nonWearBouts.csv.gz', 'wearTime'),
+    ('-timeSeries.csv.gz', 'imputation'),
+])
+
+
+
+def getMetricGroups(summaryMetrics=None, intensityDistribution=False,
+    psd=False, fourierFrequency=False, m10l5=False):
+    """Get summary metric groups to compute, in output order
+
+    :param list(str) summaryMetrics: Names of SUMMARY_METRICS groups to compute.
+        None computes DEFAULT_SUMMARY_METRICS.
+    :param bool intensityDistribution: Also compute intensity distribution
+    :param bool psd: Also compute power spectral density
+    :param bool fourierFrequency: Also compute dominant Fourier frequency
+    :param bool m10l5: Also compute M10 L5 relative amplitude
+
+    :return: Metric group names
+    :rtype: list(str)
+    """
+
+    if summaryMetrics is None:
+        summaryMetrics = DEFAULT_SUMMARY_METRICS
+    unknown = [group for group in summaryMetrics if group not in SUMMARY_METRICS]
+    if unknown:
+        raise ValueError("Unknown summary metrics %s, choose from %s" %
+            (unknown, list(SUMMARY_METRICS)))
+    options = {'intensityDistribution': intensityDistribution, 'psd': psd,
+        'fourierFrequency': fourierFrequency, 'm10l5': m10l5}
+    return [group for group in SUMMARY_METRICS
+        if group in summaryMetrics or options.get(group, False)]
+
+
+
+def getRequiredIntermediates(metricGroups):
+    """Get intermediates needed by <metricGroups>, in computation order
+
+    :param list(str) metricGroups: Names of SUMMARY_METRICS groups
+
+    :return: Intermediate names, including their own dependencies
+    :rtype: list(str)
+    """
+
+    required = set()
+    pending = [name for group in metricGroups for name in SUMMARY_METRICS[group][1]]
+    while pending:
+        name = pending.pop()
+        if name not in required:
+            required.add(name)
+            pending.extend(SUMMARY_INTERMEDIATES[name][1])
+    return [name for name in SUMMARY_INTERMEDIATES if name in required]
+
+
+
+def getSkippedOutputFiles(metricGroups):
+    """Get output files not written when only <metricGroups> are summarised
+
+    :param list(str) metricGroups: Names of SUMMARY_METRICS groups
+
+    :return: File name suffixes of SUMMARY_OUTPUT_FILES
+    :rtype: list(str)
+    """
+
+    intermediates = getRequiredIntermediates(metricGroups)
+    return [suffix for suffix, name in SUMMARY_OUTPUT_FILES.items()
+        if name not in intermediates]
+
+
+
+def getIntermediate(name, state):
+    """Compute (once) intermediate <name> and its dependencies
+
+    :param str name: Name of SUMMARY_INTERMEDIATES entry
+    :param dict state: Epoch data, options and cached intermediates of
+        getActivitySummary()
+
+    :return: Intermediate result, also cached in state['cache']
+    """
+
+    cache = state['cache']
+    if name not in cache:
+        computeIntermediate, dependencies = SUMMARY_INTERMEDIATES[name]
+        for dependency in dependencies:
+            getIntermediate(dependency, state)
+        with accUtils.timeStage(state['summary'], name):
+            cache[name] = computeIntermediate(state)
+    return cache[name]
@@ -1,5 +1,6 @@
 
 //BSD 2-Clause (c) 2014: A.Doherty (Oxford), D.Jackson, N.Hammerla (Newcastle)
+import java.io.PrintStream;
 import java.math.RoundingMode;
 import java.text.DecimalFormat;
 import java.text.ParseException;
@@ -35,6 +36,21 @@ public class AccelerometerParser {
 	 *            "param:value" pairs.
 	 */
 	public static void main(String[] args) {
+		System.exit(run(args, true));
+	}
+
+
+	/*
+	 * Process a single file, as described by the command line args.
+	 *
+	 * @param args
+	 *            The inputFile followed by "param:value" pairs.
+	 * @param exitAtEndTime
+	 *            Exit the JVM as soon as endTime is reached (otherwise the
+	 *            remaining samples are skipped and the method returns).
+	 * @return 0 on success, or a negative error code
+	 */
+	public static int run(String[] args, boolean exitAtEndTime) {
 		// variables to store default parameter options
 		String[] functionParameters = new String[0];
 
@@ -43,9 +59,14 @@ public class AccelerometerParser {
 		String outputFile = ""; // file name for epoch file
 		String rawFile = ""; // file name for epoch file
 		String npyFile = ""; // file name for epoch file
+		String spillFile = ""; // file name to keep decoded samples in
+		String replayFile = ""; // spill file to read samples from (instead of accFile)
 		Boolean rawOutput = false; // whether to output raw data
 		Boolean npyOutput = false; // whether to output npy data
+		boolean npyCompress = true; // whether to gzip npy data
+		boolean streamEpochs = false; // write epochs as binary records to stdout
 		boolean verbose = false; //to facilitate logging
+		int parallelThreads = 1; // threads to decode .cwa files with
         int timeShift = 0;  // shift (in minutes) applied to file time
 
 		DF6.setRoundingMode(RoundingMode.CEILING);
@@ -83,7 +104,7 @@ public class AccelerometerParser {
 			invalidInputMsg += "please enter at least 1 parameter, e.g.\n";
 			invalidInputMsg += "java AccelerometerParser inputFile.cwa.gz";
 			System.out.println(invalidInputMsg);
-			System.exit(-1);
+			return -1;
 		}
 
 		if (args.length == 1) {
@@ -154,6 +175,16 @@ public class AccelerometerParser {
                     npyOutput = Boolean.parseBoolean(funcParam.toLowerCase());
                 } else if (funcName.equals("npyFile")) {
 					npyFile = funcParam;
+				} else if (funcName.equals("npyCompress")) {
+					npyCompress = Boolean.parseBoolean(funcParam.toLowerCase());
+				} else if (funcName.equals("spillFile")) {
+					spillFile = funcParam;
+				} else if (funcName.equals("replayFile")) {
+					replayFile = funcParam;
+				} else if (funcName.equals("streamEpochs")) {
+					streamEpochs = Boolean.parseBoolean(funcParam.toLowerCase());
+				} else if (funcName.equals("parallelThreads")) {
+					parallelThreads = Integer.parseInt(funcParam);
 				} else if (funcName.equals("startTime")) {
                 	startTimeStr = funcParam;
 				} else if (funcName.equals("endTime")) {
@@ -163,7 +194,7 @@ public class AccelerometerParser {
 					if (timeXYZ.length != 4) {
 						System.err.println("error parsing csvTimeXYZColsIndex: "
                             + timeXYZ.toString() + "\n must be 4 integers");
-						System.exit(-2);
+						return -2;
 					}
 					csvTimeXYZColsIndex = new LinkedList<Integer>();
 					for( int i = 0; i<timeXYZ.length; i++ ) {
@@ -187,7 +218,7 @@ public class AccelerometerParser {
 					startTime = dateFormat.parse(startTimeStr).getTime();
 				} catch (ParseException ex) {
 					System.err.println("error parsing startTime:'" + startTimeStr + "', must be in format: 1996-7-30T13:59");
-					System.exit(-2);
+					return -2;
 				}
 			}
 			if (!endTimeStr.isEmpty()) {
@@ -195,25 +226,46 @@ public class AccelerometerParser {
 					endTime = dateFormat.parse(endTimeStr).getTime();
 				} catch (ParseException ex) {
 					System.err.println("error parsing endTime:'" + endTimeStr + "', must be in format: 1996-7-30T13:59");
-					System.exit(-2);
+					return -2;
 				}
 			}
 		}
 
 		EpochWriter epochWriter = null;
+		PrintStream stdout = System.out;
+		if (streamEpochs) {
+			// stdout is reserved for epoch records, so log to stderr instead
+			System.setOut(System.err);
+		}
 		try {
 			System.out.println("Intermediate file: " + outputFile);
    			epochWriter = DeviceReader.setupEpochWriter(
    				outputFile, useFilter, rawOutput, rawFile, npyOutput,
-        		npyFile, getFeatures, numFFTbins, timeFormat, timeZone,
+        		npyFile, npyCompress, spillFile, streamEpochs, getFeatures, numFFTbins, timeFormat, timeZone,
         		epochPeriod, sampleRate, range, swIntercept, swSlope, tempCoef,
         		meanTemp, getStationaryBouts, stationaryStd,
         		startTime, endTime, verbose
    				);
+			epochWriter.setExitAtEndTime(exitAtEndTime);
 
 			// process file if input parameters are all ok
-			if (accFile.toLowerCase().endsWith(".cwa")) {
-				AxivityReader.readCwaEpochs(accFile, timeZone, timeShift, epochWriter, verbose);
+			if (!replayFile.isEmpty()) {
+				// samples were already decoded (and spilled) by an earlier pass
+				SpillReader.readSpillEpochs(replayFile, epochWriter, verbose);
+			} else if (accFile.toLowerCase().endsWith(".cwa")) {
+				// raw/spilled samples and endTime need a single, in order, pass
+				boolean parallel = parallelThreads > 1 && !rawOutput && !npyOutput
+					&& spillFile.isEmpty() && endTime == -1;
+				if (parallelThreads > 1 && !parallel) {
+					System.out.println("parallelThreads not supported with rawOutput, "
+						+ "npyOutput, spillFile or endTime, so decoding on 1 thread");
+				}
+				if (parallel) {
+					AxivityReader.readCwaEpochsParallel(accFile, timeZone, timeShift,
+						epochWriter, epochPeriod, startTime, parallelThreads, verbose);
+				} else {
+					AxivityReader.readCwaEpochs(accFile, timeZone, timeShift, epochWriter, verbose);
+				}
 			} else if (accFile.toLowerCase().endsWith(".cwa.gz")) {
                 AxivityReader.readCwaGzEpochs(accFile, timeZone, timeShift, epochWriter, verbose);
             } else if (accFile.toLowerCase().endsWith(".bin")) {
@@ -226,23 +278,24 @@ public class AccelerometerParser {
                     csvTimeXYZColsIndex, csvTimeFormat, verbose);
 			} else {
 				System.err.println("Unrecognised file format for: " + accFile);
-				System.exit(-1);
+				return -1;
 			}
 		} catch (Exception excep) {
 			excep.printStackTrace(System.err);
 			System.err.println("error reading/writing file " + outputFile + ": "
 								+ excep.toString());
-			System.exit(-2);
+			return -2;
 		} finally {
 			try {
 				epochWriter.closeWriters();
 			} catch (Exception ex) {
 				/* ignore */
 			}
+			System.setOut(stdout);
 		}
 
 		// if no errors then return success code
-		System.exit(0);
+		return 0;
 	}
 
 
@@ -1,6 +1,7 @@
 
 //BSD 2-Clause (c) 2014: A.Doherty (Oxford), D.Jackson, N.Hammerla (Newcastle)
 import java.io.FileInputStream;
+import java.io.IOException;
 import java.nio.ByteOrder;
 import java.nio.ByteBuffer;
 import java.nio.channels.Channels;
@@ -12,6 +13,11 @@ import java.time.LocalDateTime;
 import java.time.ZoneId;
 import java.time.ZonedDateTime;
 import java.time.zone.ZoneRules;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
 import java.util.zip.GZIPInputStream;
 
 
@@ -20,6 +26,14 @@ import java.util.zip.GZIPInputStream;
  */
 public class AxivityReader extends DeviceReader {
 
+    private final static int CWA_BLOCK_SIZE = 512;
+    // parallel decoding: chunks per thread (for load balancing), epochs to
+    // warm up the filter and edge interpolation before each chunk, and the
+    // minimum chunk size (in warm up lengths) so warm up overhead stays small
+    private final static int CHUNKS_PER_THREAD = 4;
+    private final static int WARMUP_EPOCHS = 3;
+    private final static int MIN_CHUNK_WARMUPS = 20;
+
     /**
      * Read and process Axivity CWA file. Setup file reading infrastructure
      * and then call readCwaBuffer() method
@@ -74,6 +88,184 @@ public class AxivityReader extends DeviceReader {
     }
 
 
+    /**
+     * Read and process Axivity CWA file on several threads. The data blocks
+     * are split into contiguous chunks, each decoded by its own chunk writer
+     * (see EpochWriter.newChunkWriter) that keeps the epochs starting from its
+     * first block until the next chunk's first block. Each chunk starts
+     * decoding WARMUP_EPOCHS early, and reads past its end until its last
+     * epoch is complete, so epochs at chunk seams have the same edge
+     * interpolation samples as a sequential pass. The lowpass filter runs
+     * continuously across epochs, so its state at a seam only converges to
+     * that of a sequential pass during the warm up: seam epochs agree
+     * closely, but are not guaranteed to be identical (see
+     * Tests/ParallelCwaTest). Epoch records are then written in order by
+     * epochWriter.
+    **/
+    public static void readCwaEpochsParallel(
+        String accFile,
+        String timeZone,
+        int timeShift,
+        EpochWriter epochWriter,
+        int epochPeriod,
+        long startTime,
+        int numThreads,
+        Boolean verbose) {
+
+        setTimeSettings(timeZone, timeShift);
+
+        ExecutorService executor = Executors.newFixedThreadPool(numThreads);
+        ByteBuffer buf = ByteBuffer.allocate(CWA_BLOCK_SIZE);
+        try ( FileInputStream accStream = new FileInputStream(accFile); ) {
+            FileChannel rawAccReader = accStream.getChannel();
+            long numBlocks = rawAccReader.size() / CWA_BLOCK_SIZE;
+
+            // session start is shared by all threads, so set it up front from
+            // the header block (or else the first data block)
+            int[] errCounter = new int[] { 0 };
+            LocalDateTime[] lastBlockTime = { null };
+            int[] lastBlockTimeIndex = { 0 };
+            long firstBlock = 0;
+            while (firstBlock < numBlocks && !isCwaDataBlock(readCwaBlock(rawAccReader, firstBlock, buf))) {
+                readCwaBuffer(buf, true, lastBlockTime, lastBlockTimeIndex, "",
+                    errCounter, epochWriter);
+                firstBlock++;
+            }
+            if (firstBlock == numBlocks) {
+                return; // no data blocks
+            }
+            if (sessionStart == null) {
+                setSessionStart(getCwaBlockTime(readCwaBlock(rawAccReader, firstBlock, buf)));
+                System.out.println("Session start: " + sessionStart);
+            }
+
+            // epochs of a sequential pass start at startTime (or the first
+            // sample) + k * epochPeriod
+            long gridAnchor = startTime;
+            if (gridAnchor == -1) {
+                EpochWriter probe = epochWriter.newChunkWriter(-1, Long.MAX_VALUE, Long.MAX_VALUE);
+                for (long block = firstBlock; block < numBlocks
+                        && probe.getEpochStartTime() == -1; block++) {
+                    readCwaBlock(rawAccReader, block, buf);
+                    readCwaBuffer(buf, true, lastBlockTime, lastBlockTimeIndex, "",
+                        errCounter, probe);
+                }
+                gridAnchor = probe.getEpochStartTime();
+            }
+
+            // chunk boundaries: first data block of each chunk, and its time
+            readCwaBlock(rawAccReader, firstBlock, buf);
+            int warmupBlocks = getCwaWarmupBlocks(buf, epochPeriod);
+            long chunkBlocks = Math.max((numBlocks - firstBlock) / (numThreads * CHUNKS_PER_THREAD),
+                warmupBlocks * MIN_CHUNK_WARMUPS);
+            List<Long> chunkBlockStarts = new ArrayList<Long>();
+            List<Long> chunkTimeStarts = new ArrayList<Long>();
+            chunkBlockStarts.add(firstBlock);
+            chunkTimeStarts.add(Long.MIN_VALUE);
+            for (long block = firstBlock + chunkBlocks; block < numBlocks; block += chunkBlocks) {
+                long dataBlock = block;
+                while (dataBlock < numBlocks && !isCwaDataBlock(readCwaBlock(rawAccReader, dataBlock, buf))) {
+                    dataBlock++;
+                }
+                if (dataBlock == numBlocks) {
+                    break;
+                }
+                long chunkTimeStart = zonedWithDSTCorrection(getCwaBlockTime(buf)).toInstant().toEpochMilli();
+                // chunks must own consecutive time ranges
+                if (chunkTimeStart > chunkTimeStarts.get(chunkTimeStarts.size() - 1)) {
+                    chunkBlockStarts.add(dataBlock);
+                    chunkTimeStarts.add(chunkTimeStart);
+                }
+            }
+            chunkTimeStarts.add(Long.MAX_VALUE);
+
+            // decode chunks, then write their epochs in order
+            int numChunks = chunkBlockStarts.size();
+            List<Future<List<EpochWriter.EpochRecord>>> chunks =
+                new ArrayList<Future<List<EpochWriter.EpochRecord>>>();
+            for (int i = 0; i < numChunks; i++) {
+                EpochWriter chunkWriter = epochWriter.newChunkWriter(
+                    i == 0 ? -1 : gridAnchor, chunkTimeStarts.get(i), chunkTimeStarts.get(i + 1));
+                long decodeStart = i == 0 ? firstBlock :
+                    Math.max(firstBlock, chunkBlockStarts.get(i) - warmupBlocks);
+                chunks.add(executor.submit(() -> readCwaChunk(accFile, decodeStart, chunkWriter)));
+            }
+            for (int i = 0; i < numChunks; i++) {
+                epochWriter.writeEpochRecords(chunks.get(i).get());
+                if (verbose) {
+                    System.out.print(((i + 1) * 100 / numChunks) + "%\t");
+                }
+            }
+            rawAccReader.close();
+        } catch (Exception excep) {
+            excep.printStackTrace(System.err);
+            System.err.println("error reading/writing file " + accFile + ": " + excep.toString());
+            System.exit(-2);
+        } finally {
+            executor.shutdownNow();
+        }
+    }
+
+
+    // decode blocks from startBlock until chunkWriter has all of its epochs
+    private static List<EpochWriter.EpochRecord> readCwaChunk(String accFile,
+            long startBlock, EpochWriter chunkWriter) throws IOException {
+        int[] errCounter = new int[] { 0 };
+        LocalDateTime[] lastBlockTime = { null };
+        int[] lastBlockTimeIndex = { 0 };
+        ByteBuffer buf = ByteBuffer.allocate(CWA_BLOCK_SIZE);
+        try ( FileInputStream accStream = new FileInputStream(accFile); ) {
+            FileChannel rawAccReader = accStream.getChannel();
+            rawAccReader.position(startBlock * CWA_BLOCK_SIZE);
+            while (!chunkWriter.isChunkEndReached() && rawAccReader.read(buf) != -1) {
+                readCwaBuffer(buf, true, lastBlockTime, lastBlockTimeIndex, "",
+                    errCounter, chunkWriter);
+                buf.clear();
+            }
+        }
+        return chunkWriter.getChunkRecords();
+    }
+
+
+    // read block (as readCwaBuffer expects it) without moving channel position
+    private static ByteBuffer readCwaBlock(FileChannel rawAccReader, long block,
+            ByteBuffer buf) throws IOException {
+        buf.clear();
+        rawAccReader.read(buf, block * CWA_BLOCK_SIZE);
+        buf.order(ByteOrder.LITTLE_ENDIAN);
+        return buf;
+    }
+
+
+    private static boolean isCwaDataBlock(ByteBuffer buf) {
+        return buf.position() == CWA_BLOCK_SIZE && buf.get(0) == 'A' && buf.get(1) == 'X';
+    }
+
+
+    // time of a data block, as calculated by readCwaBuffer
+    private static LocalDateTime getCwaBlockTime(ByteBuffer buf) {
+        long blockTimestamp = getUnsignedInt(buf, 14);
+        short rateCode = (short) (buf.get(24) & 0xff);
+        int oldDeviceId = getUnsignedShort(buf, 4);
+        int fractional = 0;
+        if (rateCode != 0 && (oldDeviceId & 0x8000) != 0) {
+            fractional = ((oldDeviceId & 0x7fff) << 1);
+        }
+        return getCwaTimestamp((int) blockTimestamp, fractional);
+    }
+
+
+    // number of (data) blocks spanning WARMUP_EPOCHS epochs, plus a margin
+    private static int getCwaWarmupBlocks(ByteBuffer buf, int epochPeriod) {
+        short rateCode = (short) (buf.get(24) & 0xff);
+        short numAxesBPS = (short) (buf.get(25) & 0xff);
+        double sampleFreq = rateCode != 0 ?
+            3200.0 / (1 << (15 - (rateCode & 15))) : buf.getShort(26);
+        int samplesPerBlock = (numAxesBPS & 0x0f) == 2 ? 80 : 120;
+        return (int) Math.ceil(WARMUP_EPOCHS * epochPeriod * Math.max(sampleFreq, 1) / samplesPerBlock) + 2;
+    }
+
+
     /**
      * Read and process Axivity CWA.gz gzipped file. Setup file reading
      * infrastructure and then call readCwaBuffer() method
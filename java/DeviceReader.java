@@ -42,6 +42,9 @@ public class DeviceReader {
         String rawFile,
         boolean npyOutput,
         String npyFile,
+        boolean npyCompress,
+        String spillFile,
+        boolean streamEpochs,
         boolean getFeatures,
         int numFFTbins,
         DateTimeFormatter timeFormat,
@@ -65,54 +68,72 @@ public class DeviceReader {
         BufferedWriter epochFileWriter = null;
         BufferedWriter rawWriter = null; // raw and npy are null if not used
         NpyWriter npyWriter = null;
+        SpillWriter spillWriter = null;
+        NpzWriter epochNpzWriter = null;
+        EpochStreamWriter epochStreamWriter = null;
         try{
-            if (outputFile.endsWith(".gz")) {
-            GZIPOutputStream zip = new GZIPOutputStream(new FileOutputStream(new File(outputFile)));
-            epochFileWriter = new BufferedWriter(new OutputStreamWriter(zip, "UTF-8"));
-        } else {
-            epochFileWriter = new BufferedWriter(new FileWriter(outputFile));
-        }
-        LowpassFilter filter = null;
-        if (useFilter) {
-            filter = new LowpassFilter(20, sampleRate, verbose);
-        }
-        if (rawOutput) {
-            if (rawFile.trim().length() == 0) {
-                rawFile = (outputFile.toLowerCase().endsWith(".csv.gz") // generate raw output filename
-                    ? outputFile.substring(0, outputFile.length() - ".csv.gz".length()) : outputFile) + "_raw.csv.gz";
+            if (streamEpochs) {
+                epochStreamWriter = EpochWriter.createEpochStreamWriter(timeZone,
+                    epochPeriod, getFeatures, numFFTbins);
             }
-            GZIPOutputStream zipRaw = new GZIPOutputStream(
-                                new FileOutputStream(new File(rawFile)));
-            rawWriter = new BufferedWriter(new OutputStreamWriter(zipRaw, "UTF-8"));
-        }
-        if (npyOutput) {
-            if (npyFile.trim().length() == 0) {
-                npyFile = (outputFile.toLowerCase().endsWith(".csv.gz") // generate npy output filename
-                    ? outputFile.substring(0, outputFile.length() - ".csv.gz".length()) : outputFile) + "_raw.npy";
+            if (outputFile.isEmpty()) {
+                // only stream epochs, no epoch file
+            } else if (outputFile.toLowerCase().endsWith(".npz")) {
+                epochNpzWriter = EpochWriter.createEpochNpzWriter(outputFile, timeZone,
+                    epochPeriod, getFeatures, numFFTbins);
+            } else if (outputFile.endsWith(".gz")) {
+                GZIPOutputStream zip = new GZIPOutputStream(new FileOutputStream(new File(outputFile)));
+                epochFileWriter = new BufferedWriter(new OutputStreamWriter(zip, "UTF-8"));
+            } else {
+                epochFileWriter = new BufferedWriter(new FileWriter(outputFile));
             }
-            npyWriter = new NpyWriter(npyFile);
-        }
-        epochWriter = new EpochWriter(
-                  epochFileWriter,
-                  rawWriter,
-                  npyWriter,
-                  timeFormat,
-                  timeZone,
-                  epochPeriod,
-                  sampleRate,
-                  range,
-                  swIntercept,
-                  swSlope,
-                  tempCoef,
-                  meanTemp,
-                  getStationaryBouts,
-                  stationaryStd,
-                  filter,
-                  startTime,
-                  endTime,
-                  getFeatures,
-                  numFFTbins
-                  );
+            LowpassFilter filter = null;
+            if (useFilter) {
+                filter = new LowpassFilter(20, sampleRate, verbose);
+            }
+            if (rawOutput) {
+                if (rawFile.trim().length() == 0) {
+                    rawFile = (outputFile.toLowerCase().endsWith(".csv.gz") // generate raw output filename
+                        ? outputFile.substring(0, outputFile.length() - ".csv.gz".length()) : outputFile) + "_raw.csv.gz";
+                }
+                GZIPOutputStream zipRaw = new GZIPOutputStream(
+                                    new FileOutputStream(new File(rawFile)));
+                rawWriter = new BufferedWriter(new OutputStreamWriter(zipRaw, "UTF-8"));
+            }
+            if (npyOutput) {
+                if (npyFile.trim().length() == 0) {
+                    npyFile = (outputFile.toLowerCase().endsWith(".csv.gz") // generate npy output filename
+                        ? outputFile.substring(0, outputFile.length() - ".csv.gz".length()) : outputFile) + "_raw.npy";
+                }
+                npyWriter = new NpyWriter(npyFile, npyCompress);
+            }
+            if (spillFile.trim().length() > 0) {
+                spillWriter = new SpillWriter(spillFile);
+            }
+            epochWriter = new EpochWriter(
+                      epochFileWriter,
+                      epochNpzWriter,
+                      epochStreamWriter,
+                      rawWriter,
+                      npyWriter,
+                      spillWriter,
+                      timeFormat,
+                      timeZone,
+                      epochPeriod,
+                      sampleRate,
+                      range,
+                      swIntercept,
+                      swSlope,
+                      tempCoef,
+                      meanTemp,
+                      getStationaryBouts,
+                      stationaryStd,
+                      filter,
+                      startTime,
+                      endTime,
+                      getFeatures,
+                      numFFTbins
+                      );
         } catch (IOException excep) {
             excep.printStackTrace(System.err);
             System.err.println("error closing file writer: " + excep.toString());
@@ -175,6 +196,20 @@ public class DeviceReader {
     }
 
 
+    /**
+     * Forget all time settings and session state of the previous file, so
+     * that a long-lived JVM (see ParserWorker) decodes each file as a fresh
+     * one would.
+     */
+    public static void resetSession() {
+        DeviceReader.sessionStart = null;
+        DeviceReader.sessionStartDST = false;
+        DeviceReader.zoneId = null;
+        DeviceReader.rules = null;
+        DeviceReader.timeShift = 0;
+    }
+
+
     protected static void setTimeSettings(String timeZone, int timeShift) {
         DeviceReader.zoneId = ZoneId.of(timeZone);
         DeviceReader.rules = zoneId.getRules();
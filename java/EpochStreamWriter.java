@@ -0,0 +1,53 @@
+import java.io.BufferedOutputStream;
+import java.io.DataOutputStream;
+import java.io.IOException;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
+
+
+/**
+ * Streams epoch records as framed (big-endian) binary, e.g. to stdout so a
+ * calling process can read epochs without an intermediate epoch file.
+ *
+ * Stream layout:
+ *  - MAGIC (8 bytes), VERSION (int32)
+ *  - header: length (int32) + UTF-8 JSON with timeZone, timeUnit and columns
+ *  - one frame per epoch: length (int32) + time (int64 Unix millis) +
+ *    one float64 value for each remaining column
+ *  - end of stream: a frame of length 0
+ */
+public class EpochStreamWriter {
+
+	public final static byte[] MAGIC = "ACCEPOCH".getBytes(StandardCharsets.US_ASCII);
+	public final static int VERSION = 1;
+
+	private DataOutputStream out;
+
+
+	public EpochStreamWriter(OutputStream stream, String header) throws IOException {
+		out = new DataOutputStream(new BufferedOutputStream(stream, 1 << 16));
+		byte[] headerBytes = header.getBytes(StandardCharsets.UTF_8);
+		out.write(MAGIC);
+		out.writeInt(VERSION);
+		out.writeInt(headerBytes.length);
+		out.write(headerBytes);
+	}
+
+
+	public void writeEpoch(long time, double[] values) throws IOException {
+		out.writeInt(Long.BYTES + Double.BYTES * values.length);
+		out.writeLong(time);
+		for (double value : values) {
+			out.writeDouble(value);
+		}
+	}
+
+
+	// writes the end of stream frame
+	public void close() throws IOException {
+		out.writeInt(0);
+		out.flush();
+	}
+
+
+}
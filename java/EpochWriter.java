@@ -1,4 +1,6 @@
 import java.io.BufferedWriter;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
 import java.io.IOException;
 import java.math.RoundingMode;
 import java.text.DecimalFormat;
@@ -12,6 +14,7 @@ import java.time.format.DateTimeFormatter;
 import java.time.temporal.ChronoUnit;
 import java.time.zone.ZoneRulesProvider;
 import java.util.ArrayList;
+import java.util.Arrays;
 import java.util.Date;
 import java.util.List;
 import java.util.Locale;
@@ -58,17 +61,36 @@ public class EpochWriter {
 	private int numFFTbins;
 
 	// file read/write objects
-	private BufferedWriter epochFileWriter;
+	private BufferedWriter epochFileWriter; // null if writing .npz epochs
+	private NpzWriter epochNpzWriter;
+	private EpochStreamWriter epochStreamWriter;
 	private BufferedWriter rawWriter; // raw and fft are null if not used
     private NpyWriter npyWriter;
+    private SpillWriter spillWriter;
+    private int spillErrCount = 0; // errCounter value after the last spilled sample
+
+    // exit the JVM once endTime is reached (false when run inside a ParserWorker)
+    private boolean exitAtEndTime = true;
+    private boolean endTimeReached = false;
+
+    // chunk writers (see newChunkWriter) keep records of epochs starting in
+    // [chunkStart, chunkEnd) in memory, instead of writing them to file
+    private List<EpochRecord> chunkRecords = null;
+    private long chunkStart;
+    private long chunkEnd;
+    private long gridAnchor = UNUSED_DATE; // epochs start at gridAnchor + k * epochPeriod
+    private boolean chunkEndReached = false;
 
     private ZoneId zoneId;
 
 
 	public EpochWriter(
 		      BufferedWriter epochFileWriter,
+		      NpzWriter epochNpzWriter,
+		      EpochStreamWriter epochStreamWriter,
 		      BufferedWriter rawWriter,
 		      NpyWriter npyWriter,
+		      SpillWriter spillWriter,
               DateTimeFormatter timeFormat,
               String timeZone,
 		      int epochPeriod,
@@ -86,9 +108,13 @@ public class EpochWriter {
 		      boolean getFeatures,
 		      int numFFTbins) {
 		this.epochFileWriter = epochFileWriter;
+		this.epochNpzWriter = epochNpzWriter;
+		this.epochStreamWriter = epochStreamWriter;
 		this.rawWriter = rawWriter;
 		this.npyWriter = npyWriter;
+		this.spillWriter = spillWriter;
 		this.timeFormat = timeFormat;
+		this.timeZone = timeZone;
 		this.epochPeriod = epochPeriod;
 		this.intendedSampleRate = intendedSampleRate;
 		this.range = range;
@@ -117,21 +143,103 @@ public class EpochWriter {
 		DF3.setRoundingMode(RoundingMode.HALF_UP); // To match mHealth Gt3x implementation
         DF2.setRoundingMode(RoundingMode.CEILING);
 
+		if (epochFileWriter!=null)
+			writeLine(epochFileWriter, getEpochHeader(getFeatures, numFFTbins));
+
+		if (rawWriter!=null)
+			writeLine(rawWriter, "time,x,y,z");
+
+	}
+
+
+	public static String getEpochHeader(boolean getFeatures, int numFFTbins) {
 		String epochHeader = "time";
 		epochHeader += "," + AccStats.getStatsHeader(getFeatures, numFFTbins);
     	epochHeader += ",temp,samples";
 		epochHeader += ",dataErrors,clipsBeforeCalibr,clipsAfterCalibr,rawSamples";
+		return epochHeader;
+	}
 
-		writeLine(epochFileWriter, epochHeader);
 
-		if (rawWriter!=null)
-			writeLine(rawWriter, "time,x,y,z");
+	/**
+	 * Creates a writer for binary .npz epoch files, with the same columns as
+	 * the .csv epoch file: time (int64 Unix millis), features (float64), temp
+	 * (float64) and sample/error counts (int32). The timezone is stored once,
+	 * in the "metadata.json" member.
+	 */
+	public static NpzWriter createEpochNpzWriter(String outputFile,
+			String timeZone, int epochPeriod, boolean getFeatures, int numFFTbins) {
+		String[] itemNames = getEpochHeader(getFeatures, numFFTbins).split(",");
+		Class[] itemTypes = new Class[itemNames.length];
+		for (int i = 0; i < itemNames.length; i++) {
+			if (i == 0) {
+				itemTypes[i] = Long.class;
+			} else if (i < itemNames.length - 5) { // features and temp
+				itemTypes[i] = Double.class;
+			} else {
+				itemTypes[i] = Integer.class;
+			}
+		}
+		NpzWriter npzWriter = new NpzWriter(outputFile, itemNames, itemTypes);
+		npzWriter.setMetadata(getEpochMetadata(timeZone, epochPeriod, getFeatures, numFFTbins));
+		return npzWriter;
+	}
+
+
+	/**
+	 * Creates a writer streaming epoch records as framed binary to stdout
+	 * (see EpochStreamWriter).
+	 */
+	public static EpochStreamWriter createEpochStreamWriter(String timeZone,
+			int epochPeriod, boolean getFeatures, int numFFTbins) throws IOException {
+		return new EpochStreamWriter(new FileOutputStream(FileDescriptor.out),
+			getEpochMetadata(timeZone, epochPeriod, getFeatures, numFFTbins));
+	}
+
 
+	// JSON description of binary epoch records
+	private static String getEpochMetadata(String timeZone, int epochPeriod,
+			boolean getFeatures, int numFFTbins) {
+		String columnsJson = "";
+		for (String itemName : getEpochHeader(getFeatures, numFFTbins).split(",")) {
+			columnsJson += (columnsJson.isEmpty() ? "" : ", ") + "\"" + itemName + "\"";
+		}
+		return "{\"timeZone\": \"" + timeZone + "\""
+			+ ", \"timeUnit\": \"ms\""
+			+ ", \"epochPeriod\": " + epochPeriod
+			+ ", \"columns\": [" + columnsJson + "]}";
+	}
+
+
+	/**
+	 * Creates a writer with the same settings (and a reset copy of the filter)
+	 * that keeps the records of epochs starting in [chunkStart, chunkEnd) in
+	 * memory, so part of a file can be processed on another thread. Samples
+	 * before chunkStart are still processed (but not kept), so a chunk can
+	 * start a few epochs early to warm up the filter and edge interpolation.
+	 *
+	 * @param gridAnchor start time of any epoch of a sequential pass, to
+	 *            align epochs to, or -1 to start the first epoch at the
+	 *            first sample (as a sequential pass does)
+	 */
+	public EpochWriter newChunkWriter(long gridAnchor, long chunkStart, long chunkEnd) {
+		EpochWriter chunkWriter = new EpochWriter(null, null, null, null, null,
+			null, timeFormat, timeZone, epochPeriod, intendedSampleRate, range,
+			swIntercept, swSlope, tempCoef, meanTemp, getStationaryBouts,
+			stationaryStd, filter == null ? null : filter.copy(), startTime,
+			endTime, getFeatures, numFFTbins);
+		chunkWriter.exitAtEndTime = false;
+		chunkWriter.gridAnchor = gridAnchor;
+		chunkWriter.chunkStart = chunkStart;
+		chunkWriter.chunkEnd = chunkEnd;
+		chunkWriter.chunkRecords = new ArrayList<EpochRecord>();
+		return chunkWriter;
 	}
 
 
 	// Method which accepts raw values and writes them to an epoch (when enough values collected)
-	// Returns true to continue processing, or false if endTime has been reached
+	// Returns true to continue processing, or false if endTime (or the end of
+	// a chunk) has been reached
 	public boolean newValues(
 			long time, // Unix time (milliseconds)
 			double x,
@@ -140,12 +248,44 @@ public class EpochWriter {
 			double temperature,
 			int[] errCounter) {
 
+		if (endTimeReached || chunkEndReached) {
+			return false;
+		}
+		if (spillWriter == null) {
+			return addValues(time, x, y, z, temperature, errCounter);
+		}
+		// keep decoded sample (and any errors logged by the reader since the
+		// previous sample) so a later pass can replay it with SpillReader
+		try {
+			spillWriter.writeSample(time, x, y, z, temperature,
+				errCounter[0] - spillErrCount);
+		} catch (Exception excep) {
+			System.err.println("spill write error: " + excep.toString());
+		}
+		boolean keepGoing = addValues(time, x, y, z, temperature, errCounter);
+		spillErrCount = errCounter[0];
+		return keepGoing;
+	}
+
+
+	private boolean addValues(
+			long time, // Unix time (milliseconds)
+			double x,
+			double y,
+			double z,
+			double temperature,
+			int[] errCounter) {
+
 		if (startTime!=UNUSED_DATE && time<startTime) {
 			return true;
 		}
 
 		if (epochStartTime==UNUSED_DATE) { // if first good value start new epoch
-			if (startTime==UNUSED_DATE) {
+			if (gridAnchor!=UNUSED_DATE) {
+				// chunk writer, so start on the epoch grid of a sequential pass
+				long periodMillis = epochPeriod * 1000;
+				epochStartTime = gridAnchor + Math.floorDiv(time - gridAnchor, periodMillis) * periodMillis;
+			} else if (startTime==UNUSED_DATE) {
 				epochStartTime = time;
 			} else {
 				// if -startTime option is set, ensure that the first epoch would start at that time
@@ -226,15 +366,28 @@ public class EpochWriter {
 		if (endTime!=UNUSED_DATE && time>endTime) {
 			System.out.println("reached endTime at sample:" +
                 millisToZonedDateTime(time));
+			if (!exitAtEndTime) {
+				// ignore remaining samples, writers are closed by closeWriters()
+				endTimeReached = true;
+				return false;
+			}
 			try {
 				if (epochFileWriter!=null) epochFileWriter.close();
+				if (epochNpzWriter!=null) epochNpzWriter.close();
+				if (epochStreamWriter!=null) epochStreamWriter.close();
 				if (rawWriter!=null) rawWriter.close();
 				if (npyWriter!=null) npyWriter.close();
+				if (spillWriter!=null) spillWriter.close();
 			} catch (Exception ex) {
 				System.err.println("error closing output files");
 			}
 			System.exit(0); // end processing
 		}
+		if (chunkRecords!=null && epochStartTime>=chunkEnd) {
+			// all epochs of this chunk have been written
+			chunkEndReached = true;
+			return false;
+		}
 		// store axes + vector magnitude vals for every reading
 		timeVals.add(time - epochStartTime);
 		xVals.add(x);
@@ -356,24 +509,23 @@ public class EpochWriter {
 		// check if the values have likely been stuck during this epoch
 		errCounter[0] += AccStats.countStuckVals(xResampled, yResampled, zResampled);
 
-		// write summary values to file
-        String epochSummary = timeFormat.format(epochStartTime);
-		for(int i=0; i<stats.length; i++){
-			epochSummary += "," + DF6.format(stats[i]);
-		}
-
-		// write housekeeping stats
-		epochSummary += "," + DF2.format(AccStats.mean(temperatureVals));
-		epochSummary += "," + xResampled.length + "," + errCounter[0];
-		epochSummary += "," + clipsCounter[0] + "," + clipsCounter[1];
-		epochSummary += "," + timeVals.size();
-
 		//write line to file...
 		double xStd = stats[8]; //needed to identify stationary episodes
 		double yStd = stats[9]; //if running first step of calibration process
 		double zStd = stats[10];
 		if (!getStationaryBouts || (xStd < stationaryStd && yStd < stationaryStd && zStd < stationaryStd)) {
-			writeLine(epochFileWriter, epochSummary);
+			// epoch record: features, then housekeeping stats
+			long epochMillis = epochStartTime.toInstant().toEpochMilli();
+			double[] record = Arrays.copyOf(stats, stats.length + 6);
+			int col = stats.length;
+			record[col++] = AccStats.mean(temperatureVals);
+			record[col++] = xResampled.length;
+			record[col++] = errCounter[0];
+			record[col++] = clipsCounter[0];
+			record[col++] = clipsCounter[1];
+			record[col++] = timeVals.size();
+
+			writeEpochRecord(epochMillis, record);
 		}
 
 		timeVals.clear();
@@ -385,6 +537,73 @@ public class EpochWriter {
     }
 
 
+	// write epoch record to the epoch file/stream, or keep it if a chunk writer
+	private void writeEpochRecord(long epochMillis, double[] record) {
+		if (chunkRecords != null) {
+			if (epochMillis >= chunkStart && epochMillis < chunkEnd) {
+				chunkRecords.add(new EpochRecord(epochMillis, record));
+			}
+			return;
+		}
+		int numStats = record.length - 6; // features, then housekeeping stats
+		if (epochFileWriter != null) {
+			// write summary values to file
+	        String epochSummary = timeFormat.format(millisToZonedDateTime(epochMillis));
+			for(int i=0; i<numStats; i++){
+				epochSummary += "," + DF6.format(record[i]);
+			}
+
+			// write housekeeping stats
+			epochSummary += "," + DF2.format(record[numStats]);
+			for(int i=numStats+1; i<record.length; i++){
+				epochSummary += "," + (long) record[i];
+			}
+
+			writeLine(epochFileWriter, epochSummary);
+		}
+		if (epochNpzWriter != null) {
+			epochNpzWriter.put(0, epochMillis);
+			for(int i=0; i<record.length; i++){
+				epochNpzWriter.put(i + 1, record[i]);
+			}
+			epochNpzWriter.endRow();
+		}
+		if (epochStreamWriter != null) {
+			try {
+				epochStreamWriter.writeEpoch(epochMillis, record);
+			} catch (IOException excep) {
+				System.err.println("epoch stream write error: " + excep.toString());
+				System.exit(-2); // reader has gone away
+			}
+		}
+	}
+
+
+	// write records collected by chunk writer(s), in time order
+	public void writeEpochRecords(List<EpochRecord> records) {
+		for (EpochRecord epoch : records) {
+			writeEpochRecord(epoch.time, epoch.values);
+		}
+	}
+
+
+	// records kept by a chunk writer (see newChunkWriter)
+	public List<EpochRecord> getChunkRecords() {
+		return chunkRecords;
+	}
+
+
+	public boolean isChunkEndReached() {
+		return chunkEndReached;
+	}
+
+
+	// start of the current epoch (Unix millis), or -1 if no samples yet
+	public long getEpochStartTime() {
+		return epochStartTime;
+	}
+
+
 	private static void writeLine(BufferedWriter fileWriter, String line) {
         try {
             fileWriter.write(line + "\n");
@@ -407,11 +626,19 @@ public class EpochWriter {
     }
 
 
+	public void setExitAtEndTime(boolean exitAtEndTime) {
+		this.exitAtEndTime = exitAtEndTime;
+	}
+
+
 	public void closeWriters(){
 		try{
-			epochFileWriter.close();
+			if (epochFileWriter != null) epochFileWriter.close();
+			if (epochNpzWriter != null) epochNpzWriter.close();
+			if (epochStreamWriter != null) epochStreamWriter.close();
 			if (rawWriter != null) rawWriter.close();
 			if (npyWriter != null) npyWriter.close();
+			if (spillWriter != null) spillWriter.close();
 		} catch (IOException excep) {
 			excep.printStackTrace(System.err);
 			System.err.println("error closing file writer: " + excep.toString());
@@ -452,4 +679,19 @@ public class EpochWriter {
     }
 
 
+	/**
+	 * Epoch record kept by a chunk writer: start time (Unix millis), then
+	 * features and housekeeping stats, as written to the epoch file.
+	 */
+	public static class EpochRecord {
+		public final long time;
+		public final double[] values;
+
+		public EpochRecord(long time, double[] values) {
+			this.time = time;
+			this.values = values;
+		}
+	}
+
+
 }
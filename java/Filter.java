@@ -24,6 +24,15 @@ public class Filter {
 		}
 	}
 	
+	// Copy with the same coefficients, and reset state
+	public Filter copy() {
+		Filter copy = new Filter();
+		copy.B = B.clone();
+		copy.A = A.clone();
+		copy.z = new double[z.length];
+		return copy;
+	}
+	
 	// Apply the filter to the specified data
 	public void filter(double[] X, int offset, int count) {
 		int i, j;
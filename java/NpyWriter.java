@@ -11,7 +11,7 @@ import java.util.zip.GZIPOutputStream;
 
 public class NpyWriter {
 
-    private static final Boolean COMPRESS = true;
+    private boolean compress = true; // gzip (then delete) the .npy file on close
     private String outputFile;
 	private File file;
     private RandomAccessFile raf;
@@ -45,7 +45,19 @@ public class NpyWriter {
 	 * @param outputFile filename for the .npy file
 	 */
 	public NpyWriter(String outputFile) {
+		this(outputFile, true);
+	}
+
+
+	/**
+	 * Opens a .npy file for writing (contents are erased) and initializes a dummy header.
+	 * @param outputFile filename for the .npy file
+	 * @param compress gzip the .npy file on close, otherwise keep it uncompressed
+	 *        so it can be memory-mapped (random access)
+	 */
+	public NpyWriter(String outputFile, boolean compress) {
         this.outputFile = outputFile;
+        this.compress = compress;
 
 		try {
             file = new File(outputFile);
@@ -204,13 +216,13 @@ public class NpyWriter {
 
 		try {
 			// write any remaining data
-			raf.write(lineBuffer.array());
+			raf.write(lineBuffer.array(), 0, lineBuffer.position());
 			lineBuffer.clear();
 		} catch (IOException e) {
 			e.printStackTrace();
         }
 
-        if (COMPRESS) {
+        if (compress) {
             System.out.println("\ncompressing .npy file...");
             compress();  // compress created file
         }
@@ -221,7 +233,7 @@ public class NpyWriter {
 			e.printStackTrace();
         }
 
-        if (COMPRESS) {
+        if (compress) {
             System.out.println("deleting uncompressed .npy file...");
             file.delete();  // note: raf must be closed first
         }
@@ -0,0 +1,147 @@
+import java.io.ByteArrayOutputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.charset.StandardCharsets;
+import java.util.zip.Deflater;
+import java.util.zip.ZipEntry;
+import java.util.zip.ZipOutputStream;
+
+
+/**
+ * Writes a table to a numpy .npz file, with one typed .npy array per column
+ * (readable with numpy.load) and a "metadata.json" member. Columns are kept in
+ * memory until close(), as .npy headers need the final number of rows.
+ */
+public class NpzWriter {
+
+	private final static byte[] NPY_HEADER;
+	static {
+		byte[] hdr = "XNUMPY".getBytes(StandardCharsets.US_ASCII);
+		hdr[0] = (byte) 0x93;
+		NPY_HEADER = hdr;
+	}
+	private final static byte NPY_MAJ_VERSION = 1;
+	private final static byte NPY_MIN_VERSION = 0;
+	private final static int BLOCK_SIZE = 64;
+
+	private String outputFile;
+	private String[] itemNames;
+	private Class[] itemTypes;
+	private ByteArrayOutputStream[] columns;
+	private ByteBuffer valueBuffer = ByteBuffer.allocate(Long.BYTES).order(ByteOrder.LITTLE_ENDIAN);
+	private int rowsWritten = 0;
+	private String metadata = "{}";
+
+
+	/**
+	 * @param outputFile filename for the .npz file
+	 * @param itemNames column names
+	 * @param itemTypes column types: Long, Integer, Float or Double
+	 */
+	public NpzWriter(String outputFile, String[] itemNames, Class[] itemTypes) {
+		this.outputFile = outputFile;
+		this.itemNames = itemNames;
+		this.itemTypes = itemTypes;
+		columns = new ByteArrayOutputStream[itemNames.length];
+		for (int i = 0; i < columns.length; i++) {
+			columns[i] = new ByteArrayOutputStream();
+		}
+	}
+
+
+	/**
+	 * @param metadata JSON string stored as the "metadata.json" member
+	 */
+	public void setMetadata(String metadata) {
+		this.metadata = metadata;
+	}
+
+
+	// write value to column (converted to the column's type)
+	public void put(int column, long value) {
+		if (itemTypes[column] == Long.class) {
+			valueBuffer.putLong(0, value);
+			columns[column].write(valueBuffer.array(), 0, Long.BYTES);
+		} else {
+			put(column, (double) value);
+		}
+	}
+
+
+	// write value to column (converted to the column's type)
+	public void put(int column, double value) {
+		Class type = itemTypes[column];
+		if (type == Double.class) {
+			valueBuffer.putDouble(0, value);
+			columns[column].write(valueBuffer.array(), 0, Double.BYTES);
+		} else if (type == Float.class) {
+			valueBuffer.putFloat(0, (float) value);
+			columns[column].write(valueBuffer.array(), 0, Float.BYTES);
+		} else if (type == Integer.class) {
+			valueBuffer.putInt(0, (int) value);
+			columns[column].write(valueBuffer.array(), 0, Integer.BYTES);
+		} else {
+			valueBuffer.putLong(0, (long) value);
+			columns[column].write(valueBuffer.array(), 0, Long.BYTES);
+		}
+	}
+
+
+	// call once all columns of the current row have been written
+	public void endRow() {
+		rowsWritten++;
+	}
+
+
+	public void close() throws IOException {
+		try ( ZipOutputStream zip = new ZipOutputStream(new FileOutputStream(outputFile)); ) {
+			zip.setLevel(Deflater.BEST_SPEED);
+			for (int i = 0; i < itemNames.length; i++) {
+				zip.putNextEntry(new ZipEntry(itemNames[i] + ".npy"));
+				zip.write(npyHeader(itemTypes[i]));
+				columns[i].writeTo(zip);
+				zip.closeEntry();
+				columns[i] = null; // free memory
+			}
+			zip.putNextEntry(new ZipEntry("metadata.json"));
+			zip.write(metadata.getBytes(StandardCharsets.UTF_8));
+			zip.closeEntry();
+		}
+	}
+
+
+	/**
+	 * .npy (version 1.0) header for a 1d little-endian array of rowsWritten
+	 * items, padded to a multiple of BLOCK_SIZE bytes.
+	 */
+	private byte[] npyHeader(Class type) {
+		String dataHeader = "{'descr': '" + toDataTypeStr(type) + "'"
+						+ ", 'fortran_order': False"
+						+ ", 'shape': (" + rowsWritten + ",), }";
+		int preambleLen = NPY_HEADER.length + 2 + Short.BYTES;
+		int padding = BLOCK_SIZE - (preambleLen + dataHeader.length() + 1) % BLOCK_SIZE;
+		dataHeader += new String(new char[padding % BLOCK_SIZE]).replace("\0", " ") + "\n";
+
+		ByteBuffer header = ByteBuffer.allocate(preambleLen + dataHeader.length())
+			.order(ByteOrder.LITTLE_ENDIAN);
+		header.put(NPY_HEADER);
+		header.put(NPY_MAJ_VERSION);
+		header.put(NPY_MIN_VERSION);
+		header.putShort((short) dataHeader.length());
+		header.put(dataHeader.getBytes(StandardCharsets.US_ASCII));
+		return header.array();
+	}
+
+
+	private static String toDataTypeStr(Class type) {
+		if (type == Long.class) return "<i8";
+		if (type == Integer.class) return "<i4";
+		if (type == Float.class) return "<f4";
+		if (type == Double.class) return "<f8";
+		throw new RuntimeException("Unsupported .npz column type: " + type);
+	}
+
+
+}
@@ -0,0 +1,52 @@
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+
+
+/**
+ * Long-lived AccelerometerParser process, which keeps the JVM (and its JIT
+ * compiled code) alive between files. Jobs are read from stdin, one per line,
+ * as the usual AccelerometerParser arguments separated by tabs:
+ 			inputFile.cwa.gz<TAB>outputFile:epoch.csv.gz<TAB>...
+ * Once a job finishes, JOB_DONE followed by its exit code is written to stdout.
+ * The worker stops when stdin is closed.
+ */
+public class ParserWorker {
+
+	public static final String JOB_DONE = "@@parserWorker-jobDone:";
+
+
+	public static void main(String[] args) {
+		try ( BufferedReader jobReader = new BufferedReader(
+				new InputStreamReader(System.in, "UTF-8")); ) {
+			String job;
+			while ((job = jobReader.readLine()) != null) {
+				if (job.isEmpty()) {
+					continue;
+				}
+				int exitCode = runJob(job.split("\t"));
+				System.out.println(JOB_DONE + exitCode);
+				System.out.flush();
+			}
+		} catch (Exception excep) {
+			excep.printStackTrace(System.err);
+			System.err.println("error reading job: " + excep.toString());
+			System.exit(-2);
+		}
+		System.exit(0);
+	}
+
+
+	private static int runJob(String[] jobArgs) {
+		// forget the previous file's session, timezone and timeShift
+		DeviceReader.resetSession();
+		try {
+			return AccelerometerParser.run(jobArgs, false);
+		} catch (Exception excep) {
+			excep.printStackTrace(System.err);
+			System.err.println("error running job: " + excep.toString());
+			return -2;
+		}
+	}
+
+
+}
@@ -0,0 +1,51 @@
+import java.io.FileInputStream;
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.channels.FileChannel;
+
+
+/**
+ * Replays decoded samples written by SpillWriter, in place of decoding the
+ * original raw device file. Unlike the device readers, errors are thrown to
+ * the caller rather than exiting, so a ParserWorker survives a failed job.
+ */
+public class SpillReader extends DeviceReader {
+
+    public static void readSpillEpochs(
+        String spillFile,
+        EpochWriter epochWriter,
+        Boolean verbose) throws IOException {
+
+        int[] errCounter = new int[] { 0 }; // store val if updated in other
+                                            // method
+        int recordSize = SpillWriter.BYTES_PER_RECORD;
+        ByteBuffer buf = ByteBuffer.allocate(10000 * recordSize).order(SpillWriter.BYTE_ORDER);
+        try ( FileInputStream spillStream = new FileInputStream(spillFile); ) {
+            FileChannel spillReader = spillStream.getChannel();
+
+            long totalRecords = spillReader.size() / recordSize;
+            long recordCount = 0;
+            while (spillReader.read(buf) != -1) {
+                buf.flip();
+                while (buf.remaining() >= recordSize) {
+                    long time = buf.getLong();
+                    double x = buf.getDouble();
+                    double y = buf.getDouble();
+                    double z = buf.getDouble();
+                    double temperature = buf.getDouble();
+                    errCounter[0] += buf.getInt();
+                    epochWriter.newValues(time, x, y, z, temperature, errCounter);
+                    recordCount++;
+                    // option to provide status update to user...
+                    if (verbose && recordCount % 10000000 == 0) {
+                        System.out.print((recordCount * 100 / totalRecords) + "%\t");
+                    }
+                }
+                buf.compact();
+            }
+            spillReader.close();
+        }
+    }
+
+
+}
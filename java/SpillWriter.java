@@ -0,0 +1,84 @@
+import java.io.File;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.channels.FileChannel;
+
+
+/**
+ * Writes decoded (pre-calibration) samples to a compact binary spill file so
+ * that a later pass can replay them with SpillReader instead of decoding the
+ * raw device file again.
+ *
+ * Each little-endian record holds: time (long, Unix millis), x/y/z and
+ * temperature (double, so that replayed samples are identical to decoded ones
+ * for every device format), and the change in the device reader's error
+ * counter since the previous sample (int).
+ */
+public class SpillWriter {
+
+    // 44 bytes, keep accelerometer/device.py SPILL_BYTES_PER_SAMPLE in step
+    public final static int BYTES_PER_RECORD = Long.BYTES + Double.BYTES * 4 + Integer.BYTES;
+    public final static ByteOrder BYTE_ORDER = ByteOrder.LITTLE_ENDIAN;
+
+    private String outputFile;
+    private FileOutputStream stream;
+    private FileChannel channel;
+
+    // buffer file output so it's faster
+    private int bufferLength = 10000; // number of records to buffer
+    private ByteBuffer recordBuffer = ByteBuffer.allocate(bufferLength * BYTES_PER_RECORD).order(BYTE_ORDER);
+
+
+    /**
+     * Opens a spill file for writing (contents are erased).
+     * @param outputFile filename for the spill file
+     */
+    public SpillWriter(String outputFile) {
+        this.outputFile = outputFile;
+        try {
+            stream = new FileOutputStream(new File(outputFile));
+            channel = stream.getChannel();
+        } catch (IOException e) {
+            throw new RuntimeException("The spill file " + outputFile + " could not be created");
+        }
+    }
+
+
+    public void writeSample(long time, double x, double y, double z,
+                            double temperature, int errors) throws IOException {
+        recordBuffer.putLong(time);
+        recordBuffer.putDouble(x);
+        recordBuffer.putDouble(y);
+        recordBuffer.putDouble(z);
+        recordBuffer.putDouble(temperature);
+        recordBuffer.putInt(errors);
+        if (!recordBuffer.hasRemaining()) {
+            flush();
+        }
+    }
+
+
+    private void flush() throws IOException {
+        recordBuffer.flip();
+        while (recordBuffer.hasRemaining()) {
+            channel.write(recordBuffer);
+        }
+        recordBuffer.clear();
+    }
+
+
+    public void close() {
+        try {
+            flush();
+            channel.close();
+            stream.close();
+        } catch (IOException e) {
+            e.printStackTrace();
+            System.err.println("error closing spill file " + outputFile);
+        }
+    }
+
+
+}
@@ -0,0 +1,108 @@
+import org.junit.Test;
+
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.FileReader;
+import java.io.IOException;
+import java.io.InputStream;
+import java.nio.file.Files;
+import java.nio.file.StandardCopyOption;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.zip.GZIPInputStream;
+
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assume.assumeTrue;
+
+public class ParallelCwaTest {
+
+    /*
+    Each chunk of a parallel pass starts from a reset copy of the lowpass
+    filter, whose state only converges to that of a sequential pass during
+    the warm up epochs, so epochs are compared within a tolerance.
+    Needs data/sample.cwa(.gz), see utilities/downloadDataModels.sh
+     */
+    private static final double TOLERANCE = 1e-5;
+
+    @Test
+    public void parallelEpochsMatchSequential() throws IOException {
+        File cwaFile = getSampleCwa();
+        assumeTrue("sample.cwa not found, skipping", cwaFile != null);
+
+        File sequential = File.createTempFile("sequential", "Epoch.csv");
+        File parallel = File.createTempFile("parallel", "Epoch.csv");
+        try {
+            assertEquals(0, parseEpochs(cwaFile, sequential, 1));
+            assertEquals(0, parseEpochs(cwaFile, parallel, 4));
+
+            List<String[]> sequentialRows = readCsv(sequential);
+            List<String[]> parallelRows = readCsv(parallel);
+            assertEquals(sequentialRows.size(), parallelRows.size());
+            for (int i = 0; i < sequentialRows.size(); i++) {
+                String[] expected = sequentialRows.get(i);
+                String[] actual = parallelRows.get(i);
+                assertEquals("row " + i, expected.length, actual.length);
+                // header and time column must be identical
+                assertEquals("row " + i, expected[0], actual[0]);
+                for (int j = 1; j < expected.length; j++) {
+                    if (i == 0) {
+                        assertEquals(expected[j], actual[j]);
+                    } else {
+                        assertEquals("row " + i + ", column " + j,
+                            Double.parseDouble(expected[j]),
+                            Double.parseDouble(actual[j]), TOLERANCE);
+                    }
+                }
+            }
+        } finally {
+            sequential.delete();
+            parallel.delete();
+        }
+    }
+
+
+    private static int parseEpochs(File cwaFile, File outputFile, int threads) {
+        DeviceReader.resetSession();
+        return AccelerometerParser.run(new String[] {
+            cwaFile.getPath(),
+            "outputFile:" + outputFile.getPath(),
+            "timeZone:Europe/London",
+            "getFeatures:true",
+            "parallelThreads:" + threads }, false);
+    }
+
+
+    private static List<String[]> readCsv(File csvFile) throws IOException {
+        List<String[]> rows = new ArrayList<String[]>();
+        try ( BufferedReader reader = new BufferedReader(new FileReader(csvFile)); ) {
+            String line;
+            while ((line = reader.readLine()) != null) {
+                rows.add(line.split(","));
+            }
+        }
+        return rows;
+    }
+
+
+    // sample.cwa (tests run from the repository or java folder), unzipping
+    // sample.cwa.gz to a temporary file if needed, as only .cwa is parallel
+    private static File getSampleCwa() throws IOException {
+        for (String folder : new String[] { "data", "../data" }) {
+            File cwaFile = new File(folder, "sample.cwa");
+            if (cwaFile.exists()) {
+                return cwaFile;
+            }
+            File gzFile = new File(folder, "sample.cwa.gz");
+            if (gzFile.exists()) {
+                File tmpFile = File.createTempFile("sample", ".cwa");
+                tmpFile.deleteOnExit();
+                try ( InputStream in = new GZIPInputStream(new FileInputStream(gzFile)); ) {
+                    Files.copy(in, tmpFile.toPath(), StandardCopyOption.REPLACE_EXISTING);
+                }
+                return tmpFile;
+            }
+        }
+        return null;
+    }
+}
@@ -0,0 +1,265 @@
+"""Shared epoch data and helpers for the regression tests
+
+Epoch files are synthesised in each of the formats written by the java
+AccelerometerParser (csv, npz and the epoch stream), so that summaries of the
+same epochs can be compared across formats and summary implementations.
+Values are rounded as in the java csv output, so all formats hold identical
+epochs. The recording crosses a daylight savings change, has gaps, and has
+stationary (nonwear) episodes crossing the one day chunks of chunkedSummary.
+"""
+
+import io
+import json
+import os
+import struct
+import sys
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from accelerometer import accClassification
+from accelerometer import accUtils
+from accelerometer import device
+from accelerometer import summariseEpoch
+
+
+TIME_ZONE = 'Europe/London'
+EPOCH_PERIOD = 30
+EPOCHS_PER_DAY = 24 * 60 * 60 // EPOCH_PERIOD
+FEATURE_COLS = ['enmoTrunc', 'xStd', 'yStd', 'zStd', 'f0', 'f1', 'f2']
+COUNT_COLS = ['samples', 'dataErrors', 'clipsBeforeCalibr',
+    'clipsAfterCalibr', 'rawSamples']
+
+# Rows (start, end) of stationary runs, longer than the 60 minute minimum
+# nonwear duration unless stated, i.e. episodes crossing the first day chunk
+# boundary, only just crossing the second, a short run ending a chunk, one
+# spanning whole chunks, one only just continuing into the next chunk, and
+# one left open at the end of the file
+STATIONARY_RUNS = [(2700, 3100), (2 * EPOCHS_PER_DAY - 5, 2 * EPOCHS_PER_DAY + 120),
+    (3 * EPOCHS_PER_DAY - 20, 3 * EPOCHS_PER_DAY), (11400, 17500),
+    (7 * EPOCHS_PER_DAY - 200, 7 * EPOCHS_PER_DAY + 10),
+    (10 * EPOCHS_PER_DAY - 150, 10 * EPOCHS_PER_DAY)]
+# Rows (start, end) of missing epochs, incl. across a chunk boundary
+GAPS = [(EPOCHS_PER_DAY - 10, EPOCHS_PER_DAY + 10), (5000, 5003), (9000, 9200)]
+
+
+
+def makeEpochs(days=10, seed=42):
+    """Make synthetic epoch data, as loaded by accUtils.loadEpochFile()
+
+    :param int days: Number of days of epochs
+    :param int seed: Random seed
+
+    :return: Epoch data indexed by (timezone-aware) time
+    :rtype: pandas.DataFrame
+    """
+
+    rng = np.random.default_rng(seed)
+    n = days * EPOCHS_PER_DAY
+    time = pd.date_range('2020-10-20', periods=n + EPOCHS_PER_DAY,
+        freq='%ds' % EPOCH_PERIOD, tz=TIME_ZONE, name='time')
+    missing = np.zeros(len(time), dtype=bool)
+    for start, end in GAPS:
+        missing[start:end] = True
+    e = pd.DataFrame({
+        'enmoTrunc': np.abs(rng.normal(0.03, 0.05, n)),
+        'xStd': np.abs(rng.normal(0.03, 0.02, n)),
+        'yStd': np.abs(rng.normal(0.03, 0.02, n)),
+        'zStd': np.abs(rng.normal(0.03, 0.02, n)),
+        'f0': rng.normal(size=n), 'f1': rng.normal(size=n),
+        'f2': rng.normal(size=n),
+        'temp': rng.normal(20, 1, n)}, index=time[~missing][:n])
+    for start, end in STATIONARY_RUNS:
+        e.iloc[start:end, 1:4] = 0.001
+    # as printed by the java csv writer
+    e = e.round(6)
+    e['temp'] = e['temp'].round(2)
+    e['samples'] = EPOCH_PERIOD * 100
+    e['dataErrors'] = 0
+    e['clipsBeforeCalibr'] = 0
+    e['clipsAfterCalibr'] = rng.integers(0, 2, n)
+    e['rawSamples'] = EPOCH_PERIOD * 100
+    return e
+
+
+
+def writeEpochCsv(e, epochFile):
+    """Write epochs as the java CsvWriter, e.g. "2020-10-20 00:00:00.000+0100
+    [Europe/London]" times
+
+    :param pandas.DataFrame e: Epoch data indexed by (timezone-aware) time
+    :param str epochFile: Output .csv.gz file
+    """
+
+    e = e.copy()
+    e.index = e.index.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3] + \
+        e.index.strftime('%z') + ' [%s]' % TIME_ZONE
+    e.index.name = 'time'
+    e.to_csv(epochFile)
+
+
+
+def writeEpochNpz(e, epochFile):
+    """Write epochs as the java NpzWriter, i.e. one typed .npy member per
+    column and a metadata.json member
+
+    :param pandas.DataFrame e: Epoch data indexed by (timezone-aware) time
+    :param str epochFile: Output .npz file
+    """
+
+    columns = ['time'] + list(e.columns)
+    values = {'time': e.index.asi8 // 10**6}
+    for col in e.columns:
+        values[col] = e[col].to_numpy('int32' if col in COUNT_COLS else 'float64')
+    metadata = {'timeZone': TIME_ZONE, 'timeUnit': 'ms',
+        'epochPeriod': EPOCH_PERIOD, 'columns': columns}
+    with zipfile.ZipFile(epochFile, 'w') as npz:
+        for col in columns:
+            npy = io.BytesIO()
+            np.save(npy, values[col])
+            npz.writestr(col + '.npy', npy.getvalue())
+        npz.writestr('metadata.json', json.dumps(metadata))
+
+
+
+def writeEpochStream(e):
+    """Write epochs as the java EpochStreamWriter
+
+    :param pandas.DataFrame e: Epoch data indexed by (timezone-aware) time
+
+    :return: Epoch stream
+    :rtype: bytes
+    """
+
+    columns = ['time'] + list(e.columns)
+    header = json.dumps({'timeZone': TIME_ZONE, 'timeUnit': 'ms',
+        'epochPeriod': EPOCH_PERIOD, 'columns': columns}).encode('utf-8')
+    stream = [device.EPOCH_STREAM_MAGIC,
+        struct.pack('>ii', device.EPOCH_STREAM_VERSION, len(header)), header]
+    frameLength = struct.pack('>i', 8 * len(columns))
+    values = e.to_numpy('float64')
+    for time, row in zip(e.index.asi8 // 10**6, values):
+        stream += [frameLength, struct.pack('>q', time), row.astype('>f8').tobytes()]
+    stream.append(struct.pack('>i', 0))
+    return b''.join(stream)
+
+
+
+def makeActivityModel(modelFile, seed=42):
+    """Train a small activity model on random features of FEATURE_COLS
+
+    :param str modelFile: Output tar model file
+    :param int seed: Random seed
+    """
+
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(seed)
+    labels = np.array(['sleep', 'sedentary', 'light', 'MVPA'])
+    X = pd.DataFrame(rng.normal(size=(2000, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    y = labels[(X['f0'] > 0) * 2 + (X['f1'] > 0.5)]
+    rf = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=seed)
+    rf.fit(X, y)
+    priors = np.full(len(labels), 1 / len(labels))
+    transitions = np.full((len(labels), len(labels)), 0.1 / (len(labels) - 1))
+    np.fill_diagonal(transitions, 0.9)
+    emissions = np.full((len(labels), len(labels)), 0.1 / (len(labels) - 1))
+    np.fill_diagonal(emissions, 0.9)
+    METs = np.array([0.95, 1.5, 2.5, 4.5])
+    # saveModelsToTar() writes intermediate files to the working directory
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(modelFile))
+    try:
+        accClassification.saveModelsToTar(os.path.basename(modelFile),
+            FEATURE_COLS, rf, priors, transitions, emissions, METs)
+    finally:
+        os.chdir(cwd)
+
+
+
+def summariseEpochs(epochFile, outputFolder, **kwargs):
+    """Summarise epochs with summariseEpoch.getActivitySummary(), writing the
+    nonwear episodes and time series files as accProcess does
+
+    :param str|pandas.DataFrame epochFile: Input epoch file or epoch data
+    :param pathlib.Path outputFolder: Folder to write output files to
+    :param kwargs: Options of getActivitySummary()
+
+    :return: Summary, nonwear episodes file and time series file
+    :rtype: tuple(dict, str, str)
+    """
+
+    summary = {}
+    nonWearFile = str(outputFolder / 'nonWearBouts.csv.gz')
+    tsFile = str(outputFolder / 'timeSeries.csv.gz')
+    e, labels = summariseEpoch.getActivitySummary(epochFile, nonWearFile,
+        summary, timeZone=TIME_ZONE, epochPeriod=EPOCH_PERIOD, **kwargs)
+    accUtils.writeTimeSeries(e, labels, tsFile)
+    return summary, nonWearFile, tsFile
+
+
+
+def assertSummariesEqual(summary, expected, rtol=0):
+    """Assert two summary dicts are equal, ignoring processing stage timings
+
+    :param dict summary: Summary to check
+    :param dict expected: Expected summary
+    :param float rtol: Relative tolerance of numeric values
+    """
+
+    keys = [key for key in expected if 'processing' not in key]
+    assert [key for key in summary if 'processing' not in key] == keys
+    for key in keys:
+        if isinstance(expected[key], float):
+            np.testing.assert_allclose(summary[key], expected[key], rtol=rtol,
+                atol=rtol * 1e-3, err_msg=key)
+        else:
+            assert summary[key] == expected[key], key
+
+
+
+def assertCsvFilesEqual(csvFile, expectedFile, rtol=0):
+    """Assert two csv(.gz) outputs (e.g. time series or nonwear episodes) are
+    equal, with identical text columns and numeric columns within <rtol>
+
+    :param str csvFile: csv file to check
+    :param str expectedFile: Expected csv file
+    :param float rtol: Relative tolerance of numeric values
+    """
+
+    actual = pd.read_csv(csvFile)
+    expected = pd.read_csv(expectedFile)
+    pd.testing.assert_index_equal(actual.columns, expected.columns)
+    for col in expected.columns:
+        if rtol > 0 and pd.api.types.is_float_dtype(expected[col]):
+            np.testing.assert_allclose(actual[col], expected[col], rtol=rtol,
+                atol=rtol * 1e-3, err_msg=col)
+        else:
+            pd.testing.assert_series_equal(actual[col], expected[col])
+
+
+
+@pytest.fixture(scope='session')
+def epochs():
+    return makeEpochs()
+
+
+
+@pytest.fixture(scope='session')
+def epochFiles(epochs, tmp_path_factory):
+    """The synthetic epochs written as csv.gz and npz epoch files"""
+    folder = tmp_path_factory.mktemp('epochs')
+    files = {'csv': str(folder / 'synthetic-epoch.csv.gz'),
+        'npz': str(folder / 'synthetic-epoch.npz')}
+    writeEpochCsv(epochs, files['csv'])
+    writeEpochNpz(epochs, files['npz'])
+    return files
+
+
+
+@pytest.fixture(scope='session')
+def activityModel(tmp_path_factory):
+    modelFile = str(tmp_path_factory.mktemp('model') / 'model.tar')
+    makeActivityModel(modelFile)
+    return modelFile
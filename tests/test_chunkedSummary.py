@@ -0,0 +1,66 @@
+"""Check --chunkedSummary gives the summary of summariseEpoch, one day at a time"""
+
+import datetime
+import pandas as pd
+import pytest
+
+from conftest import (EPOCHS_PER_DAY, EPOCH_PERIOD, TIME_ZONE,
+    assertCsvFilesEqual, assertSummariesEqual, summariseEpochs)
+from accelerometer import chunkedSummary
+
+# totals are merged one chunk at a time, so sums are rounded differently
+RTOL = 1e-6
+
+
+
+def summariseChunked(epochFile, outputFolder, **kwargs):
+    summary = {}
+    nonWearFile = str(outputFolder / 'nonWearBouts.csv.gz')
+    tsFile = str(outputFolder / 'timeSeries.csv.gz')
+    chunkedSummary.getActivitySummaryChunked(epochFile, nonWearFile, summary,
+        tsFile, timeZone=TIME_ZONE, epochPeriod=EPOCH_PERIOD, **kwargs)
+    return summary, nonWearFile, tsFile
+
+
+
+@pytest.mark.parametrize('epochFormat', ['csv', 'npz'])
+@pytest.mark.parametrize('options', [
+    dict(activityClassification=False, intensityDistribution=True),
+    dict(activityClassification=True, intensityDistribution=True),
+    dict(activityClassification=True, useRecommendedImputation=False),
+    dict(activityClassification=False, minNonWearDuration=30, mgCutPointMVPA=50),
+    dict(activityClassification=False,
+        startTime=datetime.datetime(2020, 10, 21, 5),
+        endTime=datetime.datetime(2020, 10, 27, 5)),
+], ids=['acc', 'classification', 'noImputation', 'cutPoints', 'startEndTime'])
+def test_chunkedSummaryMatches(epochFiles, activityModel, tmp_path, epochFormat,
+        options):
+    kwargs = dict(activityModel=activityModel, **options)
+    (tmp_path / 'memory').mkdir()
+    (tmp_path / 'chunked').mkdir()
+    summary, nonWearFile, tsFile = summariseEpochs(epochFiles[epochFormat],
+        tmp_path / 'memory', **kwargs)
+    chunkedSummary, chunkedNonWearFile, chunkedTsFile = summariseChunked(
+        epochFiles[epochFormat], tmp_path / 'chunked', **kwargs)
+    assertSummariesEqual(chunkedSummary, summary, rtol=RTOL)
+    assertCsvFilesEqual(chunkedNonWearFile, nonWearFile)
+    assertCsvFilesEqual(chunkedTsFile, tsFile, rtol=RTOL)
+
+
+
+def test_nonWearAcrossChunks(epochs, epochFiles, tmp_path):
+    """Episodes left open at the end of a chunk are carried to the next"""
+    summary, nonWearFile, tsFile = summariseChunked(epochFiles['csv'], tmp_path,
+        activityClassification=False)
+    episodes = pd.read_csv(nonWearFile)
+    boundaries = epochs.index[::EPOCHS_PER_DAY][1:].tz_localize(None)
+    start = pd.to_datetime(episodes['start'])
+    end = pd.to_datetime(episodes['end'])
+    crossing = [((start < boundary) & (end >= boundary)).any()
+        for boundary in boundaries]
+    # an episode crossing one boundary, another crossing the next, and one
+    # spanning whole chunks
+    assert crossing[:2] == [True, True]
+    assert sum(crossing) >= 4
+    # an episode still open at the end of the file
+    assert end.iloc[-1] == epochs.index[-1].tz_localize(None)
@@ -0,0 +1,42 @@
+"""Check --epochFormat npz epoch files load and summarise as csv ones"""
+
+import pandas as pd
+import pytest
+
+from conftest import assertCsvFilesEqual, assertSummariesEqual, summariseEpochs
+from accelerometer import accUtils
+
+
+
+def test_loadNpzMatchesCsv(epochFiles):
+    csv = accUtils.loadEpochFile(epochFiles['csv'])
+    npz = accUtils.loadEpochFile(epochFiles['npz'])
+    # npz counts are stored as int32
+    pd.testing.assert_frame_equal(npz, csv, check_dtype=False)
+    assert str(npz.index.tz) == str(csv.index.tz)
+
+
+
+def test_loadNpzColumnsMatchCsv(epochFiles):
+    columns, float32Cols = ['enmoTrunc', 'f0', 'samples'], ['f0']
+    csv = accUtils.loadEpochFile(epochFiles['csv'], columns, float32Cols)
+    npz = accUtils.loadEpochFile(epochFiles['npz'], columns, float32Cols)
+    pd.testing.assert_frame_equal(npz, csv, check_dtype=False)
+    assert npz['f0'].dtype == csv['f0'].dtype == 'float32'
+
+
+
+@pytest.mark.parametrize('activityClassification', [False, True])
+def test_npzSummaryMatchesCsv(epochFiles, activityModel, tmp_path,
+        activityClassification):
+    kwargs = dict(activityClassification=activityClassification,
+        activityModel=activityModel, intensityDistribution=True)
+    (tmp_path / 'csv').mkdir()
+    (tmp_path / 'npz').mkdir()
+    csvSummary, csvNonWear, csvTs = summariseEpochs(epochFiles['csv'],
+        tmp_path / 'csv', **kwargs)
+    npzSummary, npzNonWear, npzTs = summariseEpochs(epochFiles['npz'],
+        tmp_path / 'npz', **kwargs)
+    assertSummariesEqual(npzSummary, csvSummary)
+    assertCsvFilesEqual(npzNonWear, csvNonWear)
+    assertCsvFilesEqual(npzTs, csvTs)
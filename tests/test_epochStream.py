@@ -0,0 +1,68 @@
+"""Check --streamEpochs epochs read and summarise as the csv epoch file"""
+
+import io
+import sys
+import pandas as pd
+import pytest
+
+from conftest import (assertCsvFilesEqual, assertSummariesEqual,
+    summariseEpochs, writeEpochStream)
+from accelerometer import accUtils
+from accelerometer import device
+
+
+
+def catCommand(streamFile):
+    """Command writing <streamFile> to stdout, in place of the java parser"""
+    return [sys.executable, '-c', 'import shutil, sys; '
+        'shutil.copyfileobj(open(sys.argv[1], "rb"), sys.stdout.buffer)',
+        streamFile]
+
+
+
+def test_readStreamMatchesCsv(epochs, epochFiles):
+    streamed = device.readEpochStream(io.BytesIO(writeEpochStream(epochs)))
+    pd.testing.assert_frame_equal(streamed, accUtils.loadEpochFile(epochFiles['csv']))
+
+
+
+def test_streamJavaEpochs(epochs, epochFiles, tmp_path):
+    streamFile = tmp_path / 'epochs.bin'
+    streamFile.write_bytes(writeEpochStream(epochs))
+    streamed, exitCode = device.streamJavaEpochs(catCommand(str(streamFile)))
+    assert exitCode == 0
+    pd.testing.assert_frame_equal(streamed, accUtils.loadEpochFile(epochFiles['csv']))
+
+
+
+def test_streamJavaEpochsTruncated(epochs, tmp_path):
+    streamFile = tmp_path / 'epochs.bin'
+    streamFile.write_bytes(writeEpochStream(epochs)[:-100])
+    streamed, exitCode = device.streamJavaEpochs(catCommand(str(streamFile)))
+    assert streamed is None
+    assert exitCode != 0
+
+
+
+def test_readStreamBadMagic(epochs):
+    stream = b'NOTEPOCH' + writeEpochStream(epochs)[8:]
+    with pytest.raises(ValueError):
+        device.readEpochStream(io.BytesIO(stream))
+
+
+
+@pytest.mark.parametrize('activityClassification', [False, True])
+def test_streamSummaryMatchesCsv(epochs, epochFiles, activityModel, tmp_path,
+        activityClassification):
+    kwargs = dict(activityClassification=activityClassification,
+        activityModel=activityModel, intensityDistribution=True)
+    (tmp_path / 'csv').mkdir()
+    (tmp_path / 'stream').mkdir()
+    csvSummary, csvNonWear, csvTs = summariseEpochs(epochFiles['csv'],
+        tmp_path / 'csv', **kwargs)
+    streamed = device.readEpochStream(io.BytesIO(writeEpochStream(epochs)))
+    streamSummary, streamNonWear, streamTs = summariseEpochs(streamed,
+        tmp_path / 'stream', **kwargs)
+    assertSummariesEqual(streamSummary, csvSummary)
+    assertCsvFilesEqual(streamNonWear, csvNonWear)
+    assertCsvFilesEqual(streamTs, csvTs)
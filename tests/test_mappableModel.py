@@ -0,0 +1,36 @@
+"""Check mappable activity models classify as the model they were converted from"""
+
+import gzip
+import shutil
+import pytest
+
+from conftest import FEATURE_COLS
+from accelerometer import accClassification
+
+
+
+@pytest.fixture(scope='module')
+def mappableModel(activityModel, tmp_path_factory):
+    modelFile = str(tmp_path_factory.mktemp('mappable') / 'model-mappable.tar')
+    accClassification.saveMappableModel(activityModel, modelFile)
+    return modelFile
+
+
+
+def test_mappableMatchesModel(epochs, activityModel, mappableModel):
+    X = epochs[FEATURE_COLS]
+    model = accClassification.loadModel(activityModel)
+    mappable = accClassification.loadModel(mappableModel)
+    assert mappable['rf'] is None
+    assert (accClassification.predictRandomForest(mappable, X) ==
+        accClassification.predictRandomForest(model, X)).all()
+
+
+
+def test_compressedMappableModel(mappableModel, tmp_path):
+    """tarfile reads compressed tar files too, whose members can not be mapped"""
+    compressedModel = str(tmp_path / 'model-mappable.tar.gz')
+    with open(mappableModel, 'rb') as f, gzip.open(compressedModel, 'wb') as out:
+        shutil.copyfileobj(f, out)
+    with pytest.raises(ValueError, match='compressed'):
+        accClassification.loadModel(compressedModel)
@@ -0,0 +1,146 @@
+"""Check java parser jobs run through a ParserWorker as in their own processes
+
+The java classes are stood in for by python scripts named ParserWorker and
+AccelerometerParser, which speak the same job protocol (see ParserWorker.java),
+so that the python side can be tested without a JDK. Jobs print their process
+id, and exit with the code given as their first argument, or "crash" to exit
+the worker mid-job.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+from conftest import assertCsvFilesEqual, assertSummariesEqual
+from accelerometer import device
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FAKE_PARSER = """
+import os, sys
+print("pid:%d" % os.getpid(), flush=True)
+sys.exit(int(sys.argv[1]))
+"""
+
+FAKE_WORKER = """
+import os, sys
+for job in sys.stdin:
+    jobArgs = job.rstrip("\\n").split("\\t")
+    print("pid:%d" % os.getpid(), flush=True)
+    if jobArgs[0] == "crash":
+        sys.exit(3)
+    print("{jobDone}" + jobArgs[0], flush=True)
+""".format(jobDone=device.PARSER_WORKER_JOB_DONE)
+
+
+
+@pytest.fixture
+def fakeJava(tmp_path, monkeypatch):
+    """Command prefix running the fake classes, i.e. "java -classpath ..." """
+    (tmp_path / 'AccelerometerParser').write_text(FAKE_PARSER)
+    (tmp_path / 'ParserWorker').write_text(FAKE_WORKER)
+    monkeypatch.chdir(tmp_path)
+    yield [sys.executable]
+    device.stopParserWorker()
+
+
+
+def runJob(fakeJava, capfd, jobArgs, useParserWorker=True):
+    """Run a job, returning its exit code and the process id it printed"""
+    exitCode = device.callJavaParser(fakeJava + ["AccelerometerParser"] + jobArgs,
+        useParserWorker)
+    output = capfd.readouterr().out.split()
+    pids = [int(line[len('pid:'):]) for line in output if line.startswith('pid:')]
+    return exitCode, pids[-1]
+
+
+
+def test_subprocessPerJob(fakeJava, capfd):
+    exitCode, pid = runJob(fakeJava, capfd, ["0"], useParserWorker=False)
+    assert exitCode == 0
+    exitCode, otherPid = runJob(fakeJava, capfd, ["5"], useParserWorker=False)
+    assert exitCode == 5
+    assert pid != otherPid
+
+
+
+def test_workerReusedAcrossJobs(fakeJava, capfd):
+    exitCode, pid = runJob(fakeJava, capfd, ["0", "outputFile:a-epoch.csv.gz"])
+    assert exitCode == 0
+    exitCode, otherPid = runJob(fakeJava, capfd, ["0", "outputFile:b-epoch.csv.gz"])
+    assert exitCode == 0
+    assert pid == otherPid
+    assert device._parserWorker['process'].pid == pid
+
+
+
+def test_workerSurvivesFailedJob(fakeJava, capfd):
+    exitCode, pid = runJob(fakeJava, capfd, ["-2"])
+    assert exitCode == -2
+    exitCode, otherPid = runJob(fakeJava, capfd, ["0"])
+    assert exitCode == 0
+    assert pid == otherPid
+
+
+
+def test_workerRestartedAfterCrash(fakeJava, capfd):
+    exitCode, pid = runJob(fakeJava, capfd, ["0"])
+    exitCode, crashedPid = runJob(fakeJava, capfd, ["crash"])
+    assert exitCode == 3
+    assert crashedPid == pid
+    assert device._parserWorker['process'] is None
+    exitCode, newPid = runJob(fakeJava, capfd, ["0"])
+    assert exitCode == 0
+    assert newPid != pid
+
+
+
+def test_workerRestartedForOtherJvmArgs(fakeJava, capfd):
+    exitCode, pid = runJob(fakeJava, capfd, ["0"])
+    exitCode, otherPid = runJob(fakeJava + ["-u"], capfd, ["0"])
+    assert exitCode == 0
+    assert pid != otherPid
+
+
+
+def test_stopParserWorker(fakeJava, capfd):
+    runJob(fakeJava, capfd, ["0"])
+    worker = device._parserWorker['process']
+    device.stopParserWorker()
+    assert worker.poll() == 0
+    assert device._parserWorker['process'] is None
+
+
+
+def test_accProcessSeveralFiles(epochFiles, activityModel, tmp_path):
+    """Files processed by one accProcess command give the outputs of one
+    command per file (summarising earlier epoch files, so without java)"""
+    epochFolder = os.path.dirname(epochFiles['csv'])
+    inputFiles = [os.path.join(epochFolder, 'synthetic.cwa'),
+        os.path.join(epochFolder, 'other.cwa')]
+    otherEpochFile = os.path.join(epochFolder, 'other-epoch.npz')
+    if not os.path.exists(otherEpochFile):
+        os.link(epochFiles['npz'], otherEpochFile)
+    options = ['--processInputFile', 'False', '--activityModel', activityModel,
+        '--epochFolder', epochFolder, '--deleteIntermediateFiles', 'False']
+
+    for folder, commands in [('single', [[f] for f in inputFiles]),
+            ('several', [inputFiles])]:
+        (tmp_path / folder).mkdir()
+        for command in commands:
+            subprocess.run([sys.executable, os.path.join(ROOT, 'accProcess.py')] +
+                command + options + ['--outputFolder', str(tmp_path / folder)],
+                check=True)
+
+    for name in ['synthetic', 'other']:
+        summaries = []
+        for folder in ['single', 'several']:
+            with open(tmp_path / folder / (name + '-summary.json')) as f:
+                summaries.append(json.load(f))
+        assertSummariesEqual(summaries[1], summaries[0])
+        for output in ['-nonWearBouts.csv.gz', '-timeSeries.csv.gz']:
+            assertCsvFilesEqual(str(tmp_path / 'several' / (name + output)),
+                str(tmp_path / 'single' / (name + output)))
@@ -0,0 +1,159 @@
+"""Check accProcess epoch options give the same outputs for data/sample.cwa
+
+Needs the compiled java parser and data/sample.cwa(.gz), see
+utilities/downloadDataModels.sh. Activity classification is only tested if
+the default activity model has been downloaded too.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import assertCsvFilesEqual, assertSummariesEqual
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SAMPLE_FILES = [os.path.join(ROOT, 'data', 'sample.cwa'),
+    os.path.join(ROOT, 'data', 'sample.cwa.gz')]
+SAMPLE_FILE = next((f for f in SAMPLE_FILES if os.path.exists(f)), None)
+ACTIVITY_MODEL = os.path.join(ROOT, 'activityModels', 'walmsley-jan21.tar')
+
+pytestmark = pytest.mark.skipif(SAMPLE_FILE is None or
+    not os.path.exists(os.path.join(ROOT, 'java', 'AccelerometerParser.class')),
+    reason="needs data/sample.cwa(.gz) and the compiled java parser")
+
+
+
+def runAccProcess(outputFolder, *options, inputFiles=[SAMPLE_FILE]):
+    """Process the sample file (or other <inputFiles>) with accProcess
+
+    :param pathlib.Path outputFolder: Folder to write output files to
+    :param str options: Extra accProcess options
+    :param list(str) inputFiles: Files to process with one accProcess command
+
+    :return: Summary, nonwear episodes file and time series file of the first
+        input file
+    :rtype: tuple(dict, str, str)
+    """
+
+    outputFolder.mkdir()
+    if not os.path.exists(ACTIVITY_MODEL):
+        options += ('--activityClassification', 'False')
+    subprocess.run([sys.executable, 'accProcess.py'] + inputFiles +
+        ['--outputFolder', str(outputFolder), '--deleteIntermediateFiles', 'False',
+        '--intensityDistribution', 'True'] + list(options),
+        cwd=ROOT, check=True)
+    return getOutputs(outputFolder, 'sample')
+
+
+
+def getOutputs(outputFolder, name):
+    """Get summary, nonwear episodes file and time series file of <name>"""
+    with open(outputFolder / (name + '-summary.json')) as f:
+        summary = json.load(f)
+    return (summary, str(outputFolder / (name + '-nonWearBouts.csv.gz')),
+        str(outputFolder / (name + '-timeSeries.csv.gz')))
+
+
+
+@pytest.fixture(scope='module')
+def outputFolder(tmp_path_factory):
+    return tmp_path_factory.mktemp('sample')
+
+
+
+@pytest.fixture(scope='module')
+def csvOutputs(outputFolder):
+    return runAccProcess(outputFolder / 'csv', '--epochFormat', 'csv')
+
+
+
+@pytest.fixture(scope='module')
+def npzOutputs(outputFolder):
+    return runAccProcess(outputFolder / 'npz', '--epochFormat', 'npz')
+
+
+
+def test_npzMatchesCsv(csvOutputs, npzOutputs):
+    """npz epochs keep the full precision of the 6 decimals printed to csv, so
+    outputs only match closely, and an epoch's activity state may differ"""
+    csvSummary, csvNonWear, csvTs = csvOutputs
+    npzSummary, npzNonWear, npzTs = npzOutputs
+    assertSummariesEqual(
+        {key: value for key, value in npzSummary.items() if not isinstance(value, float)},
+        {key: value for key, value in csvSummary.items() if not isinstance(value, float)})
+    for key, value in csvSummary.items():
+        if isinstance(value, float):
+            np.testing.assert_allclose(npzSummary[key], value, rtol=1e-2,
+                atol=1e-2, err_msg=key)
+    assertCsvFilesEqual(npzNonWear, csvNonWear, rtol=1e-3)
+
+    ts, expected = pd.read_csv(npzTs), pd.read_csv(csvTs)
+    pd.testing.assert_index_equal(ts.columns, expected.columns)
+    pd.testing.assert_series_equal(ts['time'], expected['time'])
+    pd.testing.assert_series_equal(ts['imputed'], expected['imputed'])
+    np.testing.assert_allclose(ts['acc'], expected['acc'], atol=1e-2)
+    states = [col for col in expected.columns if col not in ['time', 'imputed', 'acc']]
+    assert (ts[states].fillna(-1) != expected[states].fillna(-1)).any(axis=1).mean() < 1e-3
+
+
+
+def test_streamEpochsMatchNpz(outputFolder, npzOutputs):
+    """Streamed epochs have the full precision of npz epochs"""
+    streamSummary, streamNonWear, streamTs = runAccProcess(
+        outputFolder / 'stream', '--streamEpochs', 'True')
+    npzSummary, npzNonWear, npzTs = npzOutputs
+    assertSummariesEqual(streamSummary, npzSummary)
+    assertCsvFilesEqual(streamNonWear, npzNonWear)
+    assertCsvFilesEqual(streamTs, npzTs)
+
+
+
+def test_chunkedSummaryMatchesCsv(outputFolder, csvOutputs):
+    """Summarising one day at a time merges totals in a different order"""
+    chunkedSummary, chunkedNonWear, chunkedTs = runAccProcess(
+        outputFolder / 'chunked', '--chunkedSummary', 'True')
+    csvSummary, csvNonWear, csvTs = csvOutputs
+    assertSummariesEqual(chunkedSummary, csvSummary, rtol=1e-6)
+    assertCsvFilesEqual(chunkedNonWear, csvNonWear)
+    assertCsvFilesEqual(chunkedTs, csvTs, rtol=1e-6)
+
+
+
+def test_parserWorkerMatchesSubprocess(outputFolder, csvOutputs):
+    """Files processed one after another by a ParserWorker give the outputs of
+    a java process per parsing pass"""
+    copyFile = str(outputFolder / ('copy' + SAMPLE_FILE[SAMPLE_FILE.index('.'):]))
+    shutil.copyfile(SAMPLE_FILE, copyFile)
+    runAccProcess(outputFolder / 'worker', '--useParserWorker', 'True',
+        inputFiles=[SAMPLE_FILE, copyFile])
+    csvSummary, csvNonWear, csvTs = csvOutputs
+    for name in ['sample', 'copy']:
+        summary, nonWear, ts = getOutputs(outputFolder / 'worker', name)
+        assertSummariesEqual(
+            {key: value for key, value in summary.items() if key != 'file-name'},
+            {key: value for key, value in csvSummary.items() if key != 'file-name'})
+        assertCsvFilesEqual(nonWear, csvNonWear)
+        assertCsvFilesEqual(ts, csvTs)
+
+
+
+@pytest.mark.skipif(SAMPLE_FILE is None or not SAMPLE_FILE.endswith('.cwa'),
+    reason="only uncompressed .cwa files are decoded in parallel")
+def test_parallelThreadsMatchSequential(outputFolder, csvOutputs):
+    """Each parallel chunk starts with a reset lowpass filter, which converges
+    to the sequential one's state during warm up, so epochs (and the outputs
+    derived from them) only match within a tolerance, see ParallelCwaTest.java"""
+    runAccProcess(outputFolder / 'parallel', '--parallelThreads', '4')
+    epochs = pd.read_csv(outputFolder / 'parallel' / 'sample-epoch.csv.gz')
+    expected = pd.read_csv(outputFolder / 'csv' / 'sample-epoch.csv.gz')
+    pd.testing.assert_index_equal(epochs.columns, expected.columns)
+    pd.testing.assert_series_equal(epochs['time'], expected['time'])
+    for col in expected.columns[1:]:
+        np.testing.assert_allclose(epochs[col], expected[col], rtol=0,
+            atol=1e-5, err_msg=col)
@@ -0,0 +1,37 @@
+"""Check --summaryMetrics names the output files it skips"""
+
+import os
+import subprocess
+import sys
+import pytest
+
+from accelerometer import summariseEpoch
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+
+@pytest.mark.parametrize('summaryMetrics, skippedFiles', [
+    (['interrupts'], ['-nonWearBouts.csv.gz', '-timeSeries.csv.gz']),
+    (['wearTime', 'dataQuality'], ['-timeSeries.csv.gz']),
+    (['movement'], []),
+    (None, []),
+])
+def test_skippedOutputFiles(summaryMetrics, skippedFiles):
+    metricGroups = summariseEpoch.getMetricGroups(summaryMetrics)
+    assert summariseEpoch.getSkippedOutputFiles(metricGroups) == skippedFiles
+
+
+
+def test_accProcessWarnsOfSkippedFiles(epochFiles, tmp_path):
+    epochFolder = os.path.dirname(epochFiles['csv'])
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'accProcess.py'),
+        os.path.join(epochFolder, 'synthetic.cwa'), '--processInputFile', 'False',
+        '--epochFolder', epochFolder, '--outputFolder', str(tmp_path),
+        '--deleteIntermediateFiles', 'False', '--summaryMetrics', 'interrupts'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    assert '-nonWearBouts.csv.gz or -timeSeries.csv.gz' in result.stderr
+    assert os.path.exists(tmp_path / 'synthetic-summary.json')
+    assert not os.path.exists(tmp_path / 'synthetic-nonWearBouts.csv.gz')
+    assert not os.path.exists(tmp_path / 'synthetic-timeSeries.csv.gz')
@@ -0,0 +1,130 @@
+"""Command line tool to compare calibration solvers on stationary points files
+
+Runs accelerometer.device.getCalibrationCoefs and the previous per-axis
+statsmodels OLS implementation on the same *-stationaryPoints.csv.gz files,
+reporting the runtime of each and the largest difference in coefficients.
+Without input files, synthetic stationary points are used.
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from accelerometer import device
+
+parser = argparse.ArgumentParser(
+        description="Compare calibration solvers on stationary points files",
+        add_help=True
+    )
+parser.add_argument('stationaryFiles', nargs='*', type=str,
+        help="input -stationaryPoints.csv.gz files (default: synthetic data)")
+parser.add_argument('--repeats', type=int, default=3,
+        help="number of timed runs per file and solver")
+parser.add_argument('--numSynthetic', type=int, default=50000,
+        help="number of synthetic stationary points")
+args = parser.parse_args()
+
+coefKeys = ['calibration-' + a + p for p in ['Offset(g)', 'Slope(g)', 'Temp(C)']
+    for a in 'xyz'] + ['calibration-errsAfter(mg)']
+
+
+def referenceCalibrationCoefs(staticBoutsFile, summary):
+    """Previous getCalibrationCoefs implementation, refitting each axis with
+    statsmodels OLS"""
+    maxIter = 1000
+    minIterImprovement = 0.0001 #0.1mg
+    cols = ['xMean', 'yMean', 'zMean', 'temp', 'dataErrors']
+    d = pd.read_csv(staticBoutsFile, usecols=cols, compression='gzip')
+    d = d.to_numpy()
+    stationaryPoints = d[d[:,4] == 0] # don't consider episodes with data errors
+    axesVals = stationaryPoints[:,[0,1,2]]
+    tempVals = stationaryPoints[:,[3]]
+    meanTemp = np.mean(tempVals)
+    tempVals = np.copy(tempVals-meanTemp)
+    xMin, yMin, zMin = np.amin(axesVals, axis=0)
+    xMax, yMax, zMax = np.amax(axesVals, axis=0)
+    intercept = np.array([0.0, 0.0, 0.0])
+    slope = np.array([1.0, 1.0, 1.0])
+    tempCoef = np.array([0.0, 0.0, 0.0])
+    bestError = 1e16
+    bestIntercept = np.copy(intercept)
+    bestSlope = np.copy(slope)
+    bestTemp = np.copy(tempCoef)
+    curr = intercept + (np.copy(axesVals) * slope) + (np.copy(tempVals) * tempCoef)
+    target = curr / np.sqrt(np.sum(np.square(curr), axis=1))[:, None]
+    initError = np.sqrt(np.mean(np.square(curr-target)))
+    for i in range(1, maxIter):
+        for a in range(0,3):
+            x = np.concatenate([curr[:, [a]], tempVals], axis=1)
+            x = sm.add_constant(x, prepend=True)
+            y = target[:, a]
+            newI, newS, newT = sm.OLS(y,x).fit().params
+            intercept[a] = newI + (intercept[a] * newS)
+            slope[a] = newS * slope[a]
+            tempCoef[a] = newT + (tempCoef[a] * newS)
+        curr = intercept + (np.copy(axesVals) * slope) + (np.copy(tempVals) * tempCoef)
+        target = curr / np.sqrt(np.sum(np.square(curr), axis=1))[:,None]
+        rms = np.sqrt(np.mean(np.square(curr-target)))
+        improvement = (bestError-rms)/bestError
+        if rms < bestError:
+            bestIntercept = np.copy(intercept)
+            bestSlope = np.copy(slope)
+            bestTemp = np.copy(tempCoef)
+            bestError = rms
+        if improvement < minIterImprovement:
+            break
+    device.storeCalibrationInformation(summary, bestIntercept, bestSlope,
+        bestTemp, meanTemp, initError, bestError, xMin, xMax, yMin, yMax, zMin,
+        zMax, len(axesVals))
+
+
+def writeSyntheticFile(outFile, n):
+    """Write stationary points of a miscalibrated device at random orientations"""
+    rng = np.random.default_rng(42)
+    xyz = rng.normal(size=(n, 3))
+    xyz /= np.linalg.norm(xyz, axis=1)[:, None]
+    temp = rng.normal(25, 3, size=(n, 1))
+    xyz = (xyz - [0.02, -0.03, 0.05]) / [1.01, 0.98, 1.02] \
+        - (temp - 25) * [0.001, -0.002, 0.0005]
+    xyz += rng.normal(scale=0.002, size=(n, 3))
+    d = pd.DataFrame(xyz, columns=['xMean', 'yMean', 'zMean'])
+    d['temp'] = temp
+    d['dataErrors'] = 0
+    d.to_csv(outFile, index=False, compression='gzip')
+
+
+def timeit(func, stationaryFile):
+    times = []
+    for i in range(args.repeats):
+        summary = {}
+        startTime = time.perf_counter()
+        func(stationaryFile, summary)
+        times.append(time.perf_counter() - startTime)
+    return min(times), summary
+
+
+def main():
+    stationaryFiles = args.stationaryFiles
+    if not stationaryFiles:
+        stationaryFiles = ['synthetic-stationaryPoints.csv.gz']
+        writeSyntheticFile(stationaryFiles[0], args.numSynthetic)
+
+    print('file,points,statsmodelsSecs,numpySecs,speedup,maxCoefDiff')
+    for stationaryFile in stationaryFiles:
+        refTime, refSummary = timeit(referenceCalibrationCoefs, stationaryFile)
+        newTime, newSummary = timeit(device.getCalibrationCoefs, stationaryFile)
+        maxDiff = max(abs(refSummary[k] - newSummary[k]) for k in coefKeys)
+        print(f"{stationaryFile},{newSummary['calibration-numStaticPoints']},"
+              f"{refTime:.4f},{newTime:.4f},{refTime / newTime:.1f},{maxDiff:g}")
+
+    if not args.stationaryFiles:
+        os.remove(stationaryFiles[0])
+
+
+if __name__ == '__main__':
+    main()
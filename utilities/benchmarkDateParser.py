@@ -0,0 +1,78 @@
+"""Command line tool to compare per-row and vectorised epoch time parsing
+
+Parses the time column of epoch/time series files (or a synthetic week of
+5 second epochs) with accUtils.date_parser (per-row, as a read_csv
+date_parser) and accUtils.date_parser_vectorised, reporting the runtime of
+each and whether both give identical timestamps.
+"""
+
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from accelerometer import accUtils
+
+parser = argparse.ArgumentParser(
+        description="Compare per-row and vectorised epoch time parsing",
+        add_help=True
+    )
+parser.add_argument('epochFiles', nargs='*', type=str,
+        help="input -epoch.csv.gz or -timeSeries.csv.gz files (default: synthetic data)")
+parser.add_argument('--repeats', type=int, default=3,
+        help="number of timed runs per file and parser")
+parser.add_argument('--timeZone', type=str, default='Europe/London',
+        help="timezone of synthetic data")
+args = parser.parse_args()
+
+
+def writeSyntheticFile(outFile):
+    """Write a week of 5 second epochs, spanning a daylight savings crossover"""
+    t = pd.date_range('2020-10-22', periods=7 * 24 * 60 * 12, freq='5s',
+                      tz=args.timeZone)
+    d = pd.DataFrame({'time': t, 'acc': 0.0})
+    d['time'] = d['time'].apply(accUtils.date_strftime)
+    d.to_csv(outFile, index=False, compression='gzip')
+
+
+def readPerRow(epochFile):
+    return pd.read_csv(epochFile, index_col=['time'], usecols=['time'],
+        parse_dates=['time'], date_parser=accUtils.date_parser).index
+
+
+def readVectorised(epochFile):
+    t = pd.read_csv(epochFile, index_col=['time'], usecols=['time']).index
+    return accUtils.date_parser_vectorised(t)
+
+
+def timeit(func, epochFile):
+    times = []
+    for i in range(args.repeats):
+        startTime = time.perf_counter()
+        index = func(epochFile)
+        times.append(time.perf_counter() - startTime)
+    return min(times), index
+
+
+def main():
+    epochFiles = args.epochFiles
+    if not epochFiles:
+        epochFiles = ['synthetic-timeSeries.csv.gz']
+        writeSyntheticFile(epochFiles[0])
+
+    print('file,rows,perRowSecs,vectorisedSecs,speedup,identical')
+    for epochFile in epochFiles:
+        rowTime, rowIndex = timeit(readPerRow, epochFile)
+        vecTime, vecIndex = timeit(readVectorised, epochFile)
+        identical = rowIndex.equals(vecIndex) and str(rowIndex.tz) == str(vecIndex.tz)
+        print(f"{epochFile},{len(vecIndex)},{rowTime:.4f},{vecTime:.4f},"
+              f"{rowTime / vecTime:.1f},{identical}")
+
+    if not args.epochFiles:
+        os.remove(epochFiles[0])
+
+
+if __name__ == '__main__':
+    main()
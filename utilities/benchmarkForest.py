@@ -0,0 +1,86 @@
+"""Command line tool to compare sklearn and flattened random forest predictions
+
+Predicts activity states of random epochs with the random forest of an
+activity model (or a synthetic one), using sklearn's RandomForestClassifier
+and accClassification.predictFlatForest, reporting the runtime of each, the
+size of the flattened forest, and whether both give identical predictions.
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from accelerometer import accClassification
+
+parser = argparse.ArgumentParser(
+        description="Compare sklearn and flattened random forest predictions",
+        add_help=True
+    )
+parser.add_argument('--activityModel', type=str, default=None,
+        help="input tar model file (pickled random forest) to take random "
+            "forest from (default: synthetic random forest)")
+parser.add_argument('--trees', type=int, default=100,
+        help="number of trees of synthetic random forest")
+parser.add_argument('--features', type=int, default=30,
+        help="number of features of synthetic random forest")
+parser.add_argument('--epochs', type=int, default=7 * 24 * 60 * 2,
+        help="number of epochs to predict")
+parser.add_argument('--repeats', type=int, default=3,
+        help="number of timed runs per implementation")
+parser.add_argument('--seed', type=int, default=42,
+        help="random seed of synthetic data")
+args = parser.parse_args()
+
+
+def getRandomForest(rng):
+    """Get random forest and its feature columns"""
+    if args.activityModel:
+        model = accClassification.loadModel(args.activityModel)
+        if model['rf'] is None:
+            sys.exit(args.activityModel + " has no sklearn random forest")
+        return model['rf'], model['featureCols']
+    featureCols = ['f%d' % i for i in range(args.features)]
+    X = rng.normal(size=(20000, args.features))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(size=len(X)) > 0.5) * 1 + \
+        (X[:, 3] > 1)
+    rf = RandomForestClassifier(n_estimators=args.trees, random_state=args.seed)
+    rf.fit(pd.DataFrame(X, columns=featureCols),
+        np.array(['sleep', 'sedentary', 'walking'])[y])
+    return rf, featureCols
+
+
+def timeit(func, X):
+    times = []
+    for i in range(args.repeats):
+        startTime = time.perf_counter()
+        output = func(X)
+        times.append(time.perf_counter() - startTime)
+    return min(times), output
+
+
+def main():
+    rng = np.random.default_rng(args.seed)
+    rf, featureCols = getRandomForest(rng)
+    rf.set_params(n_jobs=1) # see accClassification.predictFlatForest()
+    forest = accClassification.flattenForest(rf)
+    X = pd.DataFrame(rng.normal(size=(args.epochs, len(featureCols))),
+        columns=featureCols)
+
+    print('trees,epochs,flatMB,pureLeaves,sklearnSecs,flatSecs,identical')
+    sklearnTime, sklearnOutput = timeit(rf.predict, X)
+    flatTime, flatOutput = timeit(
+        lambda X: accClassification.predictFlatForest(forest, X), X)
+    flatMB = sum(values.nbytes for values in forest.values()) / 1e6
+    identical = np.array_equal(sklearnOutput, flatOutput)
+    print(f"{len(rf.estimators_)},{len(X)},{flatMB:.1f},"
+          f"{'leafValue' not in forest},{sklearnTime:.4f},{flatTime:.4f},"
+          f"{identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Command line tool to compare per-state loop and vectorised Viterbi decoding
+
+Smooths random forest style predictions (a synthetic week of 5 second epochs,
+or the HMM of an activity model) with the former per-observation, per-state
+loop implementation of accClassification.viterbi and the current vectorised
+one, reporting the runtime of each and whether both give identical outputs.
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from accelerometer import accClassification
+
+parser = argparse.ArgumentParser(
+        description="Compare per-state loop and vectorised Viterbi decoding",
+        add_help=True
+    )
+parser.add_argument('--activityModel', type=str, default=None,
+        help="input tar model file to take HMM from (default: synthetic HMM)")
+parser.add_argument('--states', type=int, default=6,
+        help="number of states of synthetic HMM")
+parser.add_argument('--epochs', type=int, default=7 * 24 * 60 * 12,
+        help="number of observations to smooth")
+parser.add_argument('--repeats', type=int, default=3,
+        help="number of timed runs per implementation")
+parser.add_argument('--seed', type=int, default=42,
+        help="random seed of synthetic observations")
+args = parser.parse_args()
+
+
+def viterbiLoop(observations, states, priors, transitions, emissions,
+            probabilistic=False):
+    """Former implementation of accClassification.viterbi, for reference"""
+
+    def norm(x):
+        return x / x.sum()
+
+    tinyNum = 0.000001
+    nObservations = len(observations)
+    nStates = len(states)
+    v = np.zeros((nObservations,nStates)) # initialise viterbi table
+    # Set prior state values for first observation...
+    for state in range(0, len(states)):
+        v[0,state] = np.log(priors[state] * emissions[state,states.index(observations[0])]+tinyNum)
+    # Fill in remaning matrix observations
+    # Use log space as multiplying successively smaller p values)
+    for k in range(1,nObservations):
+        for state in range(0, len(states)):
+            v[k,state] = np.log(emissions[state,states.index(observations[k])]+tinyNum) + \
+                        np.max(v[k-1,:] + np.log(transitions[:,state]+tinyNum), axis=0)
+
+    # Now construct viterbiPath (propagating backwards)
+    viterbiPath = observations
+    # Pick most probable state for final observation
+    viterbiPath[nObservations-1] = states[np.argmax(v[nObservations-1,:],axis=0)]
+
+    # Probabilistic method will give probability of each label
+    if probabilistic:
+        viterbiProba = np.zeros((nObservations,nStates)) # initialize table
+        viterbiProba[nObservations-1,:] = norm(v[nObservations-1,:])
+
+    # And then work backwards to pick most probable state for all other observations
+    for k in list(reversed(range(0,nObservations-1))):
+        viterbiPath[k] = states[np.argmax(v[k,:] + np.log(transitions[:,states.index(viterbiPath[k+1])]+tinyNum),axis=0)]
+        if probabilistic:
+            viterbiProba[k,:] = norm(v[k,:] + np.log(transitions[:,states.index(viterbiPath[k+1])]+tinyNum))
+
+    # Output as list...
+    return viterbiProba if probabilistic else viterbiPath
+
+
+def getHMM(rng):
+    """Get states, priors, transitions and emissions of an HMM"""
+    if args.activityModel:
+        getFile = lambda f: accClassification.getFileFromTar(args.activityModel, f)
+        priors = np.load(getFile('hmmPriors.npy'))
+        transitions = np.load(getFile('hmmTransitions.npy'))
+        emissions = np.load(getFile('hmmEmissions.npy'))
+        states = ['state%d' % i for i in range(len(priors))]
+        return states, priors, transitions, emissions
+    states = ['state%d' % i for i in range(args.states)]
+    priors = rng.dirichlet(np.ones(args.states))
+    # Mostly stay in the same state, as activity states do
+    transitions = 0.9 * np.eye(args.states) + \
+        0.1 * rng.dirichlet(np.ones(args.states), size=args.states)
+    emissions = 0.7 * np.eye(args.states) + \
+        0.3 * rng.dirichlet(np.ones(args.states), size=args.states)
+    return states, priors, transitions, emissions
+
+
+def timeit(func, observations, hmm, probabilistic):
+    times = []
+    for i in range(args.repeats):
+        startTime = time.perf_counter()
+        # viterbiLoop overwrites its observations, so always pass a copy
+        output = func(list(observations), *hmm, probabilistic=probabilistic)
+        times.append(time.perf_counter() - startTime)
+    return min(times), output
+
+
+def main():
+    rng = np.random.default_rng(args.seed)
+    hmm = getHMM(rng)
+    states = hmm[0]
+    observations = [states[i] for i in rng.integers(0, len(states), args.epochs)]
+
+    print('output,states,epochs,loopSecs,vectorisedSecs,speedup,identical')
+    for probabilistic in (False, True):
+        loopTime, loopOutput = timeit(viterbiLoop, observations, hmm, probabilistic)
+        vecTime, vecOutput = timeit(accClassification.viterbi, observations, hmm,
+            probabilistic)
+        identical = np.array_equal(loopOutput, vecOutput)
+        output = 'probabilities' if probabilistic else 'states'
+        print(f"{output},{len(states)},{len(observations)},{loopTime:.4f},"
+              f"{vecTime:.4f},{loopTime / vecTime:.1f},{identical}")
+
+
+if __name__ == '__main__':
+    main()